@@ -4,7 +4,9 @@
 # et les montants exacts de chaque type de véhicule pour préparer un Dataset parfait X/y.
 
 import os
-import glob
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
 import numpy as np
 import time
@@ -13,8 +15,158 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SIM_DIR = os.path.join(BASE_DIR, 'data', 'simulations')
 MASTER_FEATURES = os.path.join(BASE_DIR, 'data', 'spectral_features_master.csv')
 OUTPUT_DATASET = os.path.join(BASE_DIR, 'data', 'xgboost_training_data.csv')
+# Séries temporelles par tranche de BIN_SECONDS (format long, une ligne par tranche)
+SERIES_DATASET = os.path.join(BASE_DIR, 'data', 'xgboost_training_series.csv')
+# Table approximative (mode --preview), jamais confondue avec le dataset exact
+PREVIEW_DATASET = os.path.join(BASE_DIR, 'data', 'xgboost_training_data_preview.csv')
+# Budget mémoire global par défaut pour la lecture parallèle (fraction de la RAM)
+DEFAULT_MEM_FRACTION = 0.5
 
-def process_simulations():
+sys.path.append(os.path.join(BASE_DIR, "scripts"))
+import sim_scanner
+import sim_preview
+import sim_catalog
+from time_bins import series_features
+
+# Indicateurs dérivés des séries temporelles, ajoutés au dataset
+SERIES_FEATURES = ['co2_pic_kg', 't_pic_co2_s', 'veh_actifs_max', 't_saturation_s', 'vitesse_min_mps']
+# Agrégats lus par simulation, gardés dans le catalogue (seule copie des statistiques
+# par fichier : un fichier inchangé n'est jamais relu)
+AGGREGATES = ['co2', 'duration', 'vehicles', 'series']
+
+def scan_stats(file):
+    """Lecture en un seul passage via le scanner partagé (CO2, durée, véhicules par type,
+    séries par tranche de temps)"""
+    stats = sim_scanner.scan_simulation(file, aggregates=AGGREGATES)
+    if stats['n_quarantined']:
+        print(f"    [QUARANTAINE] {os.path.basename(file)}: {stats['n_quarantined']} ligne(s) rejetée(s) "
+              f"-> {sim_scanner.sim_csv.quarantine_path(file)}")
+    return stats
+
+def traffic_from_stats(stats):
+    """Variables de trafic du dataset à partir des statistiques d'une simulation"""
+    counts = sim_scanner.vehicle_counts(stats)
+    return {
+        'duree_sim_s': stats['max_step'],
+        'nb_total_veh': counts['nb_total_veh'],
+        'nb_voitures': counts['nb_voitures'],
+        'nb_camions': counts['nb_camions'],
+        'nb_bus': counts['nb_bus'],
+        'nb_motos': counts['nb_motos'],
+        'CO2_kg': stats['co2_kg'],
+        **series_features(stats['series']),
+        'series': stats['series'],
+    }
+
+def total_memory_bytes():
+    """RAM physique de la machine (None si indisponible)"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def scan_pending(pending, workers=1, mem_budget=None):
+    """Lit les simulations à (re)scanner, en parallèle si workers > 1.
+
+    Renvoie ({filename: stats}, {filename: message d'erreur}). Une erreur sur un
+    fichier n'interrompt pas les autres. En mode parallèle, un fichier n'est lancé que
+    si la somme des estimations mémoire en cours reste sous `mem_budget` (un fichier
+    est toujours autorisé seul, même s'il dépasse le budget).
+    """
+    results, errors = {}, {}
+    if not pending:
+        return results, errors
+    if workers <= 1:
+        for filename, file in pending:
+            print(f"  [LECTURE] Traitement de {filename} pour extraire : CO2, durée, véhicules...")
+            start_t = time.time()
+            try:
+                stats = scan_stats(file)
+            except Exception as e:
+                print(f"    [ERR] Problème avec {filename}: {e}")
+                errors[filename] = str(e)
+                continue
+            results[filename] = stats
+            print(f"    -> OK en {time.time()-start_t:.1f}s | {sum(stats['veh_per_type'].values())} véh, "
+                  f"CO2 = {stats['co2_kg']:.1f} kg")
+        return results, errors
+
+    # Les plus gros fichiers d'abord pour équilibrer la charge ; l'ordre final est rétabli à l'assemblage
+    queue = sorted(((filename, file, sim_scanner.estimate_scan_memory(file)) for filename, file in pending),
+                   key=lambda item: -item[2])
+    budget = mem_budget if mem_budget else float('inf')
+    print(f"  Lecture parallèle : {workers} processus, budget mémoire {budget / 1e9:.1f} Go")
+    in_flight = {}
+    used = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while queue or in_flight:
+            i = 0
+            while i < len(queue) and len(in_flight) < workers:
+                filename, file, est = queue[i]
+                if in_flight and used + est > budget:
+                    i += 1
+                    continue
+                queue.pop(i)
+                in_flight[pool.submit(scan_stats, file)] = (filename, est, time.time())
+                used += est
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                filename, est, start_t = in_flight.pop(fut)
+                used -= est
+                try:
+                    stats = fut.result()
+                except Exception as e:
+                    print(f"    [ERR] Problème avec {filename}: {e}")
+                    errors[filename] = str(e)
+                    continue
+                results[filename] = stats
+                print(f"    -> {filename} OK en {time.time()-start_t:.1f}s | {sum(stats['veh_per_type'].values())} véh, "
+                      f"CO2 = {stats['co2_kg']:.1f} kg")
+    return results, errors
+
+def topology_row(city_name, city_feat):
+    """Variables topologiques X de la ville (relues depuis le master)"""
+    return {
+        'city': city_name,
+        'nodes': city_feat['nodes'].values[0],
+        'edges': city_feat['edges'].values[0],
+        'densite': city_feat['densite'].values[0],
+        'deg_moyen': city_feat['deg_moyen'].values[0],
+        'rho': city_feat['rho'].values[0],             # Valeur propre max
+        'kreiss': city_feat['kreiss'].values[0],       # Constante de Kreiss
+    }
+
+def write_preview(selected, fraction, exact_vehicles=False):
+    """Mode aperçu : échantillonnage + sketches, avec intervalles de confiance à 95%"""
+    print(f"  [APERÇU] Échantillonnage de {fraction:.0%} des blocs de chaque simulation")
+    rows = []
+    for filename, file, city_name, city_feat in selected:
+        start_t = time.time()
+        try:
+            preview = sim_preview.preview_simulation(file, fraction=fraction, exact_vehicles=exact_vehicles)
+        except Exception as e:
+            print(f"    [ERR] Problème avec {filename}: {e}")
+            continue
+        row = {'simulation': filename, **topology_row(city_name, city_feat)}
+        row['duree_sim_s'] = preview['max_step']
+        counts = sim_preview.vehicle_counts_ci(preview)
+        for col in ['nb_total_veh', 'nb_voitures', 'nb_camions', 'nb_bus', 'nb_motos']:
+            row[col] = counts[col][0]
+        row['CO2_kg'] = preview['co2_kg']
+        # Bornes des intervalles de confiance (suffixes _ic_bas / _ic_haut)
+        for col in ['nb_total_veh', 'nb_voitures', 'nb_camions', 'nb_bus', 'nb_motos']:
+            row[f'{col}_ic_bas'], row[f'{col}_ic_haut'] = counts[col][1]
+        row['CO2_kg_ic_bas'], row['CO2_kg_ic_haut'] = preview['ci']['co2_kg']
+        row['vitesse_moy_mps'] = preview['avg_speed_mps']
+        row['vitesse_moy_mps_ic_bas'], row['vitesse_moy_mps_ic_haut'] = preview['ci']['avg_speed_mps']
+        rows.append(row)
+        print(f"    -> {filename} en {time.time()-start_t:.1f}s | ~{row['nb_total_veh']} véh, "
+              f"CO2 ≈ {row['CO2_kg']:.1f} kg [{row['CO2_kg_ic_bas']:.1f} ; {row['CO2_kg_ic_haut']:.1f}]")
+    pd.DataFrame(rows).to_csv(PREVIEW_DATASET, index=False)
+    print(f"\n--- TERMINÉ --- Aperçu approximatif sauvegardé : {PREVIEW_DATASET}")
+
+def process_simulations(full_rebuild=False, workers=1, mem_budget=None, preview=False, preview_fraction=0.02,
+                        preview_exact_vehicles=False, db_file=sim_catalog.CATALOG_FILE):
     print("--- 1. CHARGEMENT DES DONNÉES MATHÉMATIQUES (X) ---")
     feat_df = pd.read_csv(MASTER_FEATURES)
     # Rendre les noms de villes standard
@@ -29,84 +181,101 @@ def process_simulations():
     feat_df['densite'] = feat_df['edges'] / (0.5 * feat_df['nodes'] * (feat_df['nodes'] - 1))
     feat_df['deg_moyen'] = (2.0 * feat_df['edges']) / feat_df['nodes']
     
-    sim_files = glob.glob(os.path.join(SIM_DIR, "*.csv"))
-    
+    # Les simulations sont sélectionnées dans le catalogue (ville et volume déjà analysés),
+    # qui garde aussi leurs agrégats : seuls les fichiers nouveaux ou modifiés sont relus
+    catalog = sim_catalog.open_catalog(SIM_DIR, db_file)
+    entries = {}
     dataset_rows = []
+    series_frames = []
     
     print("\n--- 2. LECTURE DES SIMULATIONS (X et y) / CELA PEUT PRENDRE QUELQUES MINUTES ---")
-    for file in sim_files:
-        filename = os.path.basename(file)
-        # Nom du fichier du type "paris10K_..."
-        city_sub = filename.split('10K')[0].split('5K')[0].split('15k')[0].split('20k')[0].split('30k')[0]
-        city_name = city_sub.lower().replace('-', '_')
+    selected = []
+    pending = []
+    for sim in sim_catalog.select(catalog):
+        filename, file, city_name = sim['filename'], sim['file'], sim['city']
+        if city_name is None:
+            print(f"  [IGNORE] Nom de fichier non reconnu (ville + nombre de véhicules) : {filename}")
+            continue
         
         # Trouver la ville dans nos features
         city_feat = feat_df[feat_df['city'] == city_name]
         if city_feat.empty:
             print(f"  [IGNORE] Ville non trouvée dans l'analyse spectrale : {city_name}")
             continue
+        selected.append((filename, file, city_name, city_feat))
+        entries[filename] = sim
+        if full_rebuild or any(a not in sim['aggregates'] for a in AGGREGATES):
+            pending.append((filename, file))
+    
+    if preview:
+        write_preview(selected, preview_fraction, preview_exact_vehicles)
+        return
+    
+    n_reused = len(selected) - len(pending)
+    scanned, errors = scan_pending(pending, workers=workers, mem_budget=mem_budget)
+    for filename, stats in scanned.items():
+        entries[filename] = sim_catalog.store_stats(catalog, entries[filename], AGGREGATES, stats)
+    
+    # Assemblage dans l'ordre des fichiers, indépendamment de l'ordre de fin des processus
+    for filename, file, city_name, city_feat in selected:
+        if filename in errors:
+            continue
+        traffic = traffic_from_stats(sim_catalog.get_stats(catalog, entries[filename], AGGREGATES))
             
-        print(f"  [LECTURE] Traitement de {filename} pour extraire : CO2, durée, véhicules...")
-        start_t = time.time()
-        
-        # Variables pour accumuler lors de la lecture par morceaux (chunk) pour ne pas exploser la RAM
-        total_co2_kg = 0.0
-        max_step = 0
-        veh_types_sets = {} # Dictionnaire pour stocker les IDs uniques par type
-        
-        try:
-            chunk_iter = pd.read_csv(file, usecols=['step', 'veh_id', 'veh_type', 'CO2_g_s'], chunksize=500000)
-            for chunk in chunk_iter:
-                # Accumuler le CO2 (y)
-                total_co2_kg += chunk['CO2_g_s'].sum() / 1000.0
-                
-                # Chercher la durée de la simulation (X)
-                current_max = chunk['step'].max()
-                if current_max > max_step:
-                    max_step = current_max
-                    
-                # Compter les véhicules uniques par type (X)
-                unique_types = chunk['veh_type'].unique()
-                for vt in unique_types:
-                    if vt not in veh_types_sets:
-                        veh_types_sets[vt] = set()
-                    # Ajouter les IDs de ce type
-                    vt_ids = chunk.loc[chunk['veh_type'] == vt, 'veh_id'].unique()
-                    veh_types_sets[vt].update(vt_ids)
+        # Assemblage de la ligne du dataset pour XGBoost
+        # (la topologie est toujours relue depuis le master pour rester à jour)
+        row = {'simulation': filename, **topology_row(city_name, city_feat)}
+        row.update({
+            # Variables relatives au Trafic X
+            'duree_sim_s': traffic['duree_sim_s'],
+            'nb_total_veh': traffic['nb_total_veh'],
+            'nb_voitures': traffic['nb_voitures'],
+            'nb_camions': traffic['nb_camions'],
+            'nb_bus': traffic['nb_bus'],
+            'nb_motos': traffic['nb_motos'],
             
-            # Assemblage de la ligne du dataset pour XGBoost
-            row = {
-                'city': city_name,
-                # Variables Topologiques X
-                'nodes': city_feat['nodes'].values[0],
-                'edges': city_feat['edges'].values[0],
-                'densite': city_feat['densite'].values[0],
-                'deg_moyen': city_feat['deg_moyen'].values[0],
-                'rho': city_feat['rho'].values[0],             # Valeur propre max
-                'kreiss': city_feat['kreiss'].values[0],       # Constante de Kreiss
-                
-                # Variables relatives au Trafic X
-                'duree_sim_s': max_step,
-                'nb_total_veh': sum(len(ids) for ids in veh_types_sets.values()),
-                'nb_voitures': len(veh_types_sets.get('car', set())) + len(veh_types_sets.get('passenger', set())),
-                'nb_camions': len(veh_types_sets.get('truck', set())) + len(veh_types_sets.get('trailer', set())),
-                'nb_bus': len(veh_types_sets.get('bus', set())) + len(veh_types_sets.get('coach', set())),
-                'nb_motos': len(veh_types_sets.get('motorcycle', set())) + len(veh_types_sets.get('moped', set())),
-                
-                # Variable à Prédire y
-                'CO2_kg': total_co2_kg
-            }
+            # Indicateurs temporels (pic de CO2, saturation du réseau...)
+            **{col: traffic[col] for col in SERIES_FEATURES},
             
-            dataset_rows.append(row)
-            print(f"    -> OK en {time.time()-start_t:.1f}s | {row['nb_total_veh']} véh, CO2 = {total_co2_kg:.1f} kg")
-
-        except Exception as e:
-            print(f"    [ERR] Problème avec {filename}: {e}")
+            # Variable à Prédire y
+            'CO2_kg': traffic['CO2_kg']
+        })
+        dataset_rows.append(row)
+        series = pd.DataFrame({k: v for k, v in traffic['series'].items() if k != 'bin_seconds'})
+        series.insert(0, 'city', city_name)
+        series.insert(0, 'simulation', filename)
+        series_frames.append(series)
             
     # Sauvegarde du nouveau jeu de données propre
     final_df = pd.DataFrame(dataset_rows)
     final_df.to_csv(OUTPUT_DATASET, index=False)
+    if series_frames:
+        pd.concat(series_frames, ignore_index=True).to_csv(SERIES_DATASET, index=False)
+    print(f"\n  {n_reused} simulation(s) reprise(s) du catalogue, {len(scanned)} relue(s).")
+    if errors:
+        print(f"  {len(errors)} simulation(s) en échec (exclue(s) du dataset) :")
+        for filename, message in errors.items():
+            print(f"    - {filename}: {message}")
     print(f"\n--- TERMINÉ --- Dataset XGBoost sauvegardé : {OUTPUT_DATASET}")
+    print(f"                Séries temporelles sauvegardées : {SERIES_DATASET}")
     
 if __name__ == "__main__":
-    process_simulations()
+    parser = argparse.ArgumentParser(description="Construit le dataset XGBoost à partir des simulations SUMO")
+    parser.add_argument("--full", action="store_true", help="Tout relire (ignore les agrégats du catalogue)")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus de lecture en parallèle")
+    parser.add_argument("--preview", action="store_true",
+                        help="Aperçu approximatif rapide (écrit dans xgboost_training_data_preview.csv)")
+    parser.add_argument("--preview-fraction", type=float, default=0.02,
+                        help="Fraction des blocs de chaque CSV échantillonnés en mode aperçu")
+    parser.add_argument("--preview-exact-vehicles", action="store_true",
+                        help="Aperçu : véhicules comptés sur tout le fichier (HyperLogLog, lecture complète)")
+    parser.add_argument("--mem-budget-gb", type=float, default=None,
+                        help="Budget mémoire global de la lecture parallèle (défaut : 50%% de la RAM)")
+    args = parser.parse_args()
+    
+    mem_budget = args.mem_budget_gb * 1e9 if args.mem_budget_gb else None
+    if mem_budget is None and total_memory_bytes():
+        mem_budget = total_memory_bytes() * DEFAULT_MEM_FRACTION
+    process_simulations(full_rebuild=args.full, workers=args.workers, mem_budget=mem_budget,
+                        preview=args.preview, preview_fraction=args.preview_fraction,
+                        preview_exact_vehicles=args.preview_exact_vehicles)
@@ -3,6 +3,8 @@
 # pour prédire la quantité de CO2 avec l'algorithme des Forêts Xtrêmes et Gradient Boosting.
 
 import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 import xgboost as xgb
@@ -14,13 +16,38 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATASET_PATH = os.path.join(BASE_DIR, 'data', 'xgboost_training_data.csv')
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'xgb_co2_predictor.joblib')
 
-def train_model():
+# Indicateurs temporels du dataset : ce sont des sorties de la simulation, inconnues
+# au moment de la prédiction (et co2_pic_kg est tiré directement de la cible y)
+SERIES_FEATURES = ['co2_pic_kg', 't_pic_co2_s', 'veh_actifs_max', 't_saturation_s', 'vitesse_min_mps']
+
+sys.path.append(os.path.join(BASE_DIR, "scripts"))
+import sim_catalog
+
+def select_simulations(city=None, min_vehicles=None, max_vehicles=None):
+    """Noms des simulations retenues par le catalogue (None = toutes)"""
+    if city is None and min_vehicles is None and max_vehicles is None:
+        return None
+    # Catalogue resynchronisé avec data/simulations avant le filtrage
+    catalog = sim_catalog.open_catalog()
+    entries = sim_catalog.select(catalog, city=city, min_vehicles=min_vehicles, max_vehicles=max_vehicles)
+    return {e['filename'] for e in entries}
+
+def train_model(city=None, min_vehicles=None, max_vehicles=None):
     print("--- 1. CHARGEMENT DU DATASET ---")
     df = pd.read_csv(DATASET_PATH)
     
+    # Sous-ensemble de simulations choisi dans le catalogue (ex: Paris au-delà de 10k véhicules)
+    selected = select_simulations(city, min_vehicles, max_vehicles)
+    if selected is not None:
+        if 'simulation' not in df.columns:
+            print("[ERREUR] Dataset sans colonne 'simulation' : relancez 1_create_dataset.py")
+            return
+        df = df[df['simulation'].isin(selected)]
+        print(f"Sélection du catalogue : {len(df)} simulation(s) retenue(s).")
+    
     # === SÉPARATION X ET Y SELON LES RECOMMANDATIONS DES DIRECTEURS ===
     # Variables prédictives X 
-    X = df.drop(columns=['city', 'CO2_kg'])
+    X = df.drop(columns=['city', 'CO2_kg'] + [c for c in ['simulation'] + SERIES_FEATURES if c in df.columns])
     
     # Variable à prédire y (Quantité de CO2)
     y = df['CO2_kg']
@@ -80,4 +107,9 @@ def train_model():
         print(f" - {row['Variable']:<15} : {row['Impact']*100:.1f}% d'influence")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Entraîne le modèle XGBoost de prédiction du CO2")
+    parser.add_argument("--city", help="N'utiliser que les simulations de cette ville")
+    parser.add_argument("--min-veh", type=int, help="Nombre minimal de véhicules par simulation")
+    parser.add_argument("--max-veh", type=int, help="Nombre maximal de véhicules par simulation")
+    args = parser.parse_args()
+    train_model(city=args.city, min_vehicles=args.min_veh, max_vehicles=args.max_veh)
@@ -4,10 +4,8 @@ import numpy as np
 import os
 import sys
 import time
-import subprocess
 import joblib
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
 
 # Configuration de la page stricte et scientifique
 st.set_page_config(page_title="IA Pollution - Modélisation des Émissions", layout="wide")
@@ -31,42 +29,41 @@ NET_DIR = os.path.join(BASE_DIR, "data", "networks")
 
 # Import du module local d'analyse spectrale
 sys.path.append(os.path.join(BASE_DIR, "scripts"))
+import gazetteer
 try:
     import analyze_city_structure as analyzer
-    import osmnx as ox
+    import net_store
     MODULES_OK = True
 except ImportError:
     MODULES_OK = False
 
 
-# Fonction pour chercher les vraies villes
+# Fonction pour chercher les vraies villes : index local (réponses Nominatim déjà en
+# cache), Nominatim uniquement si la ville est inconnue localement
+def _nominatim(query, limit):
+    geolocator = Nominatim(user_agent="academic_pollution_research")
+    locations = geolocator.geocode(query, exactly_one=False, featuretype='city', limit=limit)
+    return [loc.raw for loc in locations or []]
+
 @st.cache_data(show_spinner=False)
 def search_city(query):
     if not query:
         return []
-    try:
-        geolocator = Nominatim(user_agent="academic_pollution_research")
-        locations = geolocator.geocode(query, exactly_one=False, featuretype='city', limit=5)
-        if locations:
-            # Nettoyage pour n'afficher que le nom principal et le pays
-            results = []
-            for loc in locations:
-                address = loc.address
-                parts = address.split(', ')
-                # Construction d'un nom affichable "Ville, Pays"
-                name = f"{parts[0]}, {parts[-1]}"
-                # Formater le nom pour la base CSV (ex: "Paris, France" -> "paris")
-                raw_name = parts[0].lower().replace(' ', '_').replace('-', '_')
-                results.append({
-                    "display": name, 
-                    "raw": raw_name,
-                    "lat": loc.latitude,
-                    "lon": loc.longitude
-                })
-            return results
-        return []
-    except GeocoderTimedOut:
-        return []
+    # Nettoyage pour n'afficher que le nom principal et le pays
+    results = []
+    for place in gazetteer.get_gazetteer().lookup(query, limit=5, remote=_nominatim):
+        parts = place['display_name'].split(', ')
+        # Construction d'un nom affichable "Ville, Pays"
+        name = f"{parts[0]}, {parts[-1]}"
+        # Formater le nom pour la base CSV (ex: "Paris, France" -> "paris")
+        raw_name = parts[0].lower().replace(' ', '_').replace('-', '_')
+        results.append({
+            "display": name, 
+            "raw": raw_name,
+            "lat": place['lat'],
+            "lon": place['lon']
+        })
+    return results
 
 # Fonctions de chargement
 @st.cache_data
@@ -184,31 +181,19 @@ elif page == "Prédiction par Intelligence Artificielle":
                     with st.status("Génération Topologique en Temps Réel...", expanded=True) as status:
                         try:
                             net_file = os.path.join(NET_DIR, f"{selected_raw}.net.xml")
-                            osm_file = os.path.join(NET_DIR, f"{selected_raw}.osm.xml")
                             
-                            st.write(f"[1/4] Téléchargement du réseau routier ({selected_lat:.4f}, {selected_lon:.4f}) via OSM...")
+                            st.write(f"[1/4] Téléchargement du réseau routier ({selected_lat:.4f}, {selected_lon:.4f}) via OSM et conversion SUMO (netconvert)...")
                             os.makedirs(NET_DIR, exist_ok=True)
                             
-                            if not os.path.exists(net_file):
-                                G = ox.graph_from_point((selected_lat, selected_lon), dist=3000, network_type='drive', simplify=False)
-                                ox.save_graph_xml(G, filepath=osm_file)
-                                
-                                st.write(f"[2/4] Conversion du graphe en matrice SUMO (netconvert)...")
-                                cmd = [
-                                    "netconvert", "--osm-files", osm_file, "-o", net_file,
-                                    "--geometry.remove", "true", "--roundabouts.guess", "true",
-                                    "--ramps.guess", "true", "--junctions.join", "true",
-                                    "--tls.guess", "true", "--tls.discard-simple", "true",
-                                    "--tls.join", "true", "--no-turnarounds", "true"
-                                ]
-                                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-                                if os.path.exists(osm_file):
-                                    os.remove(osm_file)
+                            # Dépôt partagé : même requête (centre, rayon, options) = aucun téléchargement
+                            _, built = net_store.build_network(point=(selected_lat, selected_lon), dist=3000, net_file=net_file)
+                            if built:
+                                st.write(f"[2/4] Réseau SUMO généré et enregistré dans le dépôt")
                             else:
                                 st.write(f"[2/4] Le réseau binaire existe déjà localement ")
                                 
                             st.write(f"[3/4] Extraction des matrices d'adjacence et calculs spectraux lourds (Kreiss, Valeurs Propres)...")
-                            metrics = analyzer.analyze_topology(net_file)
+                            metrics = analyzer.analyze_topology(net_file, profile="interactive")
                             
                             if metrics:
                                 st.write(f"[4/4] Sauvegarde des caractéristiques de la ville dans la base de données de l'IA...")
@@ -1,7 +1,11 @@
-import osmnx as ox
 import os
 import subprocess
 import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import osm_extract
+import net_store
 
 # Configuration
 CITIES = {
@@ -16,7 +20,7 @@ CITIES = {
 NETWORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "networks")
 os.makedirs(NETWORK_DIR, exist_ok=True)
 
-def download_and_convert(city_key, place_name):
+def download_and_convert(city_key, place_name, extract=None, rebuild=False):
     print(f"Processing {place_name}...")
     
     # 1. Download Graph from OSM
@@ -33,47 +37,25 @@ def download_and_convert(city_key, place_name):
             "hanoi": (21.0285, 105.8542)
         }
         
-        if city_key in centers:
-            point = centers[city_key]
-            # Increased radius for better sampling
-            G = ox.graph_from_point(point, dist=3000, network_type='drive', simplify=False)
-        else:
-            G = ox.graph_from_place(place_name, network_type='drive', simplify=False)
-        
-        # Save as OSM XML (temp)
-        osm_file = os.path.join(NETWORK_DIR, f"{city_key}.osm.xml")
-        ox.save_graph_xml(G, filepath=osm_file)
-        print(f"  Saved OSM data to {osm_file}")
-        
-        # 2. Convert to SUMO .net.xml using netconvert
+        # Download + netconvert once per (center or place, radius, options): the
+        # shared network store serves identical requests without rebuilding (--rebuild
+        # forces it); a net_file built before the store is kept there as a legacy copy
         net_file = os.path.join(NETWORK_DIR, f"{city_key}.net.xml")
-        print(f"  Converting to SUMO network: {net_file}")
-        
-        # Check for netconvert
-        cmd = [
-            "netconvert",
-            "--osm-files", osm_file,
-            "-o", net_file,
-            "--geometry.remove", "true",
-            "--roundabouts.guess", "true",
-            "--ramps.guess", "true",
-            "--junctions.join", "true",
-            "--tls.guess", "true",
-            "--tls.discard-simple", "true",
-            "--tls.join", "true",
-            "--no-turnarounds", "true"
-        ]
-        
-        subprocess.run(cmd, check=True)
-        print(f"  Successfully created {net_file}")
-        
-        # Cleanup OSM file
-        os.remove(osm_file)
+        point = centers.get(city_key)
+        # Increased radius for better sampling
+        _, built = net_store.build_network(point=point, place=place_name, dist=3000 if point else None,
+                                           net_file=net_file, extract=extract, rebuild=rebuild)
+        print(f"  {'Successfully created' if built else 'Served from the network store:'} {net_file}")
         
     except Exception as e:
         print(f"  ERROR processing {city_key}: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download city networks and convert them for SUMO")
+    parser.add_argument("--extract", default=osm_extract.OSM_EXTRACT,
+                        help="Local OSM extract (.osm.pbf / .osm.xml) used instead of Overpass")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild networks that already exist")
+    args = parser.parse_args()
     print(f"Starting map download to {NETWORK_DIR}...")
     
     # Check if netconvert is available
@@ -84,11 +66,6 @@ if __name__ == "__main__":
         sys.exit(1)
 
     for key, place in CITIES.items():
-        target_file = os.path.join(NETWORK_DIR, f"{key}.net.xml")
-        if os.path.exists(target_file):
-            print(f"Skipping {key} (already exists)")
-            continue
-            
-        download_and_convert(key, place)
+        download_and_convert(key, place, args.extract, args.rebuild)
         
     print("Done!")
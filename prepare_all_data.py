@@ -1,13 +1,23 @@
 import os
-import glob
-import re
+import sys
+import argparse
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import sim_preview
+import sim_catalog
+
+parser = argparse.ArgumentParser(description="Consolide les simulations SUMO et les features spectrales")
+parser.add_argument("--preview", action="store_true",
+                    help="Aperçu approximatif rapide (écrit dans dataset_complet_preview.csv)")
+parser.add_argument("--preview-fraction", type=float, default=0.02)
+args = parser.parse_args()
+
 # Paths
 sim_dir = 'data/simulations'
 dataset_file = 'data/dataset.csv'
 master_features_file = 'data/spectral_features_master.csv'
-output_file = 'data/dataset_complet.csv'
+output_file = 'data/dataset_complet_preview.csv' if args.preview else 'data/dataset_complet.csv'
 
 print("--- LECTURE DES FEATURES EXISTANTES ---")
 city_features = {}
@@ -37,19 +47,19 @@ if os.path.exists(master_features_file):
 all_data = []
 
 print("\n--- EXTRACTION DES DONNÉES DE SIMULATION ---")
-sim_files = glob.glob(os.path.join(sim_dir, "*.csv"))
-for count, file in enumerate(sim_files):
-    filename = os.path.basename(file)
-    print(f"[{count+1}/{len(sim_files)}] Traitement de {filename}...")
+# Ville et nombre de véhicules viennent du catalogue (ex: amsterdam5k_2026...csv ou Paris10K...)
+catalog = sim_catalog.open_catalog(sim_dir)
+sims = sim_catalog.select(catalog)
+for count, sim in enumerate(sims):
+    filename, file = sim['filename'], sim['file']
+    print(f"[{count+1}/{len(sims)}] Traitement de {filename}...")
     
-    # regex pour parser, e.g. amsterdam5k_2026...csv ou Paris10K...
-    match = re.match(r'^([a-zA-Z_-]+)(\d+)[kK]_.*\.csv$', filename)
-    if not match:
+    if sim['city'] is None:
         print(f"Impossible d'extraire le nom et le % de véhicules depuis {filename}")
         continue
     
-    city = match.group(1).lower().replace('-', '_')
-    vehicles = int(match.group(2)) * 1000
+    city = sim['city']
+    vehicles = sim['vehicles_nominal']
     
     # On vérifie si on a les features pour cette ville
     # Note : los_angeles dans filename (los-angeles) -> los_angeles
@@ -57,16 +67,18 @@ for count, file in enumerate(sim_files):
         print(f"ATTENTION: Caractéristiques spectrales indisponibles pour {city}.")
         
     try:
-        # Lire uniquement CO2_g_s et speed pour économiser la RAM (certains fichiers font > 3Go !)
-        # On utilise on_bad_lines='skip' car SUMO peut parfois générer des lignes corrompues
-        df_sim = pd.read_csv(file, usecols=['CO2_g_s', 'speed'], on_bad_lines='skip')
-        
-        # Pour forcer les colonnes en numérique (au cas où il y ait des headers dans le fichier CSV ou des erreurs)
-        df_sim['CO2_g_s'] = pd.to_numeric(df_sim['CO2_g_s'], errors='coerce').fillna(0)
-        df_sim['speed'] = pd.to_numeric(df_sim['speed'], errors='coerce').fillna(0)
+        # Lecture en un seul passage via le scanner partagé (certains fichiers font > 3Go !),
+        # sauf si le catalogue a déjà ces agrégats pour ce fichier inchangé.
+        # En mode aperçu : échantillonnage de blocs avec intervalles de confiance
+        if args.preview:
+            stats = sim_preview.preview_simulation(file, fraction=args.preview_fraction)
+        else:
+            stats = sim_catalog.get_stats(catalog, sim, ['co2', 'speed'])
+            if stats['n_quarantined']:
+                print(f" -> {stats['n_quarantined']} ligne(s) invalide(s) mise(s) en quarantaine")
         
-        total_co2_kg = df_sim['CO2_g_s'].sum() / 1000.0
-        avg_speed_mps = df_sim['speed'].mean()
+        total_co2_kg = stats['co2_kg']
+        avg_speed_mps = stats['avg_speed_mps']
         
         row = {
             'city': city,
@@ -75,6 +87,9 @@ for count, file in enumerate(sim_files):
             'total_co2_kg': total_co2_kg,
             'avg_speed_mps': avg_speed_mps,
         }
+        if args.preview:
+            row['total_co2_kg_ci_low'], row['total_co2_kg_ci_high'] = stats['ci']['co2_kg']
+            row['avg_speed_mps_ci_low'], row['avg_speed_mps_ci_high'] = stats['ci']['avg_speed_mps']
         
         # Ajout des features
         if city in city_features:
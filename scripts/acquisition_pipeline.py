@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import analyze_city_structure as analyzer
+import batch_analyze
+import net_store
+import osm_extract
+
+# Pipelined onboarding of many cities: OSM download -> netconvert -> spectral analysis.
+# Each stage has its own workers and a bounded queue in front of it, so city N+1 is
+# downloaded while city N is in netconvert and city N-1 is analysed, and downloads
+# cannot run far ahead of the conversions. Failed downloads and conversions are retried
+# with exponential backoff; the other steps (analysis, publish, save) fail on their
+# first error, which is deterministic there. Networks go through net_store: a request already built is neither downloaded
+# nor converted again. Progress is recorded per city in a state file (atomic writes)
+# and every output is produced under a temporary name then renamed: after a crash the
+# run is resumed where it stopped.
+#
+#   python scripts/acquisition_pipeline.py "paris=Paris, France" "amsterdam=52.3702,4.8952"
+#   python scripts/acquisition_pipeline.py --cities-file villes.csv --fetch-workers 2 --convert-workers 4
+#
+# villes.csv : colonnes key, place ou key, lat, lon (dist optionnelle, en mètres)
+
+STATE_FILE = os.path.join(analyzer.NET_DIR, "acquisition_state.json")
+DEFAULT_RADIUS = net_store.DEFAULT_RADIUS
+QUEUE_SIZE = 2               # villes en attente devant chaque étape
+RETRIES = 3
+BACKOFF_S = 5.0              # 5 s, 10 s, 20 s (+ aléa)
+RETRY_STAGES = ('fetch', 'convert')   # erreurs réseau / netconvert passagères
+
+
+def parse_city(spec):
+    """'key=Place name' or 'key=lat,lon[,dist]' -> city dict"""
+    key, _, target = spec.partition("=")
+    parts = [p.strip() for p in target.split(",")]
+    try:
+        coords = [float(p) for p in parts]
+    except ValueError:
+        coords = None
+    if coords and len(coords) in (2, 3):
+        return {'key': key.strip(), 'point': coords[:2], 'dist': coords[2] if len(coords) == 3 else DEFAULT_RADIUS}
+    return {'key': key.strip(), 'place': target.strip()}
+
+
+def read_cities_file(path):
+    import pandas as pd
+    cities = []
+    for row in pd.read_csv(path).to_dict('records'):
+        if isinstance(row.get('place'), str) and row['place']:
+            cities.append({'key': str(row['key']), 'place': row['place']})
+        else:
+            dist = row.get('dist')
+            cities.append({'key': str(row['key']), 'point': [float(row['lat']), float(row['lon'])],
+                           'dist': float(dist) if dist == dist and dist is not None else DEFAULT_RADIUS})
+    return cities
+
+
+class PipelineState:
+    """Per-city progress (stage reached, timings, last error), saved atomically"""
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.cities = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.cities = json.load(f)
+
+    def get(self, key):
+        with self._lock:
+            return dict(self.cities.get(key, {}))
+
+    def update(self, key, **fields):
+        with self._lock:
+            self.cities.setdefault(key, {}).update(fields)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.cities, f, indent=1)
+            os.replace(tmp, self.path)
+
+
+def with_retries(step, label, retries=RETRIES, backoff_s=BACKOFF_S):
+    """Runs step() with exponential backoff; re-raises the last error"""
+    for attempt in range(retries + 1):
+        try:
+            return step()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff_s * 2 ** attempt * (1 + random.random() / 2)
+            print(f"  [{label}] essai {attempt + 1} échoué ({e}), nouvel essai dans {delay:.0f}s")
+            time.sleep(delay)
+
+
+class AcquisitionPipeline:
+    def __init__(self, cities, fetch_workers=2, convert_workers=2, analyze_workers=1,
+                 profile=analyzer.DEFAULT_PROFILE, net_dir=analyzer.NET_DIR, state_file=STATE_FILE,
+                 retries=RETRIES, backoff_s=BACKOFF_S, extract=None, kreiss_mode=analyzer.KREISS_MODE):
+        self.cities = cities
+        self.extract = extract
+        self.workers = {'fetch': fetch_workers, 'convert': convert_workers, 'analyze': analyze_workers}
+        self.profile, self.kreiss_mode = profile, kreiss_mode
+        self.net_dir = net_dir
+        self.state = PipelineState(state_file)
+        self.retries, self.backoff_s = retries, backoff_s
+        self.queues = {'convert': queue.Queue(QUEUE_SIZE), 'analyze': queue.Queue(QUEUE_SIZE)}
+        self._master_lock = threading.Lock()
+        self._pool = None
+
+    def _spec(self, city):
+        point = city.get('point')
+        return net_store.request_spec(point, city.get('place'), city.get('dist') if point else None,
+                                      extract=self.extract)
+
+    def _fail(self, key, stage, e):
+        try:
+            self.state.update(key, status='failed', failed_stage=stage, error=f"{type(e).__name__}: {e}")
+        except OSError as save_error:
+            print(f"  [{key}] état non enregistré ({save_error})")
+        print(f"  [{key}] ÉCHEC {stage} : {e}")
+
+    def _run_step(self, city, stage, step):
+        key = city['key']
+        start = time.time()
+        try:
+            retries = self.retries if stage in RETRY_STAGES else 0
+            result = with_retries(step, f"{key}/{stage}", retries, self.backoff_s)
+        except Exception as e:
+            self._fail(key, stage, e)
+            return False, None
+        self.state.update(key, **{f"{stage}_s": time.time() - start})
+        return True, result
+
+    # Chaque worker vide sa file quoi qu'il arrive : une erreur imprévue marque la ville
+    # en échec au lieu d'arrêter le thread (l'amont resterait bloqué sur la file pleine)
+    def _fetch_worker(self, todo):
+        while True:
+            try:
+                city = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._fetch(city)
+            except Exception as e:
+                self._fail(city['key'], 'fetch', e)
+
+    def _convert_worker(self):
+        while True:
+            city = self.queues['convert'].get()
+            if city is None:
+                return
+            try:
+                self._convert(city)
+            except Exception as e:
+                self._fail(city['key'], 'convert', e)
+
+    def _analyze_worker(self):
+        while True:
+            city = self.queues['analyze'].get()
+            if city is None:
+                return
+            try:
+                self._analyze(city)
+            except Exception as e:
+                self._fail(city['key'], 'analyze', e)
+
+    # Les étapes déjà faites (état, dépôt de réseaux, fichier OSM) sont sautées à la reprise
+    def _fetch(self, city):
+        key = city['key']
+        spec = self._spec(city)
+        artifact = net_store.artifact_key(spec)
+        st = self.state.get(key)
+        # Réseau déjà analysé avec les mêmes paramètres de construction
+        if st.get('stage') == 'analyzed' and st.get('artifact') == artifact:
+            return
+        osm_file = os.path.join(net_store.STORE_DIR, f"{artifact}.osm.xml")
+        if not net_store.lookup(spec) and not os.path.exists(osm_file):
+            print(f"  [{key}] téléchargement OSM")
+            os.makedirs(net_store.STORE_DIR, exist_ok=True)
+            ok, _ = self._run_step(city, 'fetch', lambda: net_store.fetch_osm(spec, osm_file))
+            if not ok:
+                return
+        self.state.update(key, stage='fetched', status='running', artifact=artifact)
+        self.queues['convert'].put(dict(city, spec=spec, osm_file=osm_file))
+
+    def _convert(self, city):
+        key, spec, osm_file = city['key'], city['spec'], city['osm_file']
+        path = net_store.lookup(spec)
+        if path is None:
+            print(f"  [{key}] netconvert")
+            ok, path = self._run_step(city, 'convert', lambda: net_store.convert(spec, osm_file))
+            if not ok:
+                return
+        if os.path.exists(osm_file):
+            os.remove(osm_file)
+        ok, _ = self._run_step(city, 'publish',
+                               lambda: net_store.publish(path, os.path.join(self.net_dir, f"{key}.net.xml")))
+        if not ok:
+            return
+        self.state.update(key, stage='converted', status='running')
+        self.queues['analyze'].put(city)
+
+    def _analyze(self, city):
+        key = city['key']
+        net_file = os.path.join(self.net_dir, f"{key}.net.xml")
+        print(f"  [{key}] analyse spectrale")
+
+        def analyze():
+            res = self._pool.submit(batch_analyze.analyze_one, net_file, self.profile,
+                                     kreiss_mode=self.kreiss_mode).result()
+            if not res['ok']:
+                raise RuntimeError(res['error'])
+            return res
+
+        ok, res = self._run_step(city, 'analyze', analyze)
+        if not ok:
+            return
+
+        def save():
+            with self._master_lock:
+                analyzer.write_master_csv([res['row']])
+
+        ok, _ = self._run_step(city, 'save', save)
+        if not ok:
+            return
+        self.state.update(key, stage='analyzed', status='done', error=None)
+        print(f"  [{key}] terminé")
+
+    def _start(self, target, n, *args):
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def run(self):
+        """Processes all cities; returns the final state of each one"""
+        start = time.time()
+        todo = queue.Queue()
+        for city in self.cities:
+            todo.put(city)
+        with ProcessPoolExecutor(max_workers=self.workers['analyze'], initializer=batch_analyze._init_worker) as pool:
+            self._pool = pool
+            fetchers = self._start(self._fetch_worker, self.workers['fetch'], todo)
+            converters = self._start(self._convert_worker, self.workers['convert'])
+            analyzers = self._start(self._analyze_worker, self.workers['analyze'])
+            # Arrêt étage par étage : une sentinelle par worker quand l'amont est terminé
+            for t in fetchers:
+                t.join()
+            for _ in converters:
+                self.queues['convert'].put(None)
+            for t in converters:
+                t.join()
+            for _ in analyzers:
+                self.queues['analyze'].put(None)
+            for t in analyzers:
+                t.join()
+        self.elapsed_s = time.time() - start
+        return {c['key']: self.state.get(c['key']) for c in self.cities}
+
+
+def print_summary(results, elapsed_s):
+    print("\n--- RÉCAPITULATIF ---")
+    print(f"  {'Ville':<20} {'Statut':<8} {'OSM':>8} {'netconv.':>9} {'analyse':>8}")
+    busy = 0.0
+    for key, st in results.items():
+        times = [st.get(f"{s}_s") for s in ('fetch', 'convert', 'analyze')]
+        busy += sum(t for t in times if t)
+        cols = " ".join(f"{t:>7.1f}s" if t is not None else f"{'-':>8}" for t in times)
+        print(f"  {key:<20} {st.get('status', '?'):<8} {cols}")
+        if st.get('status') == 'failed':
+            print(f"    ! {st.get('failed_stage')} : {st.get('error')}")
+    n_done = sum(1 for st in results.values() if st.get('status') == 'done')
+    print(f"{n_done}/{len(results)} ville(s) terminée(s) en {elapsed_s:.1f}s "
+          f"(somme des étapes : {busy:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Acquisition en pipeline : OSM -> netconvert -> analyse")
+    parser.add_argument("cities", nargs="*", help="key=Lieu ou key=lat,lon[,dist]")
+    parser.add_argument("--cities-file", help="CSV : key, place ou key, lat, lon[, dist]")
+    parser.add_argument("--fetch-workers", type=int, default=2)
+    parser.add_argument("--convert-workers", type=int, default=2)
+    parser.add_argument("--analyze-workers", type=int, default=1)
+    parser.add_argument("--profile", choices=sorted(analyzer.PROFILES), default=analyzer.DEFAULT_PROFILE)
+    parser.add_argument("--extract", default=osm_extract.OSM_EXTRACT,
+                        help="Extrait OSM local (.osm.pbf / .osm.xml) au lieu d'Overpass")
+    parser.add_argument("--kreiss-mode", choices=["corner", "full"], default=analyzer.KREISS_MODE,
+                        help="Échelle de la colonne kreiss (doit être celle du master existant)")
+    parser.add_argument("--retry-failed", action="store_true", help="Reprend aussi les villes en échec")
+    args = parser.parse_args()
+
+    cities = [parse_city(c) for c in args.cities]
+    if args.cities_file:
+        cities += read_cities_file(args.cities_file)
+    if not cities:
+        parser.error("aucune ville")
+
+    pipeline = AcquisitionPipeline(cities, args.fetch_workers, args.convert_workers, args.analyze_workers, args.profile,
+                                   extract=args.extract, kreiss_mode=args.kreiss_mode)
+    if not args.retry_failed:
+        skipped = [c['key'] for c in cities if pipeline.state.get(c['key']).get('status') == 'failed']
+        if skipped:
+            print(f"Villes en échec ignorées (--retry-failed pour les reprendre) : {', '.join(skipped)}")
+        pipeline.cities = [c for c in cities if c['key'] not in skipped]
+    results = pipeline.run()
+    print_summary(results, pipeline.elapsed_s)
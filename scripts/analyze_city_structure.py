@@ -3,91 +3,83 @@ import sys
 import argparse
 import traceback
 import json
+import time
 import numpy as np
 import scipy.sparse as sp
-from scipy.sparse.linalg import eigs, svds
-import sumolib
 import osmnx as ox
-import subprocess
 import networkx as nx
 import pandas as pd
 import folium
 
-import requests
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import net_loader
+import net_contract
+import gazetteer
+import net_store
+import osm_cache
+import kreiss
+import spectral_cache
+import spectral_solvers
+
+# Réponses OSM (Overpass / Nominatim) : cache compressé et borné
+osm_cache.install()
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 NET_DIR = os.path.join(BASE_DIR, "data", "networks")
 REPORT_DIR = os.path.join(BASE_DIR, "reports")
+MASTER_FILE = os.path.join(BASE_DIR, "data", "spectral_features_master.csv")
+# Nombre de rues critiques classées par importance spectrale
+TOP_K_CRITICAL = 10
+# Indice de non-normalité : 'full' (réseau entier) ou 'corner' (ancien coin 500 x 500).
+# Le modèle XGBoost a été entraîné sur 'corner' : à garder tant qu'il n'est pas réentraîné
+# (les deux échelles ne se mélangent jamais dans le master, colonne kreiss_mode)
+KREISS_MODE = "corner"
+# À incrémenter quand le calcul change : les résultats en cache deviennent obsolètes
+ANALYSIS_VERSION = 3
+# Profils d'analyse : "full" garde les spectres des graphiques du tableau de bord,
+# "features" ne calcule que rho, sigma_max et (u1, v1), ce qui alimente le modèle,
+# "interactive" (application, tableau de bord) borne le balayage de Kreiss à 5 s.
+# budget_s : limite souple de chaque calcul ARPACK (dépassée au plus d'un redémarrage et
+# de l'itération de la puissance de repli, voir spectral_solvers)
+PROFILES = {
+    "full": {"k_eig": 50, "k_svd": 30, "tol": 0.0, "budget_s": None, "kreiss_budget_s": kreiss.BUDGET_S},
+    "interactive": {"k_eig": 50, "k_svd": 30, "tol": 0.0, "budget_s": None, "kreiss_budget_s": 5.0},
+    "features": {"k_eig": 1, "k_svd": 1, "tol": 1e-6, "budget_s": 20.0, "kreiss_budget_s": 0},
+}
+DEFAULT_PROFILE = "full"
 os.makedirs(NET_DIR, exist_ok=True)
 os.makedirs(REPORT_DIR, exist_ok=True)
 
 def search_potential_cities(query):
-    """Queries Nominatim to find potential matches for a city name"""
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {
-        "q": query,
-        "format": "json",
-        "addressdetails": 1,
-        "limit": 5,
-        "featuretype": "settlement" # Focus on cities/towns
-    }
-    headers = {"User-Agent": "UrbanTopologyResearchLab/1.0"}
-    try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            results = response.json()
-            candidates = []
-            for r in results:
-                addr = r.get('address', {})
-                postcode = addr.get('postcode', 'N/A')
-                city = addr.get('city') or addr.get('town') or addr.get('village') or addr.get('municipality')
-                country = addr.get('country', '')
-                display_name = r.get('display_name')
-                
-                candidates.append({
-                    "display_name": display_name,
-                    "city": city,
-                    "postcode": postcode,
-                    "country": country,
-                    "lat": r.get('lat'),
-                    "lon": r.get('lon'),
-                    "osm_id": r.get('osm_id')
-                })
-            return candidates
-    except Exception as e:
-        print(f"Search error: {e}")
-    return []
+    """Finds potential matches for a city name (local gazetteer, Nominatim on a miss)"""
+    candidates = []
+    for e in gazetteer.get_gazetteer().lookup(query, limit=5):
+        candidates.append({
+            "display_name": e['display_name'],
+            "city": e.get('city'),
+            "postcode": e.get('postcode') or 'N/A',
+            "country": e['country'],
+            "lat": e['lat'],
+            "lon": e['lon'],
+            "osm_id": e['osm_id']
+        })
+    return candidates
 
-def download_city_map(city_query):
-    """Downloads map from OSM and converts to SUMO .net.xml"""
+def download_city_map(city_query, extract=None):
+    """Downloads map from OSM and converts to SUMO .net.xml
+
+    Built once per request through net_store (same netconvert options as the batch
+    scripts). With a local extract (`extract` or OSM_EXTRACT) the city is clipped
+    from it around its place=* node instead of querying Overpass.
+    """
     print(f"\n--- 1. ACQUISITION : {city_query} ---")
     safe_name = city_query.replace(" ", "_").replace(",", "").lower()
     net_file = os.path.join(NET_DIR, f"{safe_name}.net.xml")
-    
-    if os.path.exists(net_file):
-        print(f"  Map already exists: {net_file}")
-        return net_file, safe_name
 
     try:
-        print(f"  Querying OpenStreetMap via OSMnx...")
-        G = ox.graph_from_place(city_query, network_type='drive', simplify=False)
-        
-        osm_file = os.path.join(NET_DIR, f"{safe_name}.osm.xml")
-        ox.save_graph_xml(G, filepath=osm_file)
-        
-        cmd = [
-            "netconvert",
-            "--osm-files", osm_file,
-            "-o", net_file,
-            "--geometry.remove", "true",
-            "--roundabouts.guess", "true",
-            "--junctions.join", "true",
-            "--no-turnarounds", "true"
-        ]
-        
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        os.remove(osm_file)
+        _, built = net_store.build_network(place=city_query, dist=None, net_file=net_file, extract=extract)
+        print(f"  {'Map built' if built else 'Map already exists'}: {net_file}")
         return net_file, safe_name
         
     except Exception as e:
@@ -126,106 +118,175 @@ def generate_interactive_map(city_query, highlight_edge=None, center=None, zoom=
 def get_edge_by_id(net_file, edge_id):
     """Retrieves metadata and geometry (WGS84) for a specific Edge ID"""
     try:
-        net = sumolib.net.readNet(net_file)
-        edge = net.getEdge(edge_id)
-        shape = edge.getShape()
+        net = net_loader.load_net(net_file)
+        i = net_loader.edge_index(net, edge_id)
         
-        # Determine if coords are local XY or Lat/Lon
         # Convert XY to WGS84 for mapping
-        coords = []
-        for x, y in shape:
-            lon, lat = net.convertXY2LonLat(x, y)
-            coords.append((lat, lon))
+        coords = net_loader.edge_coords(net, i)
             
         return {
-            "id": edge.getID(),
-            "name": edge.getName() or edge.getID(),
-            "length": edge.getLength(),
-            "lanes": len(edge.getLanes()),
+            "id": net['edge_ids'][i],
+            "name": net['edge_names'][i] or net['edge_ids'][i],
+            "length": float(net['edge_length'][i]),
+            "lanes": int(net['edge_lanes'][i]),
             "coords": coords
         }
     except:
         return None
 
-def analyze_topology(net_file):
-    """Computes advanced graph metrics including singular mode identification"""
-    print(f"\n log : analyse topologique")
+def rank_critical_streets(net, u1, v1, top_k=TOP_K_CRITICAL, reduced=None):
+    """Top-K edges by spectral importance |u1[from] * v1[to]|, with WGS84 geometry.
+
+    Vectorized over the edge index arrays (O(m) selection with np.partition); ties are
+    broken by file order, so the first entry is the single critical street of the
+    former loop. With `reduced` (net_contract), u1/v1 are indexed by the reduced graph
+    and each street is a whole contracted chain (its SUMO edge IDs in 'edge_ids').
+    """
+    edges = reduced if reduced is not None else net
+    importance = np.abs(u1[edges['edge_from']] * v1[edges['edge_to']])
+    m = len(importance)
+    k = min(top_k, m)
+    if k <= 0:
+        return []
+    candidates = np.arange(m)
+    if k < m:
+        threshold = np.partition(importance, m - k)[m - k]
+        candidates = np.flatnonzero(importance >= threshold)
+    ranked = candidates[np.lexsort((candidates, -importance[candidates]))][:k]
+
+    streets = []
+    for rank, i in enumerate(ranked, start=1):
+        if reduced is not None:
+            chain = net_contract.chain_street(net, reduced, i)
+            streets.append({"rank": rank, "id": chain['id'], "name": chain['name'],
+                            "importance": float(importance[i]), "coords": chain['coords'],
+                            "edge_ids": chain['edge_ids']})
+            continue
+        streets.append({
+            "rank": rank,
+            "id": net['edge_ids'][i],
+            "name": net['edge_names'][i] or net['edge_ids'][i],
+            "importance": float(importance[i]),
+            "coords": net_loader.edge_coords(net, i)
+        })
+    return streets
+
+def critical_streets_geojson(streets):
+    """GeoJSON FeatureCollection of ranked critical streets (coordinates in lon, lat)"""
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in cs['coords']]},
+            "properties": {k: cs[k] for k in ("rank", "id", "name", "importance")}
+        } for cs in streets]
+    }
+
+def analyze_topology(net_file, top_k=TOP_K_CRITICAL, kreiss_budget_s=None, kreiss_mode=KREISS_MODE,
+                     use_cache=True, profile=DEFAULT_PROFILE, scc=False, contract=False):
+    """Computes advanced graph metrics including singular mode identification.
+
+    `profile` selects the solver configuration (PROFILES); `kreiss_budget_s`
+    overrides the resolvent scan budget of the profile. With `scc`, eigenvalues are
+    computed per strongly connected component (trivial components skipped). With
+    `contract`, degree-2 chains are collapsed first (net_contract) and the spectral
+    features are those of the reduced graph.
+    """
+    print(f"\n log : analyse topologique (profil {profile})")
     
     try:
-        net = sumolib.net.readNet(net_file)
-        nodes = net.getNodes()
-        edges = net.getEdges()
-        n_nodes = len(nodes)
+        config = PROFILES[profile]
+        if kreiss_budget_s is None:
+            kreiss_budget_s = config['kreiss_budget_s']
+        cache_key = None
+        if use_cache:
+            params = {"version": ANALYSIS_VERSION, "profile": profile, "scc": scc, "contract": contract, "top_k": top_k,
+                      "kreiss_budget_s": kreiss_budget_s, "kreiss_mode": kreiss_mode}
+            cache_key = spectral_cache.cache_key(net_file, params)
+            cached = spectral_cache.load(cache_key)
+            if cached is not None:
+                print(f"  [CACHE] analyse relue ({cache_key})")
+                return cached
+
+        timings = {}
+        t0 = time.time()
+        # Lecture directe du .net.xml en tableaux NumPy + matrice CSR (sans objets sumolib)
+        net = net_loader.load_net(net_file)
+        n_nodes = len(net['node_ids'])
+        n_edges = len(net['edge_ids'])
+        timings['load_s'] = time.time() - t0
         
         if n_nodes < 2: return None
 
-        node_id_map = {n.getID(): i for i, n in enumerate(nodes)}
-        row, col, data = [], [], []
-        
-        for e in edges:
-            u, v = e.getFromNode().getID(), e.getToNode().getID()
-            if u in node_id_map and v in node_id_map:
-                row.append(node_id_map[u]); col.append(node_id_map[v]); data.append(1.0)
-        
-        A = sp.csr_matrix((data, (row, col)), shape=(n_nodes, n_nodes))
+        A = net['adjacency']
+        reduced = None
+        if contract:
+            t0 = time.time()
+            reduced = net_contract.contract_degree2(net)
+            A = reduced['adjacency']
+            timings['contract_s'] = time.time() - t0
+            print(f"  Contraction : {A.shape[0]}/{n_nodes} nœuds, {A.nnz}/{n_edges} arcs")
+            if A.shape[0] < 2: return None
+        n_spec = A.shape[0]
         
         # 1. Eigenvalues (Spectrum)
-        k_eig = min(50, n_nodes - 2)
-        evals = eigs(A, k=k_eig, which='LM', return_eigenvectors=False)
+        t0 = time.time()
+        k_eig = min(config['k_eig'], n_spec - 2)
+        scc_info = None
+        if scc:
+            evals, eig_converged, scc_info = spectral_solvers.scc_eigenvalues(
+                A, k_eig, config['tol'], config['budget_s'])
+            print(f"  {scc_info['scc_count']} composantes fortement connexes non triviales "
+                  f"({scc_info['scc_nodes']}/{n_spec} nœuds, la plus grande : {scc_info['scc_largest']})")
+        else:
+            evals, eig_converged = spectral_solvers.eigenvalues(A, k_eig, config['tol'], config['budget_s'])
         spectral_radius = float(np.max(np.abs(evals)))
+        timings['eigs_s'] = time.time() - t0
         
         # 2. SVD (Singular Modes)
-        # We take several singular values for the scree plot
-        k_svd = min(30, n_nodes - 2)
-        u_vectors, s, vt_vectors = svds(A, k=k_svd)
-        # Re-sort SVD results as svds returns them in ascending order
-        idx = s.argsort()[::-1]
-        s = s[idx]
-        u_vectors = u_vectors[:, idx]
-        vt_vectors = vt_vectors[idx, :]
+        # We take several singular values for the scree plot (full profile)
+        t0 = time.time()
+        k_svd = min(config['k_svd'], n_spec - 2)
+        u_vectors, s, vt_vectors, svd_converged = spectral_solvers.singular_triplets(
+            A, k_svd, config['tol'], config['budget_s'])
+        timings['svds_s'] = time.time() - t0
+        if not (eig_converged and svd_converged):
+            print("  ATTENTION : budget de calcul atteint, estimation par itération de la puissance")
         
         sigma_max = float(s[0])
         u1 = u_vectors[:, 0]
         v1 = vt_vectors[0, :]
         
-        # 3. Critical Street identification
-        max_importance = -1.0
-        critical_edge = None
-        for e in edges:
-            u_id, v_id = e.getFromNode().getID(), e.getToNode().getID()
-            if u_id in node_id_map and v_id in node_id_map:
-                importance = abs(u1[node_id_map[u_id]] * v1[node_id_map[v_id]])
-                if importance > max_importance:
-                    max_importance = importance
-                    critical_edge = e
-        
-        critical_data = None
-        if critical_edge:
-            shape = critical_edge.getShape()
-            coords = []
-            for x, y in shape:
-                lon_c, lat_c = net.convertXY2LonLat(x, y)
-                coords.append((lat_c, lon_c))
-                
-            critical_data = {
-                "id": critical_edge.getID(),
-                "name": critical_edge.getName() or critical_edge.getID(),
-                "importance": float(max_importance),
-                "coords": coords
-            }
+        # 3. Critical Street identification (top-K)
+        t0 = time.time()
+        critical_streets = rank_critical_streets(net, u1, v1, top_k, reduced)
+        critical_data = critical_streets[0] if critical_streets else None
+        timings['critical_s'] = time.time() - t0
 
         # 4. Norms & Kreiss
+        t0 = time.time()
         h2_norm = float(np.sqrt(np.sum(A.data**2))) 
         
-        # Kreiss approximation (Commutator norm)
-        sample_size = min(500, n_nodes)
-        A_small = A[:sample_size, :sample_size].todense()
-        commutator = np.dot(A_small, A_small.T) - np.dot(A_small.T, A_small)
-        kreiss_constant = (float(np.linalg.norm(commutator)) / sample_size) * 1000
+        # Kreiss approximation (Commutator norm), sparse sur tout le réseau
+        commutator = kreiss.kreiss_index(A, mode=kreiss_mode)
+        kreiss_constant = commutator['kreiss']
+        timings['commutator_s'] = time.time() - t0
 
-        return {
+        # Vraie constante de Kreiss de A/rho (balayage de la résolvante, réseau entier)
+        kreiss_scan = None
+        t0 = time.time()
+        if kreiss_budget_s:
+            kreiss_scan = kreiss.estimate_kreiss(A, spectral_radius, budget_s=kreiss_budget_s)
+            print(f"  Kreiss (résolvante) : {kreiss_scan['kreiss']:.4f} "
+                  f"({kreiss_scan['n_points']} points, {kreiss_scan['elapsed_s']:.1f}s"
+                  f"{'' if kreiss_scan['converged'] else ', budget atteint'})")
+        timings['kreiss_scan_s'] = time.time() - t0
+        timings['total_s'] = sum(timings.values())
+        print("  Temps : " + " | ".join(f"{k[:-2]} {v:.2f}s" for k, v in timings.items()))
+
+        metrics = {
             "node_count": n_nodes,
-            "edge_count": len(edges),
+            "edge_count": n_edges,
             "spectral_radius": float(spectral_radius),
             "eigenvalues": [{"real": float(np.real(e)), "imag": float(np.imag(e))} for e in evals],
             "singular_values": [float(val) for val in s],
@@ -234,20 +295,31 @@ def analyze_topology(net_file):
             "h2_norm": float(h2_norm),
             "h_inf_norm": float(sigma_max),
             "kreiss_constant": float(kreiss_constant),
+            "kreiss_stderr": commutator['stderr'],
+            "kreiss_method": f"{commutator['mode']}/{commutator['method']}",
+            "kreiss_resolvent": kreiss_scan['kreiss'] if kreiss_scan else None,
+            "kreiss_resolvent_scan": kreiss_scan,
             "critical_street": critical_data,
-            "avg_degree": float(len(edges) / n_nodes)
+            "critical_streets": critical_streets,
+            "avg_degree": float(n_edges / n_nodes),
+            "profile": profile,
+            "scc": scc_info,
+            "contraction": {"nodes": n_spec, "edges": len(reduced['chains']),
+                            "node_ratio": n_spec / n_nodes} if reduced is not None else None,
+            "solver_converged": bool(eig_converged and svd_converged),
+            "timings": timings
         }
+        if cache_key:
+            spectral_cache.store(cache_key, metrics)
+        return metrics
 
     except Exception as e:
         print(f"Error: {e}"); traceback.print_exc(); return None
 
-def save_to_master_csv(city_name, metrics):
-    """Appends spectral metrics to a master CSV for AI training"""
-    master_file = os.path.join(BASE_DIR, "data", "spectral_features_master.csv")
-    os.makedirs(os.path.dirname(master_file), exist_ok=True)
-    
+def master_row(city_name, metrics):
+    """Row of spectral_features_master.csv for one city"""
     # Flatten metrics for CSV (handling lists/dicts)
-    row_data = {
+    return {
         "city": city_name,
         "nodes": metrics['node_count'],
         "edges": metrics['edge_count'],
@@ -255,25 +327,59 @@ def save_to_master_csv(city_name, metrics):
         "sigma_max": metrics['h_inf_norm'],
         "h2_norm": metrics['h2_norm'],
         "kreiss": metrics['kreiss_constant'],
+        "kreiss_mode": metrics['kreiss_method'].split('/')[0],
         "avg_degree": metrics['avg_degree'],
         "critical_street_id": metrics['critical_street']['id'] if metrics.get('critical_street') else "N/A"
     }
-    
-    df = pd.DataFrame([row_data])
-    if not os.path.exists(master_file):
-        df.to_csv(master_file, index=False)
-    else:
-        df.to_csv(master_file, mode='a', header=False, index=False)
 
-def generate_report(city_name, safe_name, metrics):
+def write_master_csv(rows, master_file=MASTER_FILE):
+    """Upserts rows (one per city) into the master CSV atomically.
+
+    The previous rows of the same cities are replaced; the new file is written next
+    to the old one and swapped in with os.replace, so readers never see a partial file.
+    Rows whose `kreiss` scale (kreiss_mode) differs from the rest of the file are
+    rejected with ValueError: the other cities must be recomputed in that mode first.
+    """
+    os.makedirs(os.path.dirname(master_file), exist_ok=True)
+    df = pd.DataFrame(rows)
+    if os.path.exists(master_file):
+        old = pd.read_csv(master_file)
+        key = lambda c: c.astype(str).str.lower().str.replace('-', '_')
+        old = old[~key(old['city']).isin(key(df['city']))]
+        # Lignes antérieures à la colonne : coin 500 x 500
+        old_modes = set(old['kreiss_mode'].fillna('corner')) if 'kreiss_mode' in old else ({'corner'} if len(old) else set())
+        new_modes = set(df['kreiss_mode']) if 'kreiss_mode' in df else set()
+        if len(old_modes | new_modes) > 1:
+            raise ValueError(f"kreiss_mode {sorted(new_modes)} incompatible avec le master ({sorted(old_modes)}) : "
+                             f"réanalyser toutes les villes dans le même mode")
+        if len(old) and 'kreiss_mode' in df and 'kreiss_mode' not in old:
+            old = old.assign(kreiss_mode='corner')
+        df = pd.concat([old, df], ignore_index=True)
+    tmp = master_file + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, master_file)
+
+def save_to_master_csv(city_name, metrics):
+    """Saves the spectral metrics of one city to the master CSV for AI training"""
+    write_master_csv([master_row(city_name, metrics)])
+
+def generate_report(city_name, safe_name, metrics, save_master=True):
     """Generates a detailed scientific report and saves AI features"""
-    save_to_master_csv(city_name, metrics)
+    if save_master:
+        save_to_master_csv(city_name, metrics)
     filename = os.path.join(REPORT_DIR, f"REPORT_{safe_name.upper()}.md")
     meta_file = os.path.join(REPORT_DIR, f"META_{safe_name.upper()}.json")
+    geojson_file = os.path.join(REPORT_DIR, f"CRITICAL_{safe_name.upper()}.geojson")
     
     cs = metrics.get('critical_street')
     sector_info = f"**{cs['name']}** (ID: `{cs['id']}`)" if cs else "Non identifié"
     cs_importance = cs['importance'] if (cs and 'importance' in cs) else 0.0
+    kr = metrics.get('kreiss_resolvent_scan')
+    kreiss_info = (f"Constante de Kreiss de $A/\\rho$ (balayage de la résolvante sur {kr['n_points']} points) : "
+                   f"**{kr['kreiss']:.4f}**{'' if kr['converged'] else ' (borne inférieure, budget de calcul atteint)'}."
+                   if kr else "Balayage de la résolvante non effectué.")
+    ranking = "\n".join(f"{c['rank']}. {c['name']} (`{c['id']}`) : {c['importance']:.6f}"
+                        for c in metrics.get('critical_streets', []))
 
     # User's provided detailed interpretation
     interpretation = f"""
@@ -291,11 +397,15 @@ Le fait que $\\sigma_{{max}} \\approx \\rho$ signifie que l'amplification maxima
 
 ### 4. Indice de Kreiss ($K = {metrics['kreiss_constant']:.4f}$)
 C'est le signal le plus critique. Avec $K \\gg \\sigma_{{max}}$, la **non-normalité** est massive. Le système peut amplifier une perturbation locale de manière disproportionnée (effet papillon), provoquant des explosions transitoires de congestion.
+{kreiss_info}
 
 ## Identification du Secteur Critique (Pivot de Perron-Frobenius)
 - **Rue Critique** : {sector_info}
 - **Poids Spectral** : {cs_importance:.6f}
 - **Action Recommandée** : Casser la non-normalité sur cet axe (pénalisation des hubs dominants, splitting d'arcs).
+
+### Classement des rues critiques
+{ranking or "Non disponible"}
 """
 
     content = f"""# Rapport d'Excellence Spectrale : {city_name}
@@ -307,12 +417,20 @@ C'est le signal le plus critique. Avec $K \\gg \\sigma_{{max}}$, la **non-normal
 """
     with open(filename, "w", encoding="utf-8") as f: f.write(content)
     with open(meta_file, "w") as f: json.dump(metrics, f)
+    if metrics.get('critical_streets'):
+        with open(geojson_file, "w", encoding="utf-8") as f:
+            json.dump(critical_streets_geojson(metrics['critical_streets']), f)
         
     return filename
 
 if __name__ == "__main__":
-    city = sys.argv[1] if len(sys.argv) > 1 else "Monaco"
-    net, safe = download_city_map(city)
+    parser = argparse.ArgumentParser(description="Acquisition et analyse spectrale d'une ville")
+    parser.add_argument("city", nargs="?", default="Monaco")
+    parser.add_argument("--extract", help="Extrait OSM local (.osm.pbf / .osm.xml) au lieu d'Overpass")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="interactive")
+    args = parser.parse_args()
+    city = args.city
+    net, safe = download_city_map(city, args.extract)
     if net:
-        m = analyze_topology(net)
+        m = analyze_topology(net, profile=args.profile)
         if m: generate_report(city, safe, m)
@@ -0,0 +1,127 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import analyze_city_structure as analyzer
+import kreiss
+import spectral_solvers
+
+# Spectral analysis of every network of data/networks (or a subset) in parallel
+# worker processes. Each worker analyses one city and writes its report; the master
+# CSV is updated once, atomically, by the parent process with all successful cities.
+#
+#   python scripts/batch_analyze.py                          # tous les réseaux
+#   python scripts/batch_analyze.py paris lyon --workers 2 --profile features
+#   python scripts/batch_analyze.py --kreiss-mode full      # réseau entier (master vide ou déjà en full)
+
+NET_SUFFIXES = (".net.xml.gz", ".net.xml")
+
+
+def city_of(net_file):
+    name = os.path.basename(net_file)
+    for suffix in NET_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def list_networks(net_dir=analyzer.NET_DIR, cities=None):
+    """Network files of `net_dir`, optionally restricted to some city names"""
+    files = sorted(set(glob.glob(os.path.join(net_dir, "*.net.xml")) + glob.glob(os.path.join(net_dir, "*.net.xml.gz"))))
+    if cities:
+        wanted = {c.lower().replace('-', '_') for c in cities}
+        files = [f for f in files if city_of(f).lower().replace('-', '_') in wanted]
+    return files
+
+
+def _init_worker():
+    # Un seul processus par ville : pas de pool imbriqué (balayage de Kreiss, composantes)
+    kreiss.WORKERS = 1
+    spectral_solvers.WORKERS = 1
+
+
+def analyze_one(net_file, profile=analyzer.DEFAULT_PROFILE, use_cache=True, scc=False, contract=False,
+                kreiss_mode=analyzer.KREISS_MODE):
+    """Analyses one network and writes its report; returns a summary dict"""
+    city = city_of(net_file)
+    start = time.time()
+    try:
+        metrics = analyzer.analyze_topology(net_file, kreiss_mode=kreiss_mode, profile=profile, use_cache=use_cache,
+                                            scc=scc, contract=contract)
+        if not metrics:
+            return {'city': city, 'ok': False, 'elapsed_s': time.time() - start, 'error': "analyse impossible (voir le journal)"}
+        analyzer.generate_report(city, city, metrics, save_master=False)
+        return {'city': city, 'ok': True, 'elapsed_s': time.time() - start,
+                'nodes': metrics['node_count'], 'row': analyzer.master_row(city, metrics)}
+    except Exception as e:
+        traceback.print_exc()
+        return {'city': city, 'ok': False, 'elapsed_s': time.time() - start, 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_batch(net_files, workers=None, profile=analyzer.DEFAULT_PROFILE, use_cache=True, scc=False, contract=False,
+              kreiss_mode=analyzer.KREISS_MODE):
+    """Analyses the networks in a process pool; returns the summaries (completion order)"""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(net_files)))
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(analyze_one, f, profile, use_cache, scc, contract, kreiss_mode): f for f in net_files}
+            for fut in as_completed(futures):
+                try:
+                    res = fut.result()
+                except Exception as e:   # worker tué (mémoire...) : BrokenProcessPool
+                    res = {'city': city_of(futures[fut]), 'ok': False, 'elapsed_s': 0.0,
+                           'error': f"{type(e).__name__}: {e}"}
+                results.append(res)
+                status = "OK" if res['ok'] else f"ÉCHEC ({res['error']})"
+                print(f"  [{len(results)}/{len(net_files)}] {res['city']} : {status} en {res['elapsed_s']:.1f}s")
+    finally:
+        # Les villes terminées sont enregistrées même si le lot est interrompu
+        rows = [r['row'] for r in results if r['ok']]
+        if rows:
+            analyzer.write_master_csv(rows)
+    return results
+
+
+def print_summary(results):
+    print("\n--- RÉCAPITULATIF ---")
+    print(f"  {'Ville':<25} {'Statut':<8} {'Temps':>9} {'Nœuds':>9}")
+    for r in sorted(results, key=lambda r: r['elapsed_s'], reverse=True):
+        nodes = f"{r['nodes']:>9}" if r.get('nodes') is not None else f"{'-':>9}"
+        print(f"  {r['city']:<25} {'OK' if r['ok'] else 'ÉCHEC':<8} {r['elapsed_s']:>8.1f}s {nodes}")
+    failures = [r for r in results if not r['ok']]
+    for r in failures:
+        print(f"  ! {r['city']} : {r['error']}")
+    print(f"{len(results) - len(failures)} ville(s) analysée(s), {len(failures)} échec(s), "
+          f"{sum(r['elapsed_s'] for r in results):.1f}s de calcul cumulé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse spectrale de tous les réseaux SUMO")
+    parser.add_argument("cities", nargs="*", help="Villes à analyser (défaut : tous les réseaux)")
+    parser.add_argument("--net-dir", default=analyzer.NET_DIR)
+    parser.add_argument("--workers", type=int, help="Processus en parallèle (défaut : un par cœur)")
+    parser.add_argument("--profile", choices=sorted(analyzer.PROFILES), default=analyzer.DEFAULT_PROFILE)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore le cache des analyses")
+    parser.add_argument("--scc", action="store_true", help="Valeurs propres par composante fortement connexe")
+    parser.add_argument("--contract", action="store_true", help="Contracte les chaînes de degré 2 avant l'analyse")
+    parser.add_argument("--kreiss-mode", choices=["corner", "full"], default=analyzer.KREISS_MODE,
+                        help="Échelle de la colonne kreiss (un master n'en mélange jamais deux)")
+    args = parser.parse_args()
+
+    files = list_networks(args.net_dir, args.cities)
+    if not files:
+        print(f"Aucun réseau trouvé dans {args.net_dir}")
+        sys.exit(1)
+    print(f"{len(files)} réseau(x) à analyser (profil {args.profile}, kreiss {args.kreiss_mode})")
+    t0 = time.time()
+    results = run_batch(files, args.workers, args.profile, not args.no_cache, args.scc, args.contract,
+                        args.kreiss_mode)
+    print_summary(results)
+    print(f"Durée totale : {time.time() - t0:.1f}s")
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
@@ -1,23 +1,26 @@
-import sumolib
 import os
 import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 NET_FILE = os.path.join(BASE_DIR, "data", "networks", "paris.net.xml")
 
+sys.path.append(os.path.join(BASE_DIR, "scripts"))
+import net_loader
+
 print(f"Testing {NET_FILE}")
 if not os.path.exists(NET_FILE):
     print("File not found!")
     sys.exit(1)
 
 try:
-    net = sumolib.net.readNet(NET_FILE)
-    print(f"Nodes: {len(net.getNodes())}")
-    print(f"Edges: {len(net.getEdges())}")
+    net = net_loader.load_net(NET_FILE)
+    print(f"Nodes: {len(net['node_ids'])}")
+    print(f"Edges: {len(net['edge_ids'])}")
     
-    for i, edge in enumerate(net.getEdges()):
+    for i, edge_id in enumerate(net['edge_ids']):
         if i > 5: break
-        print(f"Edge {edge.getID()}: From {edge.getFromNode().getID()} To {edge.getToNode().getID()}")
+        u, v = net['edge_from'][i], net['edge_to'][i]
+        print(f"Edge {edge_id}: From {net['node_ids'][u]} To {net['node_ids'][v]}")
 
 except Exception as e:
     print(f"ERROR: {e}")
@@ -1,11 +1,11 @@
 import os
+import sys
 import traceback
 import glob
 import pandas as pd
 import numpy as np
 import scipy.sparse as sp
 from scipy.sparse.linalg import eigs
-import sumolib
 import xml.etree.ElementTree as ET
 
 # Configuration
@@ -17,12 +17,14 @@ OUTPUT_FILE = os.path.join(BASE_DIR, "data", "dataset_ia_complet.csv")
 # Import the advanced analyzer
 sys.path.append(os.path.join(BASE_DIR, "scripts"))
 import analyze_city_structure as analyzer
+import sim_catalog
 
 def get_spectral_properties(net_file):
     """
     Leverages the advanced analyzer to get high-fidelity spectral features.
     """
-    m = analyzer.analyze_topology(net_file)
+    # Seules les grandeurs dominantes servent ici : pas de spectres complets
+    m = analyzer.analyze_topology(net_file, profile="features")
     if not m: return None
     
     return {
@@ -40,20 +42,15 @@ def process_simulations():
     print("Starting Feature Extraction...")
     data_points = []
     
-    sim_files = glob.glob(os.path.join(SIM_DIR, "*.csv"))
+    catalog = sim_catalog.open_catalog(SIM_DIR)
     
-    for sim_file in sim_files:
-        filename = os.path.basename(sim_file).lower()
+    for sim in sim_catalog.select(catalog):
+        sim_file, filename = sim['file'], sim['filename'].lower()
         print(f"Processing Simulation: {filename}")
         
-        # Identify City
-        city = "unknown"
-        for c in ["paris", "berlin", "madrid", "los-angeles", "hanoi"]: 
-            if c in filename:
-                city = c.replace("-", "_") 
-                break
-        
-        if city == "unknown":
+        # Identify City (parsed once by the catalog)
+        city = sim['city']
+        if city is None:
             print("  Skipping: Could not identify city name in filename.")
             continue
             
@@ -70,33 +67,17 @@ def process_simulations():
             
         # 2. Get Pollution/Traffic Targets
         try:
-            chunk_size = 100000
-            total_co2 = 0
-            total_nox = 0
-            total_fuel = 0
-            weighted_speed_sum = 0
-            total_records = 0
-            
-            chunk_iter = pd.read_csv(sim_file, usecols=['CO2_g_s', 'NOx_g_s', 'speed', 'fuel_l_s'], chunksize=chunk_size, on_bad_lines='skip')
-            
-            for chunk in chunk_iter:
-                chunk = chunk.apply(pd.to_numeric, errors='coerce').fillna(0)
-                
-                total_co2 += chunk['CO2_g_s'].sum()
-                total_nox += chunk['NOx_g_s'].sum()
-                total_fuel += chunk['fuel_l_s'].sum()
-                weighted_speed_sum += chunk['speed'].sum()
-                total_records += len(chunk)
-            
-            avg_speed = weighted_speed_sum / total_records if total_records > 0 else 0
+            stats = sim_catalog.get_stats(catalog, sim, ['co2', 'nox', 'speed'])
+            if stats['n_quarantined']:
+                print(f"  Quarantined {stats['n_quarantined']} malformed line(s)")
             
             row = {
                 "city": city,
                 "simulation_file": filename,
-                "total_vehicles": 10000, 
-                "total_co2_kg": total_co2 / 1000.0,
-                "total_nox_kg": total_nox / 1000.0,
-                "avg_speed_mps": avg_speed,
+                "total_vehicles": sim['vehicles_nominal'],   # nombre nominal du nom de fichier (catalogue)
+                "total_co2_kg": stats['co2_kg'],
+                "total_nox_kg": stats['nox_kg'],
+                "avg_speed_mps": stats['avg_speed_mps'],
                 **graph_features
             }
             
@@ -0,0 +1,40 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_OK = True
+except ImportError:  # Windows
+    import msvcrt
+    FCNTL_OK = False
+
+# Inter-process lock for the read-modify-write of the small JSON indexes shared by the
+# batch worker processes, the acquisition pipeline threads and the apps
+# (spectral_cache index, osm_cache manifest). The lock is held on a companion
+# <path>.lock file; each writer uses its own temporary file before os.replace.
+
+
+@contextmanager
+def locked(path):
+    """Exclusive lock on `path` (blocks until the other holders release it)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a+b") as f:
+        if FCNTL_OK:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if FCNTL_OK:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def tmp_name(path):
+    """Temporary file name private to this process and thread"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
@@ -0,0 +1,312 @@
+import os
+import sys
+import csv
+import re
+import json
+import time
+import bisect
+import difflib
+import argparse
+import unicodedata
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import osm_cache
+
+# Local geocoding index for the city search boxes (dashboard, Final_IA app).
+# Built from the Nominatim responses already stored in cache/ (osm_cache entries, plain
+# or gzip-compressed) and from imported place lists, then kept as a compact JSON file
+# (polygons dropped) with the normalised names in sorted order, so a start only reads
+# that file. Only new or modified cache files are read again on the next start.
+#   - prefix lookup: bisect in the sorted normalised names;
+#   - fuzzy lookup (typos): character trigram index (built on the first fuzzy lookup),
+#     then difflib ratio on the best candidates;
+#   - "Name, Country" restricts the matches to entries whose address contains the rest.
+# The remote service is queried only when the index has no match; its results are
+# written back into the index.
+#
+#   python scripts/gazetteer.py versai                 # recherche locale (+ temps)
+#   python scripts/gazetteer.py --import villes.csv    # name, lat, lon[, country, importance]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+INDEX_FILE = os.path.join(BASE_DIR, "data", "gazetteer.json")
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "UrbanTopologyResearchLab/1.0"
+
+SETTLEMENT_TYPES = {"city", "town", "village", "municipality", "hamlet", "suburb", "borough", "city_district"}
+FUZZY_MIN_RATIO = 0.75
+FUZZY_CANDIDATES = 20
+MAX_PREFIX_KEYS = 200
+DUPLICATE_DEG = 0.2           # ~20 km
+INDEX_VERSION = 2             # à incrémenter quand les champs des entrées changent
+
+_CACHE_NAME = re.compile(r"[0-9a-f]{40}\.json(\.gz)?")   # nom d'une réponse osm_cache
+
+_INDEX = None
+
+
+def normalize(text):
+    """Lower case, no accents, '-' / '_' / repeated spaces -> one space"""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return " ".join(text.lower().replace("-", " ").replace("_", " ").split())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _entry(r):
+    """Compact gazetteer entry from a Nominatim result (JSON format)"""
+    display = r.get("display_name") or r.get("name") or ""
+    name = r.get("name") or display.split(",")[0]
+    address = r.get("address") or {}
+    return {
+        "name": name,
+        "display_name": display,
+        "city": address.get("city") or address.get("town") or address.get("village") or address.get("municipality"),
+        "lat": float(r["lat"]),
+        "lon": float(r["lon"]),
+        "country": address.get("country") or display.split(", ")[-1],
+        "postcode": address.get("postcode"),
+        "addresstype": r.get("addresstype") or r.get("type"),
+        "importance": float(r.get("importance") or 0.0),
+        "osm_type": r.get("osm_type"),
+        "osm_id": r.get("osm_id"),
+    }
+
+
+def _ident(e):
+    """Identity of an entry: OSM object, or normalised display name for list entries"""
+    if e.get("osm_id") is not None:
+        return (e.get("osm_type"), e.get("osm_id"))
+    return ("list", normalize(e["display_name"]))
+
+
+class Gazetteer:
+    def __init__(self, index_file=INDEX_FILE, cache_dir=CACHE_DIR):
+        self.index_file, self.cache_dir = index_file, cache_dir
+        self.entries, self.sources = [], {}
+        self._names = []              # nom normalisé de chaque entrée
+        self._keys, self._key_ids = [], []
+        self._ids = None              # construit au premier ajout
+        self._grams = None            # construit à la première recherche approchée
+        try:
+            with open(index_file, encoding="utf-8") as f:
+                data = json.load(f)
+            # Ancien format : fichiers du cache relus pour compléter les entrées
+            self.sources = data.get("sources", {}) if data.get("version") == INDEX_VERSION else {}
+            self.entries = data.get("entries", [])
+            # Noms normalisés et ordre trié enregistrés avec l'index : rien à recalculer
+            names, order = data.get("names"), data.get("order")
+            if names is None or len(names) != len(self.entries):
+                names, order = [normalize(e["name"]) for e in self.entries], None
+            self._names = names
+            if order is None or len(order) != len(self.entries):
+                self._sort_keys()
+            else:
+                self._key_ids = order
+                self._keys = [names[i] for i in order]
+        except (OSError, ValueError):
+            pass
+        if self.refresh():
+            self._sort_keys()
+            self.save()
+
+    def _insert(self, e, bulk=False):
+        """Indexes one entry; `bulk` appends its key unsorted (call _sort_keys after)"""
+        if self._ids is None:
+            self._ids = {_ident(x): i for i, x in enumerate(self.entries)}
+        ident = _ident(e)
+        if ident in self._ids:
+            self.entries[self._ids[ident]].update(e)
+            return False
+        i = len(self.entries)
+        self._ids[ident] = i
+        self.entries.append(e)
+        key = normalize(e["name"])
+        self._names.append(key)
+        if bulk:
+            self._keys.append(key)
+            self._key_ids.append(i)
+        else:
+            pos = bisect.bisect_left(self._keys, key)
+            self._keys.insert(pos, key)
+            self._key_ids.insert(pos, i)
+        if self._grams is not None:
+            for g in _trigrams(key):
+                self._grams.setdefault(g, []).append(i)
+        return True
+
+    def _sort_keys(self):
+        self._key_ids = sorted(range(len(self._names)), key=self._names.__getitem__)
+        self._keys = [self._names[i] for i in self._key_ids]
+
+    def add(self, results, bulk=False):
+        """Adds Nominatim results (list of dicts); returns the number of new entries"""
+        return sum(self._insert(_entry(r), bulk) for r in results if r.get("lat") is not None)
+
+    def refresh(self):
+        """Reads the cache files that are new or changed since the last build (bulk insert)"""
+        if not os.path.isdir(self.cache_dir):
+            return False
+        changed = False
+        for item in os.scandir(self.cache_dir):
+            # Réponses seulement (<sha1>.json[.gz]) : pas le manifeste ni les fichiers temporaires
+            if not _CACHE_NAME.fullmatch(item.name):
+                continue
+            mtime = item.stat().st_mtime_ns
+            if self.sources.get(item.name) == mtime:
+                continue
+            self.sources[item.name] = mtime
+            changed = True
+            try:
+                data = osm_cache._read(item.path)
+            except (OSError, ValueError):
+                continue
+            # Réponses Overpass (dict 'elements') : pas des résultats de géocodage
+            if isinstance(data, list):
+                self.add([r for r in data if isinstance(r, dict) and "display_name" in r], bulk=True)
+        return changed
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "sources": self.sources, "entries": self.entries,
+                       "names": self._names, "order": self._key_ids}, f, ensure_ascii=False)
+        os.replace(tmp, self.index_file)
+
+    def import_places(self, path):
+        """Place list CSV: name, lat, lon[, country, importance]"""
+        added = 0
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                country = row.get("country") or ""
+                added += self._insert({
+                    "name": row["name"], "display_name": f"{row['name']}, {country}" if country else row["name"],
+                    "city": row["name"],
+                    "lat": float(row["lat"]), "lon": float(row["lon"]), "country": country, "postcode": None,
+                    "addresstype": row.get("type") or "city", "importance": float(row.get("importance") or 0.0),
+                    "osm_type": None, "osm_id": None,
+                }, bulk=True)
+        self._sort_keys()
+        self.save()
+        return added
+
+    def _prefix(self, key):
+        pos = bisect.bisect_left(self._keys, key)
+        found = {}
+        for k, i in zip(self._keys[pos:pos + MAX_PREFIX_KEYS], self._key_ids[pos:pos + MAX_PREFIX_KEYS]):
+            if not k.startswith(key):
+                break
+            found[i] = 0.0 if k == key else 1.0
+        return found
+
+    def _fuzzy(self, key):
+        if self._grams is None:
+            self._grams = {}
+            for i, name in enumerate(self._names):
+                for g in _trigrams(name):
+                    self._grams.setdefault(g, []).append(i)
+        grams = _trigrams(key)
+        counts = Counter(i for g in grams for i in self._grams.get(g, ()))
+        found = {}
+        for i, _ in counts.most_common(FUZZY_CANDIDATES):
+            ratio = difflib.SequenceMatcher(None, key, self._names[i]).ratio()
+            if ratio >= FUZZY_MIN_RATIO:
+                found[i] = 2.0 - ratio
+        return found
+
+    def search(self, query, limit=5, settlements=True):
+        """Local matches, best first (exact, prefix, then fuzzy; importance within)"""
+        name, _, context = normalize(query.replace(",", " , ")).partition(",")
+        name = name.strip()
+        if not name:
+            return []
+        context = [c for c in (normalize(p) for p in context.split(",")) if c]
+        found = self._prefix(name) or self._fuzzy(name)
+
+        ranked = []
+        for i, score in found.items():
+            e = self.entries[i]
+            if settlements and e.get("addresstype") not in SETTLEMENT_TYPES:
+                continue
+            if context and not all(c in normalize(e["display_name"]) for c in context):
+                continue
+            ranked.append((score, -e["importance"], i))
+        ranked.sort()
+        # Même localité sous plusieurs objets OSM (limite administrative, commune, nœud
+        # place=*) : même nom et même pays à moins de DUPLICATE_DEG
+        results = []
+        for _, _, i in ranked:
+            e = self.entries[i]
+            if not any(r["name"] == e["name"] and r["country"] == e["country"]
+                       and abs(r["lat"] - e["lat"]) < DUPLICATE_DEG and abs(r["lon"] - e["lon"]) < DUPLICATE_DEG
+                       for r in results):
+                results.append(e)
+                if len(results) == limit:
+                    break
+        return results
+
+    def lookup(self, query, limit=5, remote=None):
+        """Local search; on a miss, remote(query, limit) results are indexed and returned.
+
+        `remote` defaults to nominatim_search; it returns Nominatim JSON results. They
+        are returned as is when the local filters (settlement types) reject them.
+        """
+        results = self.search(query, limit)
+        if results:
+            return results
+        try:
+            fetched = (remote or nominatim_search)(query, limit)
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
+        if fetched and self.add(fetched):
+            self.save()
+        return self.search(query, limit) or [_entry(r) for r in fetched if r.get("lat") is not None][:limit]
+
+
+def nominatim_search(query, limit=5):
+    import requests
+    params = {"q": query, "format": "json", "addressdetails": 1, "limit": limit, "featuretype": "settlement"}
+    url = requests.Request("GET", NOMINATIM_URL, params=params).prepare().url
+    # Réponse gardée dans le cache OSM (paquets hors ligne, statistiques)
+    results = osm_cache.get(url)
+    if results is None:
+        response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
+        response.raise_for_status()
+        results = response.json()
+        osm_cache.put(url, results)
+    return results
+
+
+def get_gazetteer():
+    """Process-wide index (built on first use)"""
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = Gazetteer()
+    return _INDEX
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index géographique local (réponses Nominatim en cache)")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--import", dest="import_file", help="Liste de lieux CSV : name, lat, lon[, country, importance]")
+    parser.add_argument("--remote", action="store_true", help="Interroge Nominatim si aucun résultat local")
+    args = parser.parse_args()
+
+    start = time.time()
+    gaz = get_gazetteer()
+    print(f"{len(gaz.entries)} lieu(x) indexé(s) ({(time.time() - start) * 1000:.1f} ms)")
+    if args.import_file:
+        print(f"{gaz.import_places(args.import_file)} lieu(x) ajouté(s)")
+    if args.query:
+        start = time.perf_counter()
+        results = gaz.lookup(args.query) if args.remote else gaz.search(args.query)
+        elapsed = (time.perf_counter() - start) * 1000
+        for e in results:
+            print(f"  {e['display_name'][:70]:<70} ({e['lat']:.4f}, {e['lon']:.4f})  {e['addresstype']}")
+        print(f"{len(results)} résultat(s) en {elapsed:.3f} ms")
@@ -0,0 +1,230 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+# Kreiss constant of a sparse network matrix, from its resolvent norm outside the
+# spectral disc:
+#
+#   K(A) = sup_{|z| > rho} (|z| - rho) * ||(zI - A)^-1||_2
+#
+# i.e. the Kreiss constant of A / rho (scale-free, >= 1, = 1 for a normal matrix).
+# ||(zI - A)^-1||_2 = 1 / sigma_min(zI - A) is estimated by power iteration on the
+# sparse LU factors of zI - A, so the whole network is used and nothing is densified.
+# The z grid (relative distance to the disc x angle) is evaluated in a process pool
+# and refined around the best points until the estimate stabilises or the wall-clock
+# budget is spent; at the deadline the pool is terminated, so no factorisation keeps
+# running after the call returns.
+
+BUDGET_S = 30.0
+EPS_RANGE = (1e-3, 1.0)      # |z| / rho - 1 de la grille initiale
+EPS_FLOOR = 1e-5             # on ne s'approche pas plus du disque spectral
+N_EPS, N_THETA = 5, 8        # grille initiale (theta dans [0, pi], A réelle)
+REFINE_TOP = 3               # points raffinés à chaque niveau
+MAX_LEVELS = 8
+RTOL = 1e-3                  # arrêt quand le niveau n'améliore plus l'estimation
+POWER_TOL, POWER_MAXITER = 1e-3, 30
+WORKERS = None               # processus du balayage (None : un par cœur)
+
+# Non-normality ||A A^T - A^T A||_F (feature `kreiss` of the spectral dataset):
+# exact sparse products while their size stays bounded, else a Hutchinson estimate
+# E[||C z||^2] = ||C||_F^2 over Rademacher probes z, with C z = A(A^T z) - A^T(A z)
+# computed by sparse mat-vecs in O(nnz) per probe.
+COMMUTATOR_EXACT_MAX_NNZ = 50_000_000
+COMMUTATOR_PROBES = 64
+COMMUTATOR_BLOCK = 8           # sondes traitées ensemble (mémoire n x bloc)
+LEGACY_SAMPLE = 500            # ancien calcul : coin 500 x 500 dans l'ordre du fichier
+
+_A = None   # matrice du processus (initialisée une seule fois par worker)
+
+
+def _init_worker(A):
+    global _A
+    _A = sp.csc_matrix(A, dtype=np.complex128)
+
+
+def resolvent_norm(A, z, tol=POWER_TOL, maxiter=POWER_MAXITER, seed=0):
+    """||(zI - A)^-1||_2 by power iteration on the LU factors (lower estimate)"""
+    n = A.shape[0]
+    lu = splu(sp.identity(n, dtype=np.complex128, format='csc') * z - A)
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal(n) + 1j * rng.standard_normal(n)
+    x /= np.linalg.norm(x)
+    norm = 0.0
+    for _ in range(maxiter):
+        y = lu.solve(x)
+        previous, norm = norm, float(np.linalg.norm(y))
+        x = lu.solve(y, trans='H')
+        x /= np.linalg.norm(x)
+        if norm > 0 and abs(norm - previous) <= tol * norm:
+            break
+    return norm
+
+
+def _evaluate(point, scale):
+    """Kreiss ratio (|z| - rho) * ||R(z)|| at a grid point (log10 eps, theta)"""
+    log_eps, theta = point
+    eps = 10.0 ** log_eps
+    z = scale * (1.0 + eps) * np.exp(1j * theta)
+    return point, scale * eps * resolvent_norm(_A, z)
+
+
+def _initial_grid():
+    log_eps = np.linspace(np.log10(EPS_RANGE[0]), np.log10(EPS_RANGE[1]), N_EPS)
+    thetas = np.linspace(0.0, np.pi, N_THETA + 1)
+    steps = (log_eps[1] - log_eps[0], thetas[1] - thetas[0])
+    return [(float(e), float(t)) for e in log_eps for t in thetas], steps
+
+
+def _neighbours(point, steps):
+    log_eps, theta = point
+    out = []
+    for de in (-1, 0, 1):
+        for dt in (-1, 0, 1):
+            if de == 0 and dt == 0:
+                continue
+            e = max(log_eps + de * steps[0], np.log10(EPS_FLOOR))
+            t = min(max(theta + dt * steps[1], 0.0), np.pi)
+            out.append((round(e, 12), round(t, 12)))
+    return out
+
+
+def estimate_kreiss(A, rho, budget_s=BUDGET_S, workers=None, rtol=RTOL, max_levels=MAX_LEVELS):
+    """Kreiss constant of A / rho from a refined resolvent-norm grid.
+
+    `rho` is the spectral radius (from eigs). The estimate is a lower bound that
+    increases as the grid is refined; `converged` is False when the budget ran out
+    first. `workers` = 1 evaluates in the current process.
+    """
+    start = time.time()
+    deadline = start + budget_s
+    scale = float(rho) if rho > 0 else 1.0   # rayon nul (graphe acyclique) : disque unité
+    workers = workers or WORKERS or os.cpu_count() or 1
+
+    results = {}
+    history = []
+    converged = False
+    budget_hit = False
+    grid, steps = _initial_grid()
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(A,))
+    else:
+        _init_worker(A)
+    try:
+        for level in range(max_levels):
+            todo = [p for p in dict.fromkeys(grid) if p not in results]
+            if pool is not None:
+                pending = [pool.apply_async(_evaluate, (p, scale)) for p in todo]
+                for res in pending:
+                    try:
+                        point, value = res.get(timeout=max(deadline - time.time(), 0))
+                    except multiprocessing.TimeoutError:
+                        budget_hit = True
+                        break
+                    results[point] = value
+                if budget_hit:
+                    # Points terminés entre-temps : gardés avant l'arrêt du pool
+                    for res in pending:
+                        if res.ready() and res.successful():
+                            point, value = res.get()
+                            results[point] = value
+            else:
+                for p in todo:
+                    if time.time() > deadline:
+                        budget_hit = True
+                        break
+                    point, value = _evaluate(p, scale)
+                    results[point] = value
+
+            if not results:
+                break
+            best = max(results.values())
+            history.append(best)
+            if budget_hit:
+                break
+            if level > 0 and best - history[-2] <= rtol * best:
+                converged = True
+                break
+            # Raffinement : pas divisé par deux autour des meilleurs points
+            steps = (steps[0] / 2, steps[1] / 2)
+            top = sorted(results, key=results.get, reverse=True)[:REFINE_TOP]
+            grid = [q for p in top for q in _neighbours(p, steps)]
+    finally:
+        if pool is not None:
+            # Tous les résultats utiles sont relus : les factorisations encore en cours
+            # (budget atteint, erreur) sont interrompues avec leurs processus
+            pool.terminate()
+            pool.join()
+
+    if not results:
+        return {'kreiss': float('nan'), 'z': None, 'radius_ratio': None, 'n_points': 0,
+                'levels': 0, 'converged': False, 'elapsed_s': time.time() - start, 'history': []}
+    (log_eps, theta), value = max(results.items(), key=lambda kv: kv[1])
+    z = scale * (1.0 + 10.0 ** log_eps) * np.exp(1j * theta)
+    return {
+        'kreiss': float(value),
+        'z': [float(z.real), float(z.imag)],
+        'radius_ratio': float(1.0 + 10.0 ** log_eps),
+        'n_points': len(results),
+        'levels': len(history),
+        'converged': converged,
+        'elapsed_s': time.time() - start,
+        'history': [float(h) for h in history],
+    }
+
+
+def _product_nnz_bound(A):
+    """Upper bound of nnz(A A^T) + nnz(A^T A) from row and column counts"""
+    rows = np.diff(sp.csr_matrix(A).indptr).astype(np.int64)
+    cols = np.diff(sp.csc_matrix(A).indptr).astype(np.int64)
+    return int(np.sum(rows ** 2) + np.sum(cols ** 2))
+
+
+def commutator_norm(A, max_nnz=COMMUTATOR_EXACT_MAX_NNZ, n_probes=COMMUTATOR_PROBES, seed=0):
+    """||A A^T - A^T A||_F of a sparse matrix.
+
+    Returns {'norm', 'stderr', 'method'}: 'exact' (stderr 0) when the sparse
+    products fit in `max_nnz`, else 'hutchinson' with the standard error of the
+    estimate over `n_probes` probes.
+    """
+    A = sp.csr_matrix(A, dtype=np.float64)
+    if _product_nnz_bound(A) <= max_nnz:
+        C = A @ A.T - A.T @ A
+        return {'norm': float(np.sqrt(np.sum(C.data ** 2))), 'stderr': 0.0, 'method': 'exact'}
+
+    At = A.T.tocsr()
+    rng = np.random.default_rng(seed)
+    samples = []
+    for start in range(0, n_probes, COMMUTATOR_BLOCK):
+        Z = rng.choice([-1.0, 1.0], size=(A.shape[0], min(COMMUTATOR_BLOCK, n_probes - start)))
+        CZ = A @ (At @ Z) - At @ (A @ Z)
+        samples.append(np.sum(CZ ** 2, axis=0))
+    samples = np.concatenate(samples)
+    mean = float(samples.mean())
+    norm = float(np.sqrt(mean))
+    # Erreur type de la moyenne, propagée à la racine
+    se_mean = float(samples.std(ddof=1) / np.sqrt(len(samples))) if len(samples) > 1 else 0.0
+    return {'norm': norm, 'stderr': se_mean / (2 * norm) if norm > 0 else 0.0, 'method': 'hutchinson'}
+
+
+def kreiss_index(A, mode='full', **kwargs):
+    """Feature `kreiss_constant`: commutator norm / n * 1000.
+
+    mode='full' uses the whole network; mode='corner' reproduces the former value
+    (500 x 500 corner in file order) for comparison with older datasets.
+    """
+    if mode == 'corner':
+        n = min(LEGACY_SAMPLE, A.shape[0])
+        A = sp.csr_matrix(A)[:n, :n]
+    result = commutator_norm(A, **kwargs)
+    n = A.shape[0]
+    return {
+        'kreiss': result['norm'] / n * 1000,
+        'stderr': result['stderr'] / n * 1000,
+        'method': result['method'],
+        'mode': mode,
+    }
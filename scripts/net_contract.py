@@ -0,0 +1,137 @@
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import net_loader
+
+# Degree-2 chain contraction of a network loaded by net_loader.
+# Networks downloaded with simplify=False are full of pass-through nodes: a node whose
+# only neighbours are its predecessor and its successor (one-way: 1 in, 1 out; two-way:
+# 2 in, 2 out to the same two nodes). Each chain junction -> ... -> junction becomes one
+# weighted edge; the mapping back to the original SUMO edges is kept per reduced edge.
+#
+# Weight of a reduced edge = number of original edges (hops) of its chain, so the
+# removed pass-through structure stays in the reduced adjacency; parallel chains
+# between two junctions add up. Every spectral quantity of analyze_topology (eigs,
+# svds, norms, commutator, resolvent scan) reads this weighted matrix.
+#
+#   python scripts/net_contract.py data/networks/paris.net.xml   # gain et écarts des indicateurs
+
+
+def pass_through_nodes(n_nodes, edge_from, edge_to):
+    """Boolean mask of the contractible (degree-2) nodes"""
+    indeg = np.bincount(edge_to, minlength=n_nodes)
+    outdeg = np.bincount(edge_from, minlength=n_nodes)
+    # Prédécesseurs / successeurs distincts : somme et somme des carrés suffisent à
+    # comparer les ensembles {a, b} sans boucle Python
+    pred_sum = np.bincount(edge_to, weights=edge_from, minlength=n_nodes)
+    succ_sum = np.bincount(edge_from, weights=edge_to, minlength=n_nodes)
+    pred_sq = np.bincount(edge_to, weights=edge_from.astype(np.float64) ** 2, minlength=n_nodes)
+    succ_sq = np.bincount(edge_from, weights=edge_to.astype(np.float64) ** 2, minlength=n_nodes)
+    self_loop = np.bincount(edge_from[edge_from == edge_to], minlength=n_nodes) > 0
+
+    one_way = (indeg == 1) & (outdeg == 1) & (pred_sum != succ_sum)
+    # Double sens : mêmes deux voisins en entrée et en sortie, distincts (a != b)
+    two_way = (indeg == 2) & (outdeg == 2) & (pred_sum == succ_sum) & (pred_sq == succ_sq) \
+        & (2 * pred_sq != pred_sum ** 2)
+    return (one_way | two_way) & ~self_loop
+
+
+def contract_degree2(net):
+    """Reduced graph of `net` with degree-2 chains collapsed.
+
+    Returns a dict: node_index (original index of each kept node), edge_from /
+    edge_to (reduced node indices), edge_weight (hop count of the chain), chains
+    (original edge indices of each reduced edge, in travel order) and adjacency
+    (CSR of the weights, parallel edges summed).
+    """
+    edge_from, edge_to = net['edge_from'], net['edge_to']
+    n_nodes, n_edges = len(net['node_ids']), len(edge_from)
+    inner = pass_through_nodes(n_nodes, edge_from, edge_to)
+
+    order = np.argsort(edge_from, kind='stable')
+    ptr = np.concatenate([[0], np.cumsum(np.bincount(edge_from, minlength=n_nodes))]).tolist()
+    out_edges = order.tolist()
+    src, dst = edge_from.tolist(), edge_to.tolist()
+    inner_l = inner.tolist()
+
+    used = np.zeros(n_edges, dtype=bool)
+    chains = []
+    for start in np.flatnonzero(~inner[edge_from]).tolist():
+        chain = [start]
+        prev, node = src[start], dst[start]
+        while inner_l[node]:
+            # Arc sortant qui ne revient pas en arrière (nœud à double sens)
+            nxt = next(e for e in out_edges[ptr[node]:ptr[node + 1]] if dst[e] != prev or
+                       ptr[node + 1] - ptr[node] == 1)
+            chain.append(nxt)
+            prev, node = node, dst[nxt]
+        chains.append(chain)
+        used[chain] = True
+
+    # Boucles formées uniquement de nœuds de passage : conservées telles quelles
+    leftover = np.flatnonzero(~used)
+    if len(leftover):
+        inner[edge_from[leftover]] = False
+        inner[edge_to[leftover]] = False
+        chains.extend([e] for e in leftover.tolist())
+
+    kept = np.flatnonzero(~inner)
+    new_index = np.full(n_nodes, -1, dtype=np.int64)
+    new_index[kept] = np.arange(len(kept))
+    red_from = new_index[edge_from[[c[0] for c in chains]]]
+    red_to = new_index[edge_to[[c[-1] for c in chains]]]
+    weight = np.array([len(c) for c in chains], dtype=np.float64)
+    n = len(kept)
+    return {
+        'node_index': kept,
+        'edge_from': red_from,
+        'edge_to': red_to,
+        'edge_weight': weight,
+        'chains': [np.asarray(c, dtype=np.int64) for c in chains],
+        'adjacency': sp.csr_matrix((weight, (red_from, red_to)), shape=(n, n)),
+    }
+
+
+def chain_street(net, reduced, j):
+    """Original-network description of reduced edge j (IDs, name, WGS84 geometry)"""
+    chain = reduced['chains'][j]
+    ids = [net['edge_ids'][i] for i in chain]
+    name = next((net['edge_names'][i] for i in chain if net['edge_names'][i]), ids[0])
+    coords = []
+    for i in chain:
+        part = net_loader.edge_coords(net, i)
+        coords.extend(part[1:] if coords and part and part[0] == coords[-1] else part)
+    return {"id": ids[0], "name": name, "edge_ids": ids, "coords": coords}
+
+
+if __name__ == "__main__":
+    import argparse
+    import analyze_city_structure as analyzer
+
+    parser = argparse.ArgumentParser(description="Contraction des chaînes de degré 2 : gain et écarts")
+    parser.add_argument("net_file")
+    parser.add_argument("--profile", choices=sorted(analyzer.PROFILES), default="features")
+    args = parser.parse_args()
+
+    base = analyzer.analyze_topology(args.net_file, profile=args.profile, use_cache=False)
+    red = analyzer.analyze_topology(args.net_file, profile=args.profile, use_cache=False, contract=True)
+    if not (base and red):
+        sys.exit(1)
+    c = red['contraction']
+    print(f"\nRéseau réduit : {c['nodes']}/{base['node_count']} nœuds, {c['edges']}/{base['edge_count']} arcs")
+    # Temps d'analyse hors lecture du fichier (identique dans les deux cas)
+    t_base = base['timings']['total_s'] - base['timings']['load_s']
+    t_red = red['timings']['total_s'] - red['timings']['load_s']
+    print(f"Temps d'analyse : {t_base:.2f}s -> {t_red:.2f}s (x{t_base / max(t_red, 1e-9):.1f}, "
+          f"contraction comprise : {red['timings']['contract_s']:.2f}s)")
+    for key in ('spectral_radius', 'h_inf_norm', 'h2_norm', 'kreiss_constant'):
+        delta = red[key] - base[key]
+        rel = delta / base[key] * 100 if base[key] else float('nan')
+        print(f"  {key:<16} {base[key]:>12.6f} -> {red[key]:>12.6f}  ({rel:+.2f} %)")
+    same = red['critical_street'] and base['critical_street'] and \
+        base['critical_street']['id'] in red['critical_street'].get('edge_ids', [])
+    print(f"  rue critique     {base['critical_street']['id']} -> {red['critical_street']['id']}"
+          f" ({'même tronçon' if same else 'différente'})")
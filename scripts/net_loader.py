@@ -0,0 +1,166 @@
+import gzip
+import xml.etree.ElementTree as ET
+import numpy as np
+import scipy.sparse as sp
+
+try:
+    import pyproj
+    PYPROJ_OK = True
+except ImportError:
+    PYPROJ_OK = False
+
+# Streaming loader for SUMO .net.xml (plain or gzip-compressed) into NumPy arrays and a
+# scipy.sparse CSR adjacency matrix, without sumolib's Node/Edge/Lane objects.
+# Node and edge order are the ones of sumolib.net.readNet() (default options), so
+# indices, spectra and critical streets are unchanged:
+#   - edges: non-internal edges (no `function` attribute) in file order;
+#   - nodes: from/to nodes in order of first reference by an edge, then the remaining
+#     junctions in file order (internal ':' junctions are ignored).
+# Edge geometry follows sumolib's Edge.getShape(): middle lane for an odd number of
+# lanes, point-wise average of the lane shapes otherwise.
+
+
+def _open(net_file):
+    return gzip.open(net_file, 'rb') if net_file.lower().endswith('.gz') else open(net_file, 'rb')
+
+
+def _parse_shape(text):
+    if not text:
+        return np.zeros((0, 2))
+    return np.array([p.split(',')[:2] for p in text.split()], dtype=np.float64)
+
+
+def _edge_shape_text(lane_shapes):
+    """Keeps only the lane shape(s) needed to rebuild the edge geometry later"""
+    if len(lane_shapes) % 2 == 1:
+        return lane_shapes[len(lane_shapes) // 2]
+    return "|".join(lane_shapes)
+
+
+def load_net(net_file, with_shapes=True):
+    """Reads a SUMO network in one streaming pass.
+
+    Returns a dict of parallel arrays:
+      node_ids, node_x, node_y (NaN for nodes without <junction>),
+      edge_ids, edge_names, edge_from, edge_to (node indices), edge_length (first lane,
+      like sumolib), edge_lanes, edge_shapes (raw lane shapes, see edge_shape()),
+      adjacency (n_nodes x n_nodes CSR, parallel edges summed) and location
+      (the <location> attributes used for geo-conversion).
+    """
+    node_index = {}
+    node_ids = []
+    junction_xy = {}
+    edge_ids, edge_names, edge_from, edge_to = [], [], [], []
+    edge_length, edge_lanes, edge_shapes = [], [], []
+    location = {}
+
+    def node(node_id):
+        idx = node_index.get(node_id)
+        if idx is None:
+            idx = node_index[node_id] = len(node_ids)
+            node_ids.append(node_id)
+        return idx
+
+    in_edge = False
+    lane_shapes, first_length, n_lanes = [], 0.0, 0
+    with _open(net_file) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'edge':
+                    in_edge = not elem.get('function')
+                    if in_edge:
+                        lane_shapes, first_length, n_lanes = [], 0.0, 0
+                elif tag == 'lane' and in_edge:
+                    if n_lanes == 0:
+                        first_length = float(elem.get('length', 0.0))
+                    n_lanes += 1
+                    if with_shapes:
+                        lane_shapes.append(elem.get('shape', ''))
+                continue
+
+            if tag == 'edge':
+                if in_edge:
+                    edge_ids.append(elem.get('id'))
+                    edge_names.append(elem.get('name', ''))
+                    edge_from.append(node(elem.get('from')))
+                    edge_to.append(node(elem.get('to')))
+                    edge_length.append(first_length)
+                    edge_lanes.append(n_lanes)
+                    if with_shapes:
+                        edge_shapes.append(_edge_shape_text(lane_shapes))
+                in_edge = False
+                root.clear()
+            elif tag == 'junction':
+                junction_id = elem.get('id')
+                if junction_id[0] != ':':
+                    node(junction_id)
+                    junction_xy[junction_id] = (float(elem.get('x')), float(elem.get('y')))
+                root.clear()
+            elif tag == 'location':
+                location = dict(elem.attrib)
+            elif tag != 'lane':
+                root.clear()
+
+    n_nodes = len(node_ids)
+    node_xy = np.full((n_nodes, 2), np.nan)
+    for junction_id, xy in junction_xy.items():
+        node_xy[node_index[junction_id]] = xy
+    edge_from = np.asarray(edge_from, dtype=np.int64)
+    edge_to = np.asarray(edge_to, dtype=np.int64)
+    adjacency = sp.csr_matrix((np.ones(len(edge_from)), (edge_from, edge_to)), shape=(n_nodes, n_nodes))
+
+    return {
+        'node_ids': node_ids,
+        'node_x': node_xy[:, 0],
+        'node_y': node_xy[:, 1],
+        'edge_ids': edge_ids,
+        'edge_names': edge_names,
+        'edge_from': edge_from,
+        'edge_to': edge_to,
+        'edge_length': np.asarray(edge_length, dtype=np.float64),
+        'edge_lanes': np.asarray(edge_lanes, dtype=np.int32),
+        'edge_shapes': edge_shapes,
+        'adjacency': adjacency,
+        'location': location,
+    }
+
+
+def edge_index(net, edge_id):
+    """Index of an edge ID (KeyError if absent)"""
+    lookup = net.get('_edge_index')
+    if lookup is None:
+        lookup = net['_edge_index'] = {eid: i for i, eid in enumerate(net['edge_ids'])}
+    return lookup[edge_id]
+
+
+def edge_shape(net, i):
+    """(k, 2) network coordinates of edge i, as sumolib's Edge.getShape()"""
+    if not net['edge_shapes']:
+        raise ValueError("réseau chargé sans géométrie (with_shapes=False)")
+    lanes = [_parse_shape(s) for s in net['edge_shapes'][i].split("|")]
+    if len(lanes) == 1:
+        return lanes[0]
+    k = min(len(s) for s in lanes)
+    return np.mean([s[:k] for s in lanes], axis=0)
+
+
+def xy_to_lonlat(net, x, y):
+    """Network XY -> (lon, lat) arrays, as sumolib's convertXY2LonLat()"""
+    proj_params = net['location'].get('projParameter', '!')
+    if not PYPROJ_OK or proj_params == '!':
+        raise RuntimeError("Network does not provide geo-projection or pyproj not installed.")
+    proj = net.get('_proj')
+    if proj is None:
+        proj = net['_proj'] = pyproj.Proj(projparams=proj_params)
+    x_off, y_off = map(float, net['location']['netOffset'].split(','))
+    return proj(np.asarray(x, dtype=np.float64) - x_off, np.asarray(y, dtype=np.float64) - y_off, inverse=True)
+
+
+def edge_coords(net, i):
+    """WGS84 geometry of edge i as a list of (lat, lon), like the sumolib-based code"""
+    shape = edge_shape(net, i)
+    lon, lat = xy_to_lonlat(net, shape[:, 0], shape[:, 1])
+    return list(zip(np.atleast_1d(lat).tolist(), np.atleast_1d(lon).tolist()))
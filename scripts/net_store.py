@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import osm_cache
+import osm_extract
+import spectral_cache
+
+# Content-addressed store of built SUMO networks, shared by every entry point
+# (download_cities.py, process_missing_cities.py, acquisition_pipeline.py,
+# analyze_city_structure.download_city_map, the dashboard and Final_IA/app_streamlit.py).
+# An artifact is keyed by what produced it: center point or place, radius, network type,
+# netconvert options and data source (Overpass or a local extract, by content hash).
+# An identical request is served from the store with no download or conversion; a
+# changed option or radius is a different key, so a stale network is never reused.
+#
+#   data/networks/store/<key>.net.xml    réseau SUMO
+#   data/networks/store/<key>.json       paramètres de construction, date, noms publiés
+#
+# The human-readable data/networks/<city>.net.xml files used by the analysis scripts are
+# published copies (hard links when possible) of the artifacts. A network file built
+# before the store existed has no known build parameters: before a new build is
+# published over it, it is kept in the store as a legacy artifact, keyed by its content
+# hash (legacy-<hash>), which no request lookup ever returns. --rebuild builds again
+# even when the store already has the artifact.
+#
+#   python scripts/net_store.py                     # contenu du dépôt
+#   python scripts/net_store.py --point 48.8566,2.3522 --name paris
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NET_DIR = os.path.join(BASE_DIR, "data", "networks")
+STORE_DIR = os.path.join(NET_DIR, "store")
+DEFAULT_RADIUS = 3000
+NETWORK_TYPE = "drive"
+
+# Options netconvert communes à toutes les constructions
+NETCONVERT_OPTIONS = [
+    "--geometry.remove", "true",
+    "--roundabouts.guess", "true",
+    "--ramps.guess", "true",
+    "--junctions.join", "true",
+    "--tls.guess", "true",
+    "--tls.discard-simple", "true",
+    "--tls.join", "true",
+    "--no-turnarounds", "true",
+]
+
+
+def request_spec(point=None, place=None, dist=DEFAULT_RADIUS, network_type=NETWORK_TYPE,
+                 options=NETCONVERT_OPTIONS, extract=None):
+    """Normalised description of a network build (the artifact key is its hash).
+
+    `dist=None` with a place means the whole place polygon (graph_from_place); a local
+    extract always clips a radius around the place node.
+    """
+    if point is None and not place:
+        raise ValueError("point or place required")
+    extract = extract or osm_extract.OSM_EXTRACT
+    if extract and dist is None:
+        dist = osm_extract.DEFAULT_RADIUS
+    spec = {
+        # ~1 m : un même centre saisi à la main ou géocodé donne la même clé
+        'point': [round(float(point[0]), 5), round(float(point[1]), 5)] if point is not None else None,
+        'place': None if point is not None else " ".join(place.lower().split()),
+        'dist': float(dist) if dist is not None else None,
+        'network_type': network_type,
+        'netconvert': list(options),
+        'source': ("extract:" + spectral_cache.file_digest(extract)) if extract else "overpass",
+    }
+    if extract:
+        spec['extract'] = os.path.abspath(extract)   # chemin : hors clé (seul le contenu compte)
+    return spec
+
+
+def artifact_key(spec):
+    keyed = {k: v for k, v in spec.items() if k != 'extract'}
+    return hashlib.blake2b(json.dumps(keyed, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+def artifact_path(spec, store_dir=STORE_DIR):
+    return os.path.join(store_dir, artifact_key(spec) + ".net.xml")
+
+
+def lookup(spec, store_dir=STORE_DIR):
+    """Path of the stored network for this request, or None"""
+    path = artifact_path(spec, store_dir)
+    return path if os.path.exists(path) else None
+
+
+def _published(net_file, store_dir=STORE_DIR):
+    """True when `net_file` is the published copy of a stored artifact"""
+    target = os.path.abspath(net_file)
+    return any(target in m.get('published', []) for m in entries(store_dir))
+
+
+def keep_legacy(net_file, store_dir=STORE_DIR):
+    """Stores a network file built outside the store under legacy-<content hash>"""
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, f"legacy-{spectral_cache.file_digest(net_file)}.net.xml")
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.part.net.xml"
+        try:
+            os.link(net_file, tmp)
+        except OSError:
+            shutil.copyfile(net_file, tmp)
+        os.replace(tmp, path)
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(net_file)))
+        # Paramètres de construction inconnus : jamais servi pour une requête
+        _write_meta(path, {'legacy': True, 'source': "legacy", 'created': created,
+                           'origin': os.path.abspath(net_file), 'published': []})
+        print(f"  Réseau existant conservé dans le dépôt : {os.path.basename(path)}")
+    return path
+
+
+def fetch_osm(spec, osm_file):
+    """Downloads (or clips from the extract) the OSM data of a request"""
+    if spec['source'] != "overpass":
+        osm_extract.build_osm(osm_file, point=spec['point'], dist=spec['dist'], place=spec['place'],
+                              extract=spec['extract'])
+        return
+    import osmnx as ox
+    osm_cache.install()
+    if spec['point'] is not None:
+        G = ox.graph_from_point(tuple(spec['point']), dist=spec['dist'], network_type=spec['network_type'],
+                                simplify=False)
+    else:
+        G = ox.graph_from_place(spec['place'], network_type=spec['network_type'], simplify=False)
+    tmp = osm_file + ".part.osm.xml"
+    ox.save_graph_xml(G, filepath=tmp)
+    os.replace(tmp, osm_file)
+
+
+def convert(spec, osm_file, store_dir=STORE_DIR):
+    """netconvert of `osm_file` into the store; returns the artifact path"""
+    os.makedirs(store_dir, exist_ok=True)
+    path = artifact_path(spec, store_dir)
+    tmp = f"{path}.{os.getpid()}.part.net.xml"
+    cmd = ["netconvert", "--osm-files", osm_file, "-o", tmp] + spec['netconvert']
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    os.replace(tmp, path)
+    _write_meta(path, dict(spec, created=time.strftime('%Y-%m-%d %H:%M:%S'), published=[]))
+    return path
+
+
+def _meta_file(path):
+    return path[:-len(".net.xml")] + ".json"
+
+
+def _read_meta(path):
+    try:
+        with open(_meta_file(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path, meta):
+    tmp = _meta_file(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, _meta_file(path))
+
+
+def publish(path, net_file):
+    """Makes the artifact available as `net_file` (hard link, copy otherwise).
+
+    A file of that name built outside the store is kept first (keep_legacy).
+    """
+    if os.path.exists(net_file) and os.path.samefile(path, net_file):
+        return net_file
+    store_dir = os.path.dirname(path)
+    if os.path.exists(net_file) and not _published(net_file, store_dir):
+        keep_legacy(net_file, store_dir)
+    tmp = net_file + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(path, tmp)
+    except OSError:
+        shutil.copyfile(path, tmp)
+    os.replace(tmp, net_file)
+    meta = _read_meta(path)
+    if meta:
+        meta['published'] = sorted(set(meta.get('published', [])) | {os.path.abspath(net_file)})
+        _write_meta(path, meta)
+    return net_file
+
+
+def build_network(point=None, place=None, dist=DEFAULT_RADIUS, net_file=None, network_type=NETWORK_TYPE,
+                  options=NETCONVERT_OPTIONS, extract=None, store_dir=STORE_DIR, rebuild=False):
+    """Network for a request: from the store, or downloaded and converted once.
+
+    With `net_file` the artifact is also published under that name. `rebuild` builds
+    again even when the store has it. Returns (path, built) with built=False when the
+    store already had it.
+    """
+    spec = request_spec(point, place, dist, network_type, options, extract)
+    path = None if rebuild else lookup(spec, store_dir)
+    built = path is None
+    if built:
+        os.makedirs(store_dir, exist_ok=True)
+        osm_file = os.path.join(store_dir, f"{artifact_key(spec)}.{os.getpid()}.osm.xml")
+        try:
+            fetch_osm(spec, osm_file)
+            path = convert(spec, osm_file, store_dir)
+        finally:
+            if os.path.exists(osm_file):
+                os.remove(osm_file)
+    if net_file:
+        publish(path, net_file)
+    return (net_file or path), built
+
+
+def entries(store_dir=STORE_DIR):
+    """Stored artifacts (metadata + size), most recent first"""
+    if not os.path.isdir(store_dir):
+        return []
+    result = []
+    for name in os.listdir(store_dir):
+        if name.endswith(".net.xml") and ".part" not in name:
+            path = os.path.join(store_dir, name)
+            meta = _read_meta(path)
+            meta.update(key=name[:-len(".net.xml")], bytes=os.path.getsize(path))
+            result.append(meta)
+    return sorted(result, key=lambda m: m.get('created', ''), reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dépôt des réseaux SUMO construits")
+    parser.add_argument("--point", help="lat,lon : construit (ou retrouve) ce réseau")
+    parser.add_argument("--place")
+    parser.add_argument("--dist", type=float, default=DEFAULT_RADIUS)
+    parser.add_argument("--name", help="Publie aussi le réseau sous data/networks/<name>.net.xml")
+    parser.add_argument("--extract", default=osm_extract.OSM_EXTRACT)
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit même si le réseau existe déjà")
+    args = parser.parse_args()
+
+    if args.point or args.place:
+        point = tuple(float(v) for v in args.point.split(",")) if args.point else None
+        net_file = os.path.join(NET_DIR, f"{args.name}.net.xml") if args.name else None
+        path, built = build_network(point, args.place, args.dist, net_file, extract=args.extract, rebuild=args.rebuild)
+        print(f"{'Construit' if built else 'Déjà présent'} : {path}")
+    else:
+        items = entries()
+        for m in items:
+            target = m.get('place') or m.get('point') or ("ancien : " + os.path.basename(m.get('origin', '?')))
+            names = ", ".join(os.path.basename(p) for p in m.get('published', [])) or "-"
+            print(f"  {m['key']}  {str(target):<28} r={m.get('dist')}  {m.get('source', '?')[:20]:<20} "
+                  f"{m['bytes'] / 1e6:>7.1f} Mo  {names}")
+        print(f"{len(items)} réseau(x), {sum(m['bytes'] for m in items) / 1e6:.1f} Mo")
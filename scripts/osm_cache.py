@@ -0,0 +1,439 @@
+import os
+import sys
+import json
+import gzip
+import time
+import atexit
+import tarfile
+import hashlib
+import argparse
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import file_lock
+
+# Manager of the OSM HTTP response cache (cache/, the OSMnx cache folder: one
+# <sha1(url)>.json file per Overpass / Nominatim response).
+#   - entries are gzip-compressed on disk (<sha1>.json.gz); raw .json files left by
+#     OSMnx or older runs are still read and compressed by compact();
+#   - each response kind has its TTL (geocoding results change rarely, Overpass data
+#     more often); expired entries are dropped on access and by compact();
+#   - the folder is capped at MAX_CACHE_BYTES, least recently used entries evicted first;
+#   - hits, misses and bytes saved by compression are counted in the manifest.
+# The manifest is shared by the batch worker processes, the pipeline and the apps:
+# every update is a read-modify-write under a file lock (file_lock). Lookups do not
+# write it: their access dates and counters are kept in memory and merged every
+# FLUSH_EVERY lookups, after FLUSH_S seconds, at exit and on the next put(). Pool
+# worker processes skip atexit, so they may lose at most that much access history.
+# install() routes OSMnx's own cache reads and writes through this manager.
+# seed() runs the acquisition queries of a list of cities and packs the responses they
+# used into a bundle; load_bundle() unpacks it as pinned entries (no TTL, never
+# evicted) so that a demo runs without network.
+#
+#   python scripts/osm_cache.py                          # statistiques
+#   python scripts/osm_cache.py --compact --max-mb 200
+#   python scripts/osm_cache.py --seed "Paris, France" "Lyon, France" --bundle demo.tar
+#   python scripts/osm_cache.py --load-bundle demo.tar
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+MANIFEST_FILE = "manifest.json"
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+DAY_S = 86400
+TTL_S = {
+    "nominatim": 365 * DAY_S,    # géocodage, polygones de limites
+    "overpass": 30 * DAY_S,      # réseau routier
+    "other": 7 * DAY_S,
+}
+
+FLUSH_EVERY = 50     # lectures entre deux écritures des accès dans le manifeste
+FLUSH_S = 30.0       # ... ou secondes
+
+_lock = threading.Lock()
+_installed = False
+_manifests = {}      # cache_dir -> (signature du fichier, manifeste) pour les lectures
+_pending = {}        # cache_dir -> accès et compteurs pas encore écrits
+
+
+def cache_key(url):
+    """Same file name as OSMnx: sha1 of the request URL"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def response_kind(data):
+    if isinstance(data, dict) and "elements" in data:
+        return "overpass"
+    if isinstance(data, list) and (not data or "place_id" in data[0] or "display_name" in data[0]):
+        return "nominatim"
+    return "other"
+
+
+def _load_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("entries", {})
+    manifest.setdefault("stats", {"hits": 0, "misses": 0, "expired": 0, "evicted": 0})
+    return manifest
+
+
+def _save_manifest(cache_dir, manifest):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp = file_lock.tmp_name(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def _manifest_lock(cache_dir):
+    return file_lock.locked(os.path.join(cache_dir, MANIFEST_FILE))
+
+
+def _read_manifest(cache_dir):
+    """Manifest for lookups (read only), reloaded only when the file has changed"""
+    try:
+        st = os.stat(os.path.join(cache_dir, MANIFEST_FILE))
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    cached = _manifests.get(cache_dir)
+    if cached is None or cached[0] != stamp:
+        cached = _manifests[cache_dir] = (stamp, _load_manifest(cache_dir))
+    return cached[1]
+
+
+def _merge_pending(manifest, cache_dir):
+    """Writes the lookups recorded in memory into `manifest` (manifest lock held)"""
+    pending = _pending.pop(cache_dir, None)
+    if pending is None:
+        return
+    entries = manifest["entries"]
+    for name in ("hits", "misses", "expired"):
+        manifest["stats"][name] += pending[name]
+    for key in pending["dropped"]:
+        # Entrée expirée supprimée, sauf si un autre processus l'a réécrite depuis
+        if not any(os.path.exists(p) for p in _paths(key, cache_dir)):
+            entries.pop(key, None)
+    for key, when in pending["access"].items():
+        meta = entries.get(key)
+        if meta is None:
+            # Fichier déposé par OSMnx ou une ancienne version : enregistré au passage
+            path = next((p for p in _paths(key, cache_dir) if os.path.exists(p)), None)
+            try:
+                meta = _register(manifest, key, path, _read(path), now=when) if path else None
+            except (OSError, ValueError):
+                meta = None
+        if meta is not None:
+            meta["last_access"] = max(meta["last_access"], when)
+
+
+def flush(cache_dir=None):
+    """Writes the pending lookups of `cache_dir` (all cache folders by default)"""
+    with _lock:
+        for d in [cache_dir] if cache_dir else list(_pending):
+            if d not in _pending:
+                continue
+            with _manifest_lock(d):
+                manifest = _load_manifest(d)
+                _merge_pending(manifest, d)
+                _save_manifest(d, manifest)
+
+
+atexit.register(flush)
+
+
+def _paths(key, cache_dir):
+    base = os.path.join(cache_dir, key)
+    return base + ".json.gz", base + ".json"
+
+
+def _read(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove(key, cache_dir):
+    for path in _paths(key, cache_dir):
+        try:
+            os.remove(path)
+        except FileNotFoundError:   # déjà supprimé par un autre processus
+            pass
+
+
+def _expired(meta, now):
+    return not meta.get("pinned") and now - meta["created"] > TTL_S.get(meta["kind"], TTL_S["other"])
+
+
+def _register(manifest, key, path, data, raw_bytes=None, now=None):
+    """Manifest entry of a file already on disk (kind, dates, raw / stored size)"""
+    now = now or time.time()
+    meta = manifest["entries"].get(key)
+    if meta is None:
+        meta = {"kind": response_kind(data), "created": os.path.getmtime(path), "last_access": now}
+        manifest["entries"][key] = meta
+    if raw_bytes is None:
+        raw_bytes = os.path.getsize(path) if path.endswith(".json") else len(json.dumps(data).encode("utf-8"))
+    meta["raw_bytes"] = raw_bytes
+    meta["stored_bytes"] = os.path.getsize(path)
+    return meta
+
+
+def get(url, cache_dir=CACHE_DIR):
+    """Cached response of `url`, or None (missing, expired or Overpass error remark)"""
+    key = cache_key(url)
+    path = next((p for p in _paths(key, cache_dir) if os.path.exists(p)), None)
+    data = None
+    if path is not None:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            data = _read(path)
+        except (OSError, ValueError):
+            data = None
+    with _lock:
+        pending = _pending.setdefault(cache_dir, {"hits": 0, "misses": 0, "expired": 0, "dropped": set(),
+                                                  "access": {}, "calls": 0, "since": time.time()})
+        now = time.time()
+        if data is not None:
+            meta = _read_manifest(cache_dir)["entries"].get(key)
+            if meta is None:
+                # Pas encore dans le manifeste : date de création = date du fichier
+                try:
+                    meta = {"kind": response_kind(data), "created": os.path.getmtime(path)}
+                except OSError:
+                    meta = {"kind": response_kind(data), "created": now}
+            if _expired(meta, now):
+                pending["expired"] += 1
+                pending["dropped"].add(key)
+                pending["access"].pop(key, None)
+                with _manifest_lock(cache_dir):
+                    # Sauf si un autre processus vient de la réécrire
+                    try:
+                        if os.stat(path).st_mtime_ns == mtime:
+                            _remove(key, cache_dir)
+                    except OSError:
+                        pass
+                data = None
+            elif isinstance(data, dict) and "remark" in data:
+                # Réponse Overpass incomplète (délai dépassé...) : à redemander
+                data = None
+            else:
+                pending["access"][key] = now
+        pending["hits" if data is not None else "misses"] += 1
+        pending["calls"] += 1
+        due = pending["calls"] >= FLUSH_EVERY or now - pending["since"] >= FLUSH_S
+    if due:
+        flush(cache_dir)
+    return data
+
+
+def put(url, data, cache_dir=CACHE_DIR):
+    """Stores a response (compressed) and enforces the size cap"""
+    key = cache_key(url)
+    raw = json.dumps(data).encode("utf-8")
+    gz_path, raw_path = _paths(key, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = file_lock.tmp_name(gz_path)
+    with gzip.open(tmp, "wb") as f:
+        f.write(raw)
+    with _lock, _manifest_lock(cache_dir):
+        os.replace(tmp, gz_path)
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        manifest = _load_manifest(cache_dir)
+        _merge_pending(manifest, cache_dir)
+        now = time.time()
+        manifest["entries"][key] = {"kind": response_kind(data), "created": now, "last_access": now,
+                                    "raw_bytes": len(raw), "stored_bytes": os.path.getsize(gz_path)}
+        _evict(manifest, cache_dir)
+        _save_manifest(cache_dir, manifest)
+
+
+def _evict(manifest, cache_dir, max_bytes=None):
+    """Least recently used unpinned entries removed until the folder fits the cap"""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = manifest["entries"]
+    total = sum(m["stored_bytes"] for m in entries.values())
+    for key in sorted((k for k, m in entries.items() if not m.get("pinned")), key=lambda k: entries[k]["last_access"]):
+        if total <= max_bytes:
+            break
+        total -= entries[key]["stored_bytes"]
+        _remove(key, cache_dir)
+        del entries[key]
+        manifest["stats"]["evicted"] += 1
+
+
+def compact(cache_dir=CACHE_DIR, max_bytes=None):
+    """Compresses raw .json files, drops expired entries and enforces the cap"""
+    with _lock, _manifest_lock(cache_dir):
+        manifest = _load_manifest(cache_dir)
+        _merge_pending(manifest, cache_dir)
+        now = time.time()
+        for name in sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []:
+            if name == MANIFEST_FILE or not (name.endswith(".json") or name.endswith(".json.gz")):
+                continue
+            key = name.split(".")[0]
+            path = os.path.join(cache_dir, name)
+            try:
+                data = _read(path)
+            except (OSError, ValueError):
+                continue
+            meta = _register(manifest, key, path, data, now=now)
+            if name.endswith(".json"):
+                raw = json.dumps(data).encode("utf-8")
+                gz_path = path + ".gz"
+                tmp = file_lock.tmp_name(gz_path)
+                with gzip.open(tmp, "wb") as f:
+                    f.write(raw)
+                os.replace(tmp, gz_path)
+                # Date de création d'origine conservée (TTL)
+                os.utime(gz_path, (meta["created"], meta["created"]))
+                os.remove(path)
+                meta["stored_bytes"] = os.path.getsize(gz_path)
+        # Fichiers supprimés à la main : entrées orphelines
+        for key in [k for k in manifest["entries"] if not any(os.path.exists(p) for p in _paths(k, cache_dir))]:
+            del manifest["entries"][key]
+        for key in [k for k, m in manifest["entries"].items() if _expired(m, now)]:
+            _remove(key, cache_dir)
+            del manifest["entries"][key]
+            manifest["stats"]["expired"] += 1
+        _evict(manifest, cache_dir, max_bytes)
+        _save_manifest(cache_dir, manifest)
+        return manifest
+
+
+def stats(cache_dir=CACHE_DIR):
+    """Hit rate, sizes and bytes saved by compression, overall and per kind"""
+    flush(cache_dir)
+    manifest = _load_manifest(cache_dir)
+    s = dict(manifest["stats"])
+    lookups = s["hits"] + s["misses"]
+    s["hit_rate"] = s["hits"] / lookups if lookups else None
+    s["kinds"] = {}
+    for m in manifest["entries"].values():
+        k = s["kinds"].setdefault(m["kind"], {"entries": 0, "raw_bytes": 0, "stored_bytes": 0, "pinned": 0})
+        k["entries"] += 1
+        k["raw_bytes"] += m["raw_bytes"]
+        k["stored_bytes"] += m["stored_bytes"]
+        k["pinned"] += bool(m.get("pinned"))
+    s["raw_bytes"] = sum(k["raw_bytes"] for k in s["kinds"].values())
+    s["stored_bytes"] = sum(k["stored_bytes"] for k in s["kinds"].values())
+    s["bytes_saved"] = s["raw_bytes"] - s["stored_bytes"]
+    return s
+
+
+def install(cache_dir=CACHE_DIR):
+    """Routes OSMnx's cache reads / writes through get() / put() (OSMnx 1.x and 2.x)"""
+    global _installed
+    if _installed:
+        return True
+    try:
+        import osmnx as ox
+    except ImportError:
+        return False
+    http = None
+    for name in ("_http", "downloader"):         # OSMnx >= 2.0, OSMnx 1.x
+        try:
+            http = __import__(f"osmnx.{name}", fromlist=["_retrieve_from_cache"])
+            break
+        except ImportError:
+            continue
+    if http is None or not hasattr(http, "_retrieve_from_cache") or not hasattr(http, "_save_to_cache"):
+        print("osm_cache : version d'OSMnx non prise en charge, cache OSMnx d'origine conservé")
+        return False
+    ox.settings.use_cache = True
+    ox.settings.cache_folder = cache_dir
+
+    def retrieve(url, *args, **kwargs):
+        return get(url, cache_dir)
+
+    def save(url, response_json, ok, *args, **kwargs):
+        # OSMnx 2 : booléen response.ok ; OSMnx 1 : code HTTP
+        if ok is True or ok == 200:
+            put(url, response_json, cache_dir)
+
+    http._retrieve_from_cache = retrieve
+    http._save_to_cache = save
+    _installed = True
+    return True
+
+
+def _touched_since(start, cache_dir):
+    flush(cache_dir)
+    manifest = _load_manifest(cache_dir)
+    return [k for k, m in manifest["entries"].items() if m["last_access"] >= start]
+
+
+def seed(cities, bundle_file, dist=None, cache_dir=CACHE_DIR):
+    """Runs the acquisition queries of `cities` and packs the responses they used.
+
+    Each city is geocoded (boundary polygon) and its drive network downloaded, around
+    the geocoded point with radius `dist`, or the whole place without it.
+    """
+    import osmnx as ox
+    if not install(cache_dir):
+        raise RuntimeError("OSMnx cache hooks unavailable")
+    start = time.time()
+    for city in cities:
+        print(f"  {city}...")
+        ox.geocode_to_gdf(city)
+        if dist:
+            ox.graph_from_point(ox.geocode(city), dist=dist, network_type="drive", simplify=False)
+        else:
+            ox.graph_from_place(city, network_type="drive", simplify=False)
+    keys = _touched_since(start, cache_dir)
+    with tarfile.open(bundle_file, "w") as tar:
+        for key in keys:
+            path = next(p for p in _paths(key, cache_dir) if os.path.exists(p))
+            tar.add(path, arcname=os.path.basename(path))
+    return keys
+
+
+def load_bundle(bundle_file, cache_dir=CACHE_DIR):
+    """Unpacks a bundle into the cache as pinned entries; returns their number"""
+    os.makedirs(cache_dir, exist_ok=True)
+    with tarfile.open(bundle_file) as tar:
+        members = [m for m in tar.getmembers() if m.isfile() and "/" not in m.name
+                   and (m.name.endswith(".json.gz") or m.name.endswith(".json"))]
+        tar.extractall(cache_dir, members=members)
+    with _lock, _manifest_lock(cache_dir):
+        manifest = _load_manifest(cache_dir)
+        _merge_pending(manifest, cache_dir)
+        now = time.time()
+        for m in members:
+            key, path = m.name.split(".")[0], os.path.join(cache_dir, m.name)
+            meta = _register(manifest, key, path, _read(path), now=now)
+            meta.update(pinned=True, created=now, last_access=now)
+        _save_manifest(cache_dir, manifest)
+    return len(members)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache des réponses HTTP OSM (Overpass / Nominatim)")
+    parser.add_argument("--compact", action="store_true", help="Compresse, purge les entrées expirées, applique la taille max")
+    parser.add_argument("--max-mb", type=float, help="Taille max du cache (Mo)")
+    parser.add_argument("--seed", nargs="+", metavar="VILLE", help="Villes à pré-charger dans un paquet hors ligne")
+    parser.add_argument("--dist", type=float, help="Rayon (m) autour du centre géocodé pour --seed")
+    parser.add_argument("--bundle", default="osm_bundle.tar")
+    parser.add_argument("--load-bundle", metavar="PAQUET")
+    args = parser.parse_args()
+
+    if args.compact or args.max_mb:
+        compact(max_bytes=args.max_mb * 1024 * 1024 if args.max_mb else None)
+    if args.seed:
+        keys = seed(args.seed, args.bundle, args.dist)
+        print(f"{len(keys)} réponse(s) dans {args.bundle}")
+    if args.load_bundle:
+        print(f"{load_bundle(args.load_bundle)} réponse(s) chargée(s) (épinglées)")
+
+    s = stats()
+    rate = f"{s['hit_rate'] * 100:.1f} %" if s['hit_rate'] is not None else "-"
+    print(f"Taux de succès : {rate} ({s['hits']} succès, {s['misses']} échecs, "
+          f"{s['expired']} expirées, {s['evicted']} évincées)")
+    for kind, k in sorted(s["kinds"].items()):
+        print(f"  {kind:<10} {k['entries']:>5} entrée(s)  {k['raw_bytes'] / 1e6:>8.2f} Mo -> "
+              f"{k['stored_bytes'] / 1e6:>7.2f} Mo  ({k['pinned']} épinglée(s))")
+    print(f"Gain de la compression : {s['bytes_saved'] / 1e6:.2f} Mo")
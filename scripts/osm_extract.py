@@ -0,0 +1,428 @@
+import os
+import sys
+import bz2
+import gzip
+import json
+import math
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from xml.sax.saxutils import quoteattr
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import file_lock
+
+try:
+    import osmium
+    OSMIUM_OK = True
+except ImportError:
+    OSMIUM_OK = False
+
+# Offline network builds: many cities clipped from one local OSM extract (.osm.xml,
+# .osm.xml.gz/.bz2, or .osm.pbf with pyosmium) instead of live Overpass queries.
+# The extract is read in two passes (drivable ways, then only the nodes they use) into
+# NumPy arrays, saved next to it as <extract>.index.npz and reloaded by every later
+# process (rebuilt when the extract changes):
+#   - nodes used by drivable ways (id-sorted, coordinates, tags of tagged nodes);
+#   - drivable ways (node references in CSR form, tags, bounding boxes);
+#   - a uniform lat/lon grid over the way bounding boxes (spatial index);
+#   - the place=* nodes (city, town...) to resolve a place name without geocoding.
+# Tags are kept as JSON byte strings and decoded only for the clipped ways and nodes.
+# A clip keeps the nodes inside the box and the way segments between them, like
+# ox.graph_from_point(..., dist_type='bbox', simplify=False) + save_graph_xml, and
+# writes a .osm.xml file for netconvert. Relations (turn restrictions) are not kept,
+# as with save_graph_xml.
+#
+# Activated by the OSM_EXTRACT environment variable or by the --extract option of
+# download_cities.py / process_missing_cities.py / analyze_city_structure.py.
+#
+#   python scripts/osm_extract.py france.osm.pbf --point 48.8566,2.3522 -o paris.osm.xml
+#   python scripts/osm_extract.py france.osm.pbf --place "Lyon" -o lyon.osm.xml
+
+OSM_EXTRACT = os.environ.get("OSM_EXTRACT")
+DEFAULT_RADIUS = 3000        # m, comme graph_from_point(dist=3000)
+CELL_DEG = 0.05              # taille des cellules de l'index spatial (~5 km)
+PLACE_TYPES = ("city", "town", "village", "suburb")
+
+# Filtre 'drive' d'OSMnx
+EXCLUDED_HIGHWAYS = {
+    "abandoned", "bridleway", "bus_guideway", "construction", "corridor", "cycleway",
+    "elevator", "escalator", "footway", "no", "path", "pedestrian", "planned", "platform",
+    "proposed", "raceway", "razed", "service", "steps", "track",
+}
+EXCLUDED_SERVICE = {"alley", "driveway", "emergency_access", "parking", "parking_aisle", "private"}
+
+NODE_CHUNK = 1 << 18         # nœuds lus avant chaque filtrage (mémoire bornée)
+INDEX_VERSION = 1            # à incrémenter quand le format de l'index change
+
+_LOADED = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def is_drivable(tags):
+    highway = tags.get("highway")
+    if not highway or highway in EXCLUDED_HIGHWAYS:
+        return False
+    return not (tags.get("area") == "yes" or tags.get("access") == "private"
+                or tags.get("motor_vehicle") == "no" or tags.get("motorcar") == "no"
+                or tags.get("service") in EXCLUDED_SERVICE)
+
+
+class _Tags:
+    """Tag dicts stored as one JSON byte string per entity in a single buffer"""
+
+    def __init__(self):
+        self.blob, self.ptr = bytearray(), array('q', [0])
+
+    def append(self, tags):
+        self.blob += json.dumps(tags, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.ptr.append(len(self.blob))
+
+    def arrays(self):
+        return np.frombuffer(bytes(self.blob), dtype=np.uint8), np.frombuffer(self.ptr, dtype=np.int64).copy()
+
+
+def _tags_at(blob, ptr, i):
+    return json.loads(blob[ptr[i]:ptr[i + 1]].tobytes())
+
+
+class _WayCollector:
+    """First pass: drivable ways (node references and tags)"""
+
+    def __init__(self):
+        self.way_ids, self.way_len, self.refs = array('q'), array('q'), array('q')
+        self.way_tags = _Tags()
+
+    def way(self, wid, refs, tags):
+        if len(refs) < 2 or not is_drivable(tags):
+            return
+        self.way_ids.append(wid)
+        self.way_len.append(len(refs))
+        self.refs.extend(refs)
+        self.way_tags.append(tags)
+
+
+class _NodeCollector:
+    """Second pass: only the nodes referenced by the drivable ways, and the place nodes.
+
+    Nodes are buffered by chunks of NODE_CHUNK and filtered against the sorted
+    referenced ids, so the memory used follows the road network, not the extract.
+    """
+
+    def __init__(self, used):
+        self.used = used
+        self.ids, self.lat, self.lon = [], [], []
+        self.tags = {}
+        self.places = {}
+        self._ids, self._lat, self._lon, self._tags = array('q'), array('d'), array('d'), {}
+
+    def node(self, nid, lat, lon, tags):
+        self._ids.append(nid)
+        self._lat.append(lat)
+        self._lon.append(lon)
+        if tags:
+            self._tags[nid] = tags
+            if tags.get("place") in PLACE_TYPES and tags.get("name"):
+                rank = PLACE_TYPES.index(tags["place"])
+                name = tags["name"].lower()
+                # Homonymes : la localité la plus importante l'emporte
+                if name not in self.places or rank < self.places[name][0]:
+                    self.places[name] = (rank, lat, lon)
+        if len(self._ids) >= NODE_CHUNK:
+            self.flush()
+
+    def flush(self):
+        ids = np.array(self._ids, dtype=np.int64)
+        if len(ids) and len(self.used):
+            pos = np.minimum(np.searchsorted(self.used, ids), len(self.used) - 1)
+            keep = self.used[pos] == ids
+            self.ids.append(ids[keep])
+            self.lat.append(np.array(self._lat, dtype=np.float64)[keep])
+            self.lon.append(np.array(self._lon, dtype=np.float64)[keep])
+            for nid in ids[keep].tolist():
+                if nid in self._tags:
+                    self.tags[nid] = self._tags[nid]
+        self._ids, self._lat, self._lon, self._tags = array('q'), array('d'), array('d'), {}
+
+
+def _read_xml(path, col):
+    """Calls col.node / col.way (those the collector defines) for the extract's elements"""
+    on_node, on_way = getattr(col, "node", None), getattr(col, "way", None)
+    opener = gzip.open if path.endswith(".gz") else bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rb") as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "node":
+                if on_node:
+                    tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                    on_node(int(elem.get("id")), float(elem.get("lat")), float(elem.get("lon")), tags)
+                root.clear()
+            elif elem.tag == "way":
+                if on_way:
+                    tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                    on_way(int(elem.get("id")), [int(nd.get("ref")) for nd in elem.iter("nd")], tags)
+                root.clear()
+            elif elem.tag == "relation":
+                root.clear()
+
+
+def _read_pbf(path, col):
+    if not OSMIUM_OK:
+        raise ImportError("pyosmium is required to read .osm.pbf extracts (pip install osmium)")
+
+    # Seuls les types d'objets demandés par le collecteur sont décodés
+    methods = {}
+    if hasattr(col, "node"):
+        methods["node"] = lambda self, n: col.node(n.id, n.location.lat, n.location.lon, {t.k: t.v for t in n.tags})
+    if hasattr(col, "way"):
+        methods["way"] = lambda self, w: col.way(w.id, [nd.ref for nd in w.nodes], {t.k: t.v for t in w.tags})
+    type("Handler", (osmium.SimpleHandler,), methods)().apply_file(path)
+
+
+def index_file(path):
+    """On-disk index of an extract, next to it"""
+    return path + ".index.npz"
+
+
+class OsmExtract:
+    """Spatially indexed road network of a local OSM extract.
+
+    Built in two passes over the extract (drivable ways, then the nodes they use) and
+    saved next to it (index_file), so other processes and later runs only load arrays.
+    """
+
+    ARRAYS = ("node_ids", "lat", "lon", "tagged_ids", "node_tag_blob", "node_tag_ptr", "way_ids", "way_refs",
+              "way_ptr", "way_tag_blob", "way_tag_ptr", "way_bbox", "cell_keys", "cell_ways")
+
+    def __init__(self, path):
+        self.path = path
+        st = os.stat(path)
+        self._source = [INDEX_VERSION, st.st_size, st.st_mtime_ns]
+        if not self._load_index():
+            self._build(path)
+            self._build_index()
+            self._save_index()
+
+    def _load_index(self):
+        try:
+            with np.load(index_file(self.path)) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta["source"] != self._source:
+                    return False
+                for name in self.ARRAYS:
+                    setattr(self, name, data[name])
+        except (OSError, KeyError, ValueError):
+            return False
+        self.places = {name: tuple(latlon) for name, latlon in meta["places"].items()}
+        return True
+
+    def _save_index(self):
+        meta = {"source": self._source, "places": self.places}
+        tmp = file_lock.tmp_name(index_file(self.path))
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **{name: getattr(self, name) for name in self.ARRAYS})
+            os.replace(tmp, index_file(self.path))
+        except OSError as e:
+            print(f"  Index de l'extrait non enregistré ({e})")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _build(self, path):
+        read = _read_pbf if path.endswith(".pbf") else _read_xml
+        ways = _WayCollector()
+        read(path, ways)
+        refs = np.frombuffer(ways.refs, dtype=np.int64)
+        nodes = _NodeCollector(np.unique(refs))
+        read(path, nodes)
+        nodes.flush()
+
+        node_ids = np.concatenate(nodes.ids) if nodes.ids else np.zeros(0, dtype=np.int64)
+        order = np.argsort(node_ids, kind='stable')
+        self.node_ids = node_ids[order]
+        self.lat = (np.concatenate(nodes.lat) if nodes.lat else np.zeros(0))[order]
+        self.lon = (np.concatenate(nodes.lon) if nodes.lon else np.zeros(0))[order]
+        node_tags = _Tags()
+        self.tagged_ids = np.array(sorted(nodes.tags), dtype=np.int64)
+        for nid in self.tagged_ids.tolist():
+            node_tags.append(nodes.tags[nid])
+        self.node_tag_blob, self.node_tag_ptr = node_tags.arrays()
+        self.places = {name: (lat, lon) for name, (_, lat, lon) in nodes.places.items()}
+
+        # Références des voies -> indices de nœuds (voies incomplètes dans l'extrait : retirées)
+        way_len = np.frombuffer(ways.way_len, dtype=np.int64)
+        ref_idx = np.searchsorted(self.node_ids, refs)
+        ref_idx = np.minimum(ref_idx, max(len(self.node_ids) - 1, 0))
+        ref_ok = self.node_ids[ref_idx] == refs if len(refs) and len(self.node_ids) else np.zeros(len(refs), dtype=bool)
+        ptr = np.concatenate([[0], np.cumsum(way_len)])
+        complete = np.add.reduceat(ref_ok.astype(np.int64), ptr[:-1]) == way_len if len(way_len) else np.ones(0, dtype=bool)
+        mask = np.repeat(complete, way_len)
+        self.way_ids = np.frombuffer(ways.way_ids, dtype=np.int64)[complete]
+        self.way_refs = ref_idx[mask]
+        self.way_ptr = np.concatenate([[0], np.cumsum(way_len[complete])])
+        blob, tag_ptr = ways.way_tags.arrays()
+        tag_len = np.diff(tag_ptr)
+        self.way_tag_blob = blob[np.repeat(complete, tag_len)]
+        self.way_tag_ptr = np.concatenate([[0], np.cumsum(tag_len[complete])])
+
+    def way_tags(self, w):
+        return _tags_at(self.way_tag_blob, self.way_tag_ptr, w)
+
+    def node_tags(self, nid):
+        """Tags of a node (None when it has none)"""
+        i = int(np.searchsorted(self.tagged_ids, nid))
+        if i < len(self.tagged_ids) and self.tagged_ids[i] == nid:
+            return _tags_at(self.node_tag_blob, self.node_tag_ptr, i)
+        return None
+
+    def _build_index(self):
+        starts = self.way_ptr[:-1]
+        lat, lon = self.lat[self.way_refs], self.lon[self.way_refs]
+        if len(starts):
+            self.way_bbox = np.column_stack([np.minimum.reduceat(lat, starts), np.minimum.reduceat(lon, starts),
+                                             np.maximum.reduceat(lat, starts), np.maximum.reduceat(lon, starts)])
+        else:
+            self.way_bbox = np.zeros((0, 4))
+        # Chaque voie est inscrite dans toutes les cellules que couvre sa boîte englobante
+        iy0, ix0 = np.floor(self.way_bbox[:, 0] / CELL_DEG), np.floor(self.way_bbox[:, 1] / CELL_DEG)
+        iy1, ix1 = np.floor(self.way_bbox[:, 2] / CELL_DEG), np.floor(self.way_bbox[:, 3] / CELL_DEG)
+        ny, nx = (iy1 - iy0 + 1).astype(np.int64), (ix1 - ix0 + 1).astype(np.int64)
+        counts = ny * nx
+        way = np.repeat(np.arange(len(counts)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_y = iy0[way] + offset // nx[way]
+        cell_x = ix0[way] + offset % nx[way]
+        keys = self._cell_key(cell_y, cell_x)
+        order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_ways = keys[order], way[order]
+
+    @staticmethod
+    def _cell_key(iy, ix):
+        return (iy.astype(np.int64) + 2000) * 8000 + (ix.astype(np.int64) + 4000)
+
+    def ways_in_bbox(self, south, west, north, east):
+        """Indices of the ways whose bounding box intersects the box"""
+        iy = np.arange(math.floor(south / CELL_DEG), math.floor(north / CELL_DEG) + 1)
+        ix = np.arange(math.floor(west / CELL_DEG), math.floor(east / CELL_DEG) + 1)
+        keys = self._cell_key(np.repeat(iy, len(ix)), np.tile(ix, len(iy)))
+        lo = np.searchsorted(self.cell_keys, keys, side='left')
+        hi = np.searchsorted(self.cell_keys, keys, side='right')
+        if not (hi > lo).any():
+            return np.zeros(0, dtype=np.int64)
+        cand = np.unique(np.concatenate([self.cell_ways[a:b] for a, b in zip(lo, hi)]))
+        bb = self.way_bbox[cand]
+        hit = (bb[:, 0] <= north) & (bb[:, 2] >= south) & (bb[:, 1] <= east) & (bb[:, 3] >= west)
+        return cand[hit]
+
+    def resolve_place(self, place):
+        """(lat, lon) of a place=* node of the extract, or None"""
+        name = place.lower().strip()
+        if name in self.places:
+            return self.places[name]
+        # "Paris, France" -> "paris"
+        return self.places.get(name.split(",")[0].strip())
+
+    def clip(self, south, west, north, east, out_file):
+        """Writes the network inside the box to an .osm.xml file for netconvert.
+
+        Returns the number of (nodes, ways) written.
+        """
+        segments = []
+        for w in self.ways_in_bbox(south, west, north, east).tolist():
+            idx = self.way_refs[self.way_ptr[w]:self.way_ptr[w + 1]]
+            inside = (self.lat[idx] >= south) & (self.lat[idx] <= north) & \
+                (self.lon[idx] >= west) & (self.lon[idx] <= east)
+            # Tronçons de nœuds consécutifs dans la boîte (au moins un segment)
+            bounds = np.flatnonzero(np.diff(np.concatenate([[0], inside.astype(np.int8), [0]])))
+            for a, b in zip(bounds[::2], bounds[1::2]):
+                if b - a >= 2:
+                    segments.append((w, idx[a:b]))
+
+        nodes = np.unique(np.concatenate([s for _, s in segments])) if segments else np.zeros(0, dtype=np.int64)
+        tmp = out_file + ".part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="osm_extract">\n')
+            f.write(f'  <bounds minlat="{south}" minlon="{west}" maxlat="{north}" maxlon="{east}"/>\n')
+            for i in nodes.tolist():
+                nid = int(self.node_ids[i])
+                tags = self.node_tags(nid)
+                head = f'  <node id="{nid}" lat="{self.lat[i]:.7f}" lon="{self.lon[i]:.7f}" version="1"'
+                if tags:
+                    f.write(head + ">\n" + _tags_xml(tags) + "  </node>\n")
+                else:
+                    f.write(head + "/>\n")
+            seen = set()
+            split_id = 0
+            for w, idx in segments:
+                wid = int(self.way_ids[w])
+                # Voie coupée en plusieurs tronçons : tronçons suivants numérotés -1, -2...
+                # (identifiants négatifs, jamais utilisés par OSM)
+                if wid in seen:
+                    split_id -= 1
+                    out_id = split_id
+                else:
+                    seen.add(wid)
+                    out_id = wid
+                f.write(f'  <way id="{out_id}" version="1">\n')
+                f.writelines(f'    <nd ref="{int(self.node_ids[i])}"/>\n' for i in idx.tolist())
+                f.write(_tags_xml(self.way_tags(w)) + "  </way>\n")
+            f.write("</osm>\n")
+        os.replace(tmp, out_file)
+        return len(nodes), len(segments)
+
+
+def _tags_xml(tags):
+    return "".join(f"    <tag k={quoteattr(k)} v={quoteattr(v)}/>\n" for k, v in tags.items())
+
+
+def bbox_from_point(point, dist):
+    """(south, west, north, east) of the square of half-side `dist` metres around point"""
+    lat, lon = point
+    d_lat = dist / 111320.0
+    d_lon = dist / (111320.0 * math.cos(math.radians(lat)))
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
+
+
+def open_extract(path=None):
+    """Extract loaded once per process (path defaults to OSM_EXTRACT)"""
+    path = os.path.abspath(path or OSM_EXTRACT)
+    with _LOAD_LOCK:
+        if path not in _LOADED:
+            print(f"  Lecture de l'extrait OSM {path}...")
+            _LOADED[path] = OsmExtract(path)
+        return _LOADED[path]
+
+
+def build_osm(out_file, point=None, dist=DEFAULT_RADIUS, place=None, extract=None):
+    """Clips a city from the extract into `out_file` (replaces graph_from_* + save_graph_xml).
+
+    A place name is resolved to its place=* node and clipped with radius `dist`.
+    """
+    ext = open_extract(extract)
+    if point is None:
+        point = ext.resolve_place(place)
+        if point is None:
+            raise ValueError(f"Lieu introuvable dans l'extrait : {place}")
+    n_nodes, n_ways = ext.clip(*bbox_from_point(point, dist), out_file)
+    if n_ways == 0:
+        raise ValueError(f"Aucune voie dans l'extrait autour de {point}")
+    return n_nodes, n_ways
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Découpe d'un réseau routier dans un extrait OSM local")
+    parser.add_argument("extract")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--point", help="lat,lon")
+    parser.add_argument("--place")
+    parser.add_argument("--dist", type=float, default=DEFAULT_RADIUS)
+    args = parser.parse_args()
+
+    point = tuple(float(v) for v in args.point.split(",")) if args.point else None
+    n_nodes, n_ways = build_osm(args.output, point, args.dist, args.place, args.extract)
+    print(f"{n_nodes} nœuds, {n_ways} voies -> {args.output}")
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+
+import sim_scanner
+
+# Persistent catalog of the SUMO simulation files (SQLite).
+# One row per file: metadata parsed once from the file name (city, nominal number of
+# vehicles), change detection (size, mtime, content fingerprint) and the aggregates
+# already computed by sim_scanner, so builders select their inputs with a query
+# instead of re-globbing data/simulations and re-parsing names each in their own way.
+#
+#   python scripts/sim_catalog.py --city paris --min-veh 10000
+
+CATALOG_FILE = os.path.join(sim_scanner.BASE_DIR, "data", "simulations_catalog.sqlite")
+
+# "paris10K_2026.csv", "los-angeles5k_test.xml.gz", "rome20k.csv" ...
+NAME_PATTERN = re.compile(r'^([a-zA-Z_-]+?)[_-]?(\d+)[kK](?:[_-](.*))?$')
+
+# Aggregate -> catalog columns it fills (n_records is stored by every scan)
+AGGREGATE_FIELDS = {
+    'co2': ['co2_kg'],
+    'nox': ['nox_kg'],
+    'fuel': ['fuel_l'],
+    'speed': ['avg_speed_mps'],
+    'duration': ['max_step'],
+    'vehicles': ['veh_per_type', 'nb_total_veh'],
+    'series': ['series'],
+}
+JSON_FIELDS = ('veh_per_type', 'series')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulations (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    city TEXT,
+    vehicles_nominal INTEGER,
+    label TEXT,
+    format TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    fingerprint TEXT,
+    aggregates TEXT NOT NULL DEFAULT '',
+    n_records INTEGER,
+    co2_kg REAL,
+    nox_kg REAL,
+    fuel_l REAL,
+    avg_speed_mps REAL,
+    max_step REAL,
+    nb_total_veh INTEGER,
+    veh_per_type TEXT,
+    series TEXT,
+    n_quarantined INTEGER,
+    scanned_at REAL
+);
+CREATE INDEX IF NOT EXISTS simulations_city ON simulations (city);
+"""
+
+
+def parse_simulation_name(filename):
+    """City, nominal vehicle count and free label from a simulation file name.
+
+    Returns None for names that do not follow the <city><N>k_<label> convention.
+    """
+    name = os.path.basename(filename)
+    for ext in ('.xml.gz', '.xml', '.csv'):
+        if name.lower().endswith(ext):
+            name = name[:-len(ext)]
+            break
+    match = NAME_PATTERN.match(name)
+    if not match:
+        return None
+    return {
+        'city': match.group(1).lower().replace('-', '_'),
+        'vehicles_nominal': int(match.group(2)) * 1000,
+        'label': match.group(3) or '',
+    }
+
+
+def _file_format(sim_file):
+    lower = sim_file.lower()
+    return 'xml.gz' if lower.endswith('.xml.gz') else os.path.splitext(lower)[1].lstrip('.')
+
+
+def _key(sim_file):
+    """Catalog key: path relative to the project when the file lives inside it"""
+    path = os.path.abspath(sim_file)
+    rel = os.path.relpath(path, sim_scanner.BASE_DIR)
+    return path if rel.startswith('..') else rel
+
+
+def _full_path(key):
+    return key if os.path.isabs(key) else os.path.join(sim_scanner.BASE_DIR, key)
+
+
+def connect(db_file=CATALOG_FILE):
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _to_dict(row):
+    entry = dict(row)
+    for field in JSON_FIELDS:
+        if entry[field] is not None:
+            entry[field] = json.loads(entry[field])
+    entry['file'] = _full_path(entry['path'])
+    entry['aggregates'] = [a for a in entry['aggregates'].split(',') if a]
+    return entry
+
+
+def refresh(conn, sim_dir=sim_scanner.SIM_DIR):
+    """Synchronises the catalog with a directory of simulations.
+
+    New files are added, modified files lose their cached aggregates (content
+    fingerprint checked when only the mtime changed), vanished files are removed.
+    Returns the number of (added, changed, removed) rows.
+    """
+    known = {row['path']: row for row in conn.execute(
+        "SELECT path, size, mtime_ns, fingerprint FROM simulations")}
+    seen = set()
+    added = changed = 0
+    for sim_file in sim_scanner.list_simulations(sim_dir):
+        key = _key(sim_file)
+        seen.add(key)
+        st = os.stat(sim_file)
+        row = known.get(key)
+        if row is not None and row['size'] == st.st_size:
+            if row['mtime_ns'] == st.st_mtime_ns:
+                continue
+            if row['fingerprint'] == sim_scanner.file_fingerprint(sim_file):
+                conn.execute("UPDATE simulations SET mtime_ns = ? WHERE path = ?", (st.st_mtime_ns, key))
+                continue
+        meta = parse_simulation_name(sim_file) or {'city': None, 'vehicles_nominal': None, 'label': None}
+        conn.execute("DELETE FROM simulations WHERE path = ?", (key,))
+        conn.execute(
+            "INSERT INTO simulations (path, filename, city, vehicles_nominal, label, format, size, mtime_ns, fingerprint)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, os.path.basename(sim_file), meta['city'], meta['vehicles_nominal'], meta['label'],
+             _file_format(sim_file), st.st_size, st.st_mtime_ns, sim_scanner.file_fingerprint(sim_file)))
+        if row is None:
+            added += 1
+        else:
+            changed += 1
+
+    sim_dir_abs = os.path.abspath(sim_dir)
+    removed = [key for key in known if key not in seen
+               and os.path.dirname(os.path.abspath(_full_path(key))) == sim_dir_abs]
+    conn.executemany("DELETE FROM simulations WHERE path = ?", [(key,) for key in removed])
+    conn.commit()
+    return added, changed, len(removed)
+
+
+def select(conn, city=None, min_vehicles=None, max_vehicles=None, where=None, params=()):
+    """Catalog entries (dicts, ordered by file name) matching the filters.
+
+    The vehicle filters use the distinct vehicles counted by a scan when available,
+    else the nominal count of the file name. `where` is an extra SQL condition.
+    """
+    clauses, args = [], []
+    if city is not None:
+        clauses.append("city = ?")
+        args.append(city.lower().replace('-', '_'))
+    vehicles = "COALESCE(nb_total_veh, vehicles_nominal)"
+    if min_vehicles is not None:
+        clauses.append(f"{vehicles} >= ?")
+        args.append(min_vehicles)
+    if max_vehicles is not None:
+        clauses.append(f"{vehicles} <= ?")
+        args.append(max_vehicles)
+    if where:
+        clauses.append(f"({where})")
+        args.extend(params)
+    sql = "SELECT * FROM simulations"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return [_to_dict(row) for row in conn.execute(sql + " ORDER BY filename, path", args)]
+
+
+def store_stats(conn, entry, aggregates, stats):
+    """Saves the `aggregates` of a scan_simulation() result; returns the updated entry"""
+    values = {'n_records': stats['n_records'], 'n_quarantined': stats['n_quarantined']}
+    for agg in aggregates:
+        if agg == 'vehicles':
+            values['veh_per_type'] = json.dumps(stats['veh_per_type'])
+            values['nb_total_veh'] = sum(stats['veh_per_type'].values())
+        elif agg == 'series':
+            values['series'] = json.dumps(stats['series'])
+        else:
+            field = AGGREGATE_FIELDS[agg][0]
+            values[field] = stats['max_step' if agg == 'duration' else field]
+    values['aggregates'] = ",".join(sorted(set(entry['aggregates']) | set(aggregates)))
+    values['scanned_at'] = time.time()
+    assignments = ", ".join(f"{col} = ?" for col in values)
+    conn.execute(f"UPDATE simulations SET {assignments} WHERE path = ?",
+                 list(values.values()) + [entry['path']])
+    conn.commit()
+    return _to_dict(conn.execute("SELECT * FROM simulations WHERE path = ?", (entry['path'],)).fetchone())
+
+
+def get_stats(conn, entry, aggregates):
+    """scan_simulation()-like stats of a catalog entry, scanning only what is not cached"""
+    missing = [a for a in aggregates if a not in entry['aggregates']]
+    if missing:
+        stats = sim_scanner.scan_simulation(entry['file'], aggregates=missing)
+        entry = store_stats(conn, entry, missing, stats)
+
+    return {
+        'file': entry['filename'],
+        'n_records': entry['n_records'] or 0,
+        'co2_kg': entry['co2_kg'] or 0.0,
+        'nox_kg': entry['nox_kg'] or 0.0,
+        'fuel_l': entry['fuel_l'] or 0.0,
+        'avg_speed_mps': entry['avg_speed_mps'] or 0.0,
+        'max_step': entry['max_step'] or 0,
+        'veh_per_type': entry['veh_per_type'] or {},
+        'n_quarantined': entry['n_quarantined'] or 0,
+        'series': entry['series'],
+    }
+
+
+def open_catalog(sim_dir=sim_scanner.SIM_DIR, db_file=CATALOG_FILE):
+    """Connects and refreshes the catalog of `sim_dir`, reporting what changed"""
+    conn = connect(db_file)
+    added, changed, removed = refresh(conn, sim_dir)
+    if added or changed or removed:
+        print(f"  [CATALOGUE] {added} ajoutée(s), {changed} modifiée(s), {removed} supprimée(s)")
+    return conn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalogue des simulations SUMO")
+    parser.add_argument("--sim-dir", default=sim_scanner.SIM_DIR)
+    parser.add_argument("--city")
+    parser.add_argument("--min-veh", type=int)
+    parser.add_argument("--max-veh", type=int)
+    parser.add_argument("--where", help="Condition SQL supplémentaire (ex: \"co2_kg > 500\")")
+    args = parser.parse_args()
+
+    catalog = open_catalog(args.sim_dir)
+    entries = select(catalog, city=args.city, min_vehicles=args.min_veh,
+                     max_vehicles=args.max_veh, where=args.where)
+    for e in entries:
+        co2 = f"{e['co2_kg']:.1f} kg CO2" if e['co2_kg'] is not None else "non scannée"
+        print(f"  {e['filename']:<40} {e['city'] or '?':<15} {e['vehicles_nominal'] or '?':>7} véh  {co2}")
+    print(f"{len(entries)} simulation(s)")
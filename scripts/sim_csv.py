@@ -0,0 +1,176 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+    PYARROW_OK = True
+except ImportError:
+    PYARROW_OK = False
+
+# Schema-typed, low-memory reader for SUMO emission CSVs (pyarrow's CSV parser).
+# Columns are declared once: integer `step`, float32 emissions/speed, dictionary-encoded
+# `veh_id`/`veh_type`. Malformed lines are not silently dropped: they are written with
+# their reason to a side quarantine file and counted.
+
+QUARANTINE_SUBDIR = "quarantine"
+
+# Le fichier est lu par tranches d'octets coupées en fin de ligne, chacune analysée
+# sans lecture anticipée (le lecteur en flux de pyarrow garde des dizaines de blocs en
+# mémoire) ; les tables typées sont ensuite regroupées en chunks de `chunksize` lignes
+CSV_BLOCK_SIZE = 4 << 20
+
+if PYARROW_OK:
+    SCHEMA = {
+        'step': pa.int32(),
+        'veh_id': pa.dictionary(pa.int32(), pa.string()),
+        'veh_type': pa.dictionary(pa.int32(), pa.string()),
+        'CO2_g_s': pa.float32(),
+        'NOx_g_s': pa.float32(),
+        'fuel_l_s': pa.float32(),
+        'speed': pa.float32(),
+    }
+    # Les colonnes numériques sont lues en texte puis converties par lot, pour pouvoir
+    # isoler les lignes invalides (en-têtes répétés, valeurs corrompues) sans tout perdre
+    READ_TYPES = {c: (t if c in ('veh_id', 'veh_type') else pa.string()) for c, t in SCHEMA.items()}
+
+
+def quarantine_path(sim_file):
+    sim_dir, filename = os.path.split(sim_file)
+    return os.path.join(sim_dir, QUARANTINE_SUBDIR, filename + ".bad.txt")
+
+
+class Quarantine:
+    """Side file collecting the rejected lines of one simulation file.
+
+    Without `sim_file`, rejected lines are only counted (partial reads of a few
+    columns must not overwrite the quarantine file of a full scan).
+    """
+
+    def __init__(self, sim_file=None):
+        self.path = quarantine_path(sim_file) if sim_file else None
+        self.count = 0
+        self._f = None
+        self._lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)   # résultat d'une lecture précédente
+
+    def add(self, reason, text, line_number=None):
+        with self._lock:
+            self.count += 1
+            if self.path is None:
+                return
+            if self._f is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._f = open(self.path, "w", encoding="utf-8")
+            where = f"ligne {line_number}" if line_number is not None else "ligne ?"
+            self._f.write(f"[{reason}] {where}: {text.rstrip()}\n")
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def _iter_blocks(f, block_size):
+    """Yields (first line number, bytes) slices of whole lines"""
+    line_number = 2   # ligne 1 = en-tête
+    while True:
+        data = f.read(block_size)
+        if not data:
+            return
+        data += f.readline()
+        yield line_number, data
+        line_number += data.count(b'\n')
+
+
+def _convert_numeric(arr, target):
+    """Casts a string column; returns (typed array, mask of non-numeric values)"""
+    try:
+        return pc.cast(arr, target), None
+    except pa.ArrowInvalid:
+        pass
+    if pa.types.is_integer(target):
+        # Pas de temps fractionnaires (step-length < 1s) : on garde des flottants
+        try:
+            return pc.cast(arr, pa.float64()), None
+        except pa.ArrowInvalid:
+            pass
+    values = pd.to_numeric(arr.to_pandas(), errors='coerce')
+    bad = (values.isna() & arr.is_valid().to_numpy(zero_copy_only=False)).to_numpy()
+    values = values.to_numpy(dtype='float64')
+    valid = values[~np.isnan(values)]
+    if pa.types.is_integer(target) and not np.array_equal(valid, np.round(valid)):
+        target = pa.float64()
+    return pa.array(values, from_pandas=True).cast(target), bad
+
+
+def _typed_table(batch, quarantine, first_line):
+    columns = {}
+    bad = np.zeros(batch.num_rows, dtype=bool)
+    for name in batch.schema.names:
+        arr = batch.column(name)
+        if name in ('veh_id', 'veh_type'):
+            columns[name] = arr
+            continue
+        typed, bad_values = _convert_numeric(arr, SCHEMA[name])
+        if bad_values is not None:
+            bad |= bad_values
+        # Valeurs vides -> 0, comme l'ancien to_numeric(errors='coerce').fillna(0)
+        columns[name] = pc.fill_null(typed, 0)
+
+    table = pa.table(columns)
+    if bad.any():
+        for i in np.flatnonzero(bad):
+            text = ",".join("" if v is None else str(v) for v in
+                            (batch.column(n)[int(i)].as_py() for n in batch.schema.names))
+            # Numéro exact tant qu'aucune ligne du bloc n'a été écartée par l'analyseur
+            quarantine.add("valeur non numérique", text, first_line + int(i))
+        table = table.filter(pa.array(~bad))
+    return table
+
+
+def _to_frame(tables):
+    # step peut être entier dans un bloc et flottant dans un autre
+    return pa.concat_tables(tables, promote_options='permissive').to_pandas()
+
+
+def iter_csv_chunks(sim_file, chunksize, columns, quarantine=None, block_size=CSV_BLOCK_SIZE):
+    """Streams typed DataFrames of the requested columns with pyarrow's CSV parser"""
+    quarantine = quarantine if quarantine is not None else Quarantine()
+    with open(sim_file, 'rb') as f:
+        header = f.readline().decode('utf-8', errors='replace').strip().split(',')
+        present = [c for c in columns if c in header]
+        read_options = pacsv.ReadOptions(column_names=header, use_threads=False)
+        convert_options = pacsv.ConvertOptions(
+            include_columns=present,
+            column_types={c: READ_TYPES[c] for c in present if c in READ_TYPES},
+            strings_can_be_null=True,
+        )
+
+        pending, n_rows, yielded = [], 0, False
+        for first_line, data in _iter_blocks(f, block_size):
+            def on_invalid_row(row, first_line=first_line):
+                line = first_line + row.number - 1 if row.number >= 0 else None
+                quarantine.add(f"{row.actual_columns} colonnes au lieu de {row.expected_columns}",
+                               row.text or "", line)
+                return 'skip'
+
+            table = pacsv.read_csv(pa.py_buffer(data), read_options=read_options,
+                                   parse_options=pacsv.ParseOptions(invalid_row_handler=on_invalid_row),
+                                   convert_options=convert_options)
+            offset = first_line
+            for batch in table.to_batches():
+                typed = _typed_table(batch, quarantine, offset)
+                offset += batch.num_rows
+                pending.append(typed)
+                n_rows += typed.num_rows
+            del table
+            if n_rows >= chunksize:
+                yield _to_frame(pending)
+                pending, n_rows, yielded = [], 0, True
+    if n_rows or not yielded:
+        yield _to_frame(pending) if pending else pd.DataFrame(columns=present)
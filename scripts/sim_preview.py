@@ -0,0 +1,313 @@
+import os
+import io
+import math
+import numpy as np
+import pandas as pd
+
+import sim_scanner
+import sim_xml
+from distinct_count import hash_ids
+
+# Approximate "preview" scan of a SUMO emission CSV, for a rough training table in
+# seconds when a new batch of simulations arrives.
+# - emission/speed totals: random sample of fixed-size byte blocks of the CSV
+#   (cluster sampling) with normal 95% confidence intervals;
+# - distinct vehicles per type: departures counted in the same sampled blocks (vehicles
+#   present at a step and absent from the previous one, SUMO writes steps in order),
+#   scaled to the whole file like the totals, with their 95% interval;
+#   exact_vehicles=True reads the veh_id/veh_type columns of the whole file into
+#   HyperLogLog sketches instead (full pass, constant memory), as does a sampled block
+#   too short to hold three steps (its departures cannot be counted);
+# - lines with a non-numeric value or a wrong field count (repeated headers, corrupted
+#   values) are dropped and counted like the sim_csv quarantine, scaled to the file;
+# - duration: last step found at the end of the file.
+
+BLOCK_BYTES = 4 << 20
+MIN_BLOCKS = 8
+HLL_PRECISION = 14
+Z_95 = 1.96
+
+
+def _clz64(x):
+    """Number of leading zero bits of each uint64"""
+    n = np.zeros(len(x), dtype=np.int64)
+    y = x.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_zero = (y >> np.uint64(64 - shift)) == 0
+        n[top_zero] += shift
+        y[top_zero] <<= np.uint64(shift)
+    n[x == 0] = 64
+    return n
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over 64-bit hashes (2**precision registers)"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rank = np.minimum(_clz64(hashes << np.uint64(self.p)) + 1, 64 - self.p + 1)
+        # Max du rang par registre : clés triées, la dernière occurrence de chaque
+        # registre porte le rang maximal
+        keys = np.unique(idx * 64 + rank)
+        reg, val = keys // 64, (keys % 64).astype(np.uint8)
+        self.registers[reg] = np.maximum(self.registers[reg], val)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            return self.m * math.log(self.m / zeros)   # linear counting (petits effectifs)
+        return float(raw)
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+def _read_block(f, offset, block_bytes, size):
+    """Bytes of the lines that *start* in [offset, offset + block_bytes)"""
+    end = min(offset + block_bytes, size)
+    if offset > 0:
+        f.seek(offset - 1)
+        data = f.read(end - offset + 1)
+        first_nl = data.find(b'\n')
+        if first_nl < 0:
+            return b''
+        data = data[first_nl + 1:]
+    else:
+        f.seek(0)
+        data = f.read(end)
+    if end < size and not data.endswith(b'\n'):
+        data += f.readline()
+    return data
+
+
+def _well_formed(data, n_fields):
+    """Lines of `data` with `n_fields` fields (blank lines kept), and the number dropped"""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    commas = np.concatenate([[0], np.cumsum(buf == ord(','))])
+    n_commas = commas[ends] - commas[starts]
+    ok = (n_commas == n_fields - 1) | (ends == starts)
+    if ok.all():
+        return data, 0
+    lengths = np.minimum(ends + 1, len(buf)) - starts
+    return buf[np.repeat(ok, lengths)].tobytes(), int((~ok).sum())
+
+
+def _parse_block(data, header, columns):
+    """Rows of a block with numeric columns typed, and the number of rejected lines"""
+    # Nombre de champs incorrect (ligne coupée, séparateur en trop) : écartée
+    data, rejected = _well_formed(data, len(header))
+    df = pd.read_csv(io.BytesIO(data), header=None, names=header,
+                     usecols=lambda c: c in columns)
+    bad = np.zeros(len(df), dtype=bool)
+    for col in sim_scanner.NUMERIC_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce')
+            # Valeur non numérique (en-tête répété, valeur corrompue) ; vide -> 0
+            bad |= (values.isna() & df[col].notna()).to_numpy()
+            df[col] = values.fillna(0)
+    if bad.any():
+        df = df[~bad].reset_index(drop=True)
+    return df, rejected + int(bad.sum())
+
+
+def _last_step(sim_file, header, size):
+    with open(sim_file, 'rb') as f:
+        tail_start = max(size - (1 << 16), 0)
+        data = _read_block(f, tail_start, size - tail_start, size)
+    if tail_start == 0:
+        data = data.split(b'\n', 1)[1] if b'\n' in data else b''
+    tail, _ = _parse_block(data, header, ['step'])
+    return tail['step'].max() if len(tail) else 0
+
+
+def _block_departures(df, first_block, last_block):
+    """Departures per vehicle type in a block, extrapolated to all the steps it holds.
+
+    A step is counted when the block holds all of its lines and those of the step
+    before it: the first (possibly cut) step of a block and the one after it are
+    skipped, except at the start of the file, and so is the last one, except at its end.
+    The step shared with the previous block belongs to that block. Returns None when
+    the block holds too few steps for that.
+    """
+    steps, step_idx = np.unique(df['step'].to_numpy(), return_inverse=True)
+    lo = 0 if first_block else 2
+    hi = len(steps) if last_block else len(steps) - 1
+    owned = len(steps) - (0 if first_block else 1)
+    if hi <= lo:
+        return None
+    id_codes, _ = pd.factorize(df['veh_id'])
+    # Clé (véhicule, pas) sur n_steps + 1 valeurs par véhicule : clé - 1 = même véhicule au pas précédent
+    keys = id_codes.astype(np.int64) * (len(steps) + 1) + step_idx
+    new = (step_idx >= lo) & (step_idx < hi) & ~np.isin(keys - 1, keys)
+    _, first = np.unique(keys[new], return_index=True)
+    counts = pd.Series(df['veh_type'].to_numpy()[new][first]).value_counts()
+    return (counts * owned / (hi - lo)).to_dict()
+
+
+def _total_ci(values, n_total):
+    """Cluster-sample estimate of a total with its 95% interval"""
+    k = len(values)
+    estimate = n_total / k * values.sum()
+    if k < 2 or k >= n_total:
+        return float(estimate), (float(estimate), float(estimate))
+    se = n_total * math.sqrt((1 - k / n_total) * values.var(ddof=1) / k)
+    return float(estimate), (float(estimate - Z_95 * se), float(estimate + Z_95 * se))
+
+
+def _ratio_ci(num, den, n_total):
+    """Ratio estimate (e.g. mean speed per record) with its linearised 95% interval"""
+    k = len(num)
+    ratio = num.sum() / den.sum() if den.sum() > 0 else 0.0
+    if k < 2 or k >= n_total or den.mean() == 0:
+        return float(ratio), (float(ratio), float(ratio))
+    resid = num - ratio * den
+    se = math.sqrt((1 - k / n_total) * resid.var(ddof=1) / k) / den.mean()
+    return float(ratio), (float(ratio - Z_95 * se), float(ratio + Z_95 * se))
+
+
+def sketch_vehicles(sim_file, precision=HLL_PRECISION):
+    """HyperLogLog sketch per vehicle type, reading only veh_id/veh_type (whole file)"""
+    sketches = {}
+    for chunk in sim_scanner.iter_chunks(sim_file, columns=['veh_id', 'veh_type']):
+        ids = chunk[['veh_id', 'veh_type']].dropna()
+        type_codes, types = pd.factorize(ids['veh_type'])
+        id_codes, id_uniques = pd.factorize(ids['veh_id'])
+        if len(types) == 0:
+            continue
+        # Dédoublonnage (id, type) sur entiers avant hachage, comme DistinctCounter
+        pairs = np.unique(id_codes.astype(np.int64) * len(types) + type_codes)
+        pair_types = pairs % len(types)
+        hashes = hash_ids(id_uniques)[pairs // len(types)]
+        for code, vt in enumerate(types):
+            sketches.setdefault(str(vt), HyperLogLog(precision)).add_hashes(hashes[pair_types == code])
+    return sketches
+
+
+def _exact_as_preview(stats):
+    ci = {key: (stats[key], stats[key]) for key in
+          ['n_records', 'co2_kg', 'nox_kg', 'fuel_l', 'avg_speed_mps', 'max_step']}
+    ci['veh_per_type'] = {vt: (n, n) for vt, n in stats['veh_per_type'].items()}
+    ci['n_quarantined'] = (stats['n_quarantined'], stats['n_quarantined'])
+    return dict(stats, vehicles_method='exact', sampled_fraction=1.0, ci=ci)
+
+
+def preview_simulation(sim_file, fraction=0.02, seed=0, block_bytes=BLOCK_BYTES, exact_vehicles=False):
+    """Approximate scan_simulation(): same keys plus 95% intervals in 'ci'.
+
+    Vehicle counts are estimated from the sampled blocks too; `exact_vehicles` reads
+    the vehicle columns of the whole file instead (HyperLogLog, one full pass), which
+    is also the fallback when a sampled block holds fewer than three steps
+    ('vehicles_method' = 'sampled' or 'sketch').
+    XML outputs cannot be sampled by byte blocks: they are scanned exactly and
+    reported with zero-width intervals.
+    """
+    if sim_xml.is_xml(sim_file):
+        return _exact_as_preview(sim_scanner.scan_simulation(sim_file))
+    size = os.path.getsize(sim_file)
+    with open(sim_file, 'rb') as f:
+        header = f.readline().decode('utf-8').strip().split(',')
+    columns = [c for c in sim_scanner.NUMERIC_COLUMNS if c in header]
+    sample_vehicles = not exact_vehicles and all(c in header for c in ['step', 'veh_id', 'veh_type'])
+    if sample_vehicles:
+        columns += ['veh_id', 'veh_type']
+
+    n_blocks = max(math.ceil(size / block_bytes), 1)
+    k = min(n_blocks, max(MIN_BLOCKS, math.ceil(fraction * n_blocks)))
+    rng = np.random.default_rng(seed)
+    chosen = np.sort(rng.choice(n_blocks, size=k, replace=False))
+
+    per_block = {key: np.zeros(k) for key in ['rows', 'rejected', 'CO2_g_s', 'NOx_g_s', 'fuel_l_s', 'speed']}
+    departures = []
+    with open(sim_file, 'rb') as f:
+        for i, block in enumerate(chosen):
+            data = _read_block(f, int(block) * block_bytes, block_bytes, size)
+            if block == 0:
+                data = data.split(b'\n', 1)[1] if b'\n' in data else b''
+            df, per_block['rejected'][i] = _parse_block(data, header, columns)
+            per_block['rows'][i] = len(df)
+            for col in ['CO2_g_s', 'NOx_g_s', 'fuel_l_s', 'speed']:
+                if col in df.columns:
+                    per_block[col][i] = df[col].astype('float64').sum()
+            if sample_vehicles:
+                departures.append(_block_departures(df, block == 0, block == n_blocks - 1))
+
+    ci = {}
+    n_records, ci['n_records'] = _total_ci(per_block['rows'], n_blocks)
+    n_quarantined, ci['n_quarantined'] = _total_ci(per_block['rejected'], n_blocks)
+    co2_g, co2_ci = _total_ci(per_block['CO2_g_s'], n_blocks)
+    nox_g, nox_ci = _total_ci(per_block['NOx_g_s'], n_blocks)
+    fuel_l, ci['fuel_l'] = _total_ci(per_block['fuel_l_s'], n_blocks)
+    avg_speed, ci['avg_speed_mps'] = _ratio_ci(per_block['speed'], per_block['rows'], n_blocks)
+    ci['co2_kg'] = (co2_ci[0] / 1000.0, co2_ci[1] / 1000.0)
+    ci['nox_kg'] = (nox_ci[0] / 1000.0, nox_ci[1] / 1000.0)
+
+    max_step = _last_step(sim_file, header, size) if 'step' in header else 0
+    max_step = max_step.item() if hasattr(max_step, 'item') else max_step
+    ci['max_step'] = (max_step, max_step)
+
+    veh_per_type, veh_ci = {}, {}
+    if sample_vehicles and any(dep is None for dep in departures):
+        # Bloc trop court pour y compter des départs : compter 0 biaiserait le total
+        print(f"    [APERÇU] {os.path.basename(sim_file)} : pas de temps plus longs qu'un demi-bloc, "
+              f"véhicules comptés sur tout le fichier")
+        sample_vehicles, exact_vehicles = False, True
+    vehicles_method = None
+    if sample_vehicles:
+        vehicles_method = 'sampled'
+        for vt in sorted({vt for dep in departures for vt in dep}, key=str):
+            est, (lo, hi) = _total_ci(np.array([dep.get(vt, 0.0) for dep in departures]), n_blocks)
+            veh_per_type[str(vt)] = int(round(est))
+            veh_ci[str(vt)] = (max(lo, 0.0), hi)
+    elif exact_vehicles and 'veh_id' in header and 'veh_type' in header:
+        vehicles_method = 'sketch'
+        for vt, sketch in sketch_vehicles(sim_file).items():
+            est = sketch.estimate()
+            half = Z_95 * sketch.relative_error() * est
+            veh_per_type[vt] = int(round(est))
+            veh_ci[vt] = (max(est - half, 0.0), est + half)
+    ci['veh_per_type'] = veh_ci
+
+    return {
+        'file': os.path.basename(sim_file),
+        'columns': header,
+        'n_records': int(round(n_records)),
+        'co2_kg': co2_g / 1000.0,
+        'nox_kg': nox_g / 1000.0,
+        'fuel_l': fuel_l,
+        'avg_speed_mps': avg_speed,
+        'max_step': max_step,
+        'veh_per_type': veh_per_type,
+        'vehicles_method': vehicles_method,
+        'n_quarantined': int(round(n_quarantined)),
+        'sampled_fraction': k / n_blocks,
+        'ci': ci,
+    }
+
+
+def vehicle_counts_ci(preview):
+    """Training-table vehicle counts with intervals (independent sketches per type)"""
+    counts = sim_scanner.vehicle_counts(preview)
+    veh_ci = preview['ci']['veh_per_type']
+    half = {vt: (hi - lo) / 2 for vt, (lo, hi) in veh_ci.items()}
+    result = {}
+    for col, types in [('nb_total_veh', list(veh_ci))] + list(sim_scanner.VEHICLE_GROUPS.items()):
+        spread = math.sqrt(sum(half.get(t, 0.0) ** 2 for t in types))
+        result[col] = (counts[col], (max(counts[col] - spread, 0.0), counts[col] + spread))
+    return result
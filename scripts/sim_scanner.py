@@ -0,0 +1,313 @@
+import os
+import sys
+import glob
+import argparse
+import time
+import hashlib
+import pandas as pd
+
+from distinct_count import DistinctCounter
+from time_bins import TimeBins, BIN_SECONDS
+import sim_xml
+import sim_csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_OK = True
+except ImportError:
+    PYARROW_OK = False
+
+# Shared single-pass scanner for SUMO emission CSVs.
+# Every dataset builder (Final_IA/1_create_dataset.py, prepare_all_data.py,
+# scripts/extract_features.py) reads the same multi-GB files: this module computes
+# all their aggregates in one streaming pass so the numbers are identical everywhere.
+# Files converted once with convert_to_parquet() are then read column by column.
+# SUMO emission-output XML (.xml / .xml.gz) is streamed directly by sim_xml.
+# CSVs are read with a declared schema by sim_csv (pyarrow), malformed lines being
+# quarantined in <sim_dir>/quarantine/ instead of silently dropped.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIM_DIR = os.path.join(BASE_DIR, "data", "simulations")
+PARQUET_SUBDIR = "parquet"
+
+SIM_COLUMNS = ['step', 'veh_id', 'veh_type', 'CO2_g_s', 'NOx_g_s', 'fuel_l_s', 'speed']
+NUMERIC_COLUMNS = ['step', 'CO2_g_s', 'NOx_g_s', 'fuel_l_s', 'speed']
+CHUNK_SIZE = 500000
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 1 << 16
+
+# Columns needed by each aggregate, so callers only read what they use
+AGGREGATE_COLUMNS = {
+    'co2': ['CO2_g_s'],
+    'nox': ['NOx_g_s'],
+    'fuel': ['fuel_l_s'],
+    'speed': ['speed'],
+    'duration': ['step'],
+    'vehicles': ['veh_id', 'veh_type'],
+    'series': ['step', 'CO2_g_s', 'speed'],   # séries par tranche de temps (time_bins)
+}
+
+# SUMO vehicle classes grouped as in the XGBoost training table
+VEHICLE_GROUPS = {
+    'nb_voitures': ['car', 'passenger'],
+    'nb_camions': ['truck', 'trailer'],
+    'nb_bus': ['bus', 'coach'],
+    'nb_motos': ['motorcycle', 'moped'],
+}
+
+
+def list_simulations(sim_dir):
+    """Returns the simulation files (CSV and emission XML) of a directory in a stable order"""
+    files = glob.glob(os.path.join(sim_dir, "*.csv"))
+    for pattern in ("*.xml", "*.xml.gz"):
+        files += [f for f in glob.glob(os.path.join(sim_dir, pattern)) if sim_xml.is_emission_xml(f)]
+    return sorted(files)
+
+
+def file_fingerprint(sim_file):
+    """Content fingerprint of a simulation file without reading it entirely.
+
+    Hashes the size plus FINGERPRINT_BLOCKS evenly spaced blocks (always including the
+    first and last one), which catches appended steps and rewritten runs in O(1) I/O.
+    """
+    size = os.path.getsize(sim_file)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(sim_file, 'rb') as f:
+        last = max(size - FINGERPRINT_BLOCK_SIZE, 0)
+        offsets = sorted({last * i // (FINGERPRINT_BLOCKS - 1) for i in range(FINGERPRINT_BLOCKS)})
+        for offset in offsets:
+            f.seek(offset)
+            h.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return h.hexdigest()
+
+
+def estimate_scan_memory(sim_file, chunksize=CHUNK_SIZE):
+    """Rough peak memory (bytes) of scan_simulation() on one file.
+
+    One decoded chunk (~4x its text size with pandas object columns, ~1.5x once typed
+    by sim_csv) plus the distinct-vehicle structures, which grow with the file.
+    """
+    size = os.path.getsize(sim_file)
+    if sim_xml.is_xml(sim_file):
+        # ~200 octets par enregistrement décodé, taille décompressée inconnue pour .gz
+        growth = 10 if sim_file.lower().endswith('.gz') else 1
+        return int(chunksize * 200 + 0.05 * size * growth)
+    with open(sim_file, 'rb') as f:
+        sample = f.read(FINGERPRINT_BLOCK_SIZE)
+    n_lines = max(sample.count(b'\n'), 1)
+    bytes_per_row = max(len(sample) / n_lines, 1.0)
+    n_rows = size / bytes_per_row
+    chunk_bytes = min(chunksize, n_rows) * bytes_per_row * (1.5 if sim_csv.PYARROW_OK else 4)
+    return int(chunk_bytes + 0.05 * size)
+
+
+def parquet_path(sim_file):
+    """Location of the columnar copy of a simulation file"""
+    sim_dir, filename = os.path.split(sim_file)
+    if filename.lower().endswith('.gz'):
+        filename = filename[:-3]
+    return os.path.join(sim_dir, PARQUET_SUBDIR, os.path.splitext(filename)[0] + ".parquet")
+
+
+def has_fresh_parquet(sim_file):
+    """True when the Parquet copy exists and is newer than its CSV"""
+    pq_file = parquet_path(sim_file)
+    return (PYARROW_OK and os.path.exists(pq_file)
+            and os.path.getmtime(pq_file) >= os.path.getmtime(sim_file))
+
+
+def columns_for(aggregates=None):
+    """Columns to read for a set of aggregates (all SUMO columns by default)"""
+    if aggregates is None:
+        return list(SIM_COLUMNS)
+    wanted = {c for a in aggregates for c in AGGREGATE_COLUMNS[a]}
+    return [c for c in SIM_COLUMNS if c in wanted]
+
+
+def reads_csv(sim_file):
+    """True when iter_chunks() will parse the raw CSV (no fresh Parquet copy)"""
+    return not has_fresh_parquet(sim_file) and not sim_xml.is_xml(sim_file)
+
+
+def iter_chunks(sim_file, chunksize=CHUNK_SIZE, columns=None, quarantine=None):
+    """Streams the requested SUMO columns of a simulation file, coerced to numeric.
+
+    For raw CSVs, rejected lines are counted in `quarantine` (a sim_csv.Quarantine),
+    which also writes them to the quarantine file when built with the file name.
+    """
+    columns = list(SIM_COLUMNS) if columns is None else columns
+    if has_fresh_parquet(sim_file):
+        pq_handle = pq.ParquetFile(parquet_path(sim_file))
+        present = [c for c in columns if c in pq_handle.schema_arrow.names]
+        for batch in pq_handle.iter_batches(batch_size=chunksize, columns=present):
+            yield batch.to_pandas()
+        return
+    if sim_xml.is_xml(sim_file):
+        yield from sim_xml.iter_xml_chunks(sim_file, chunksize, columns)
+        return
+    if sim_csv.PYARROW_OK:
+        yield from sim_csv.iter_csv_chunks(sim_file, chunksize, columns, quarantine)
+        return
+
+    # Sans pyarrow : lecture pandas, les lignes invalides sont ignorées sans quarantaine
+    chunk_iter = pd.read_csv(sim_file, usecols=lambda c: c in columns,
+                             chunksize=chunksize, on_bad_lines='skip')
+    for chunk in chunk_iter:
+        # Les fichiers SUMO peuvent contenir des en-têtes répétés ou des valeurs corrompues
+        for col in NUMERIC_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0)
+        yield chunk
+
+
+def _sum(series):
+    # Accumulation en float64 même quand la colonne est stockée en float32
+    return series.astype('float64').sum()
+
+
+def scan_simulation(sim_file, aggregates=None, chunksize=CHUNK_SIZE, bin_seconds=BIN_SECONDS):
+    """Computes the emission/traffic aggregates of a simulation file in a single pass.
+
+    `aggregates` restricts the scan to a subset of AGGREGATE_COLUMNS (all by default);
+    aggregates that were not requested are reported as zero. The 'series' aggregate
+    adds per-time-bin series of `bin_seconds` (see time_bins.TimeBins), else None.
+    """
+    total_co2 = 0.0
+    total_nox = 0.0
+    total_fuel = 0.0
+    speed_sum = 0.0
+    n_records = 0
+    max_step = 0
+    vehicles = DistinctCounter()  # IDs uniques par type de véhicule
+    bins = TimeBins(bin_seconds) if aggregates is None or 'series' in aggregates else None
+    columns = set()
+    quarantine = sim_csv.Quarantine(sim_file) if sim_csv.PYARROW_OK and reads_csv(sim_file) else None
+
+    try:
+        for chunk in iter_chunks(sim_file, chunksize, columns_for(aggregates), quarantine):
+            columns.update(chunk.columns)
+            n_records += len(chunk)
+            if 'CO2_g_s' in chunk.columns:
+                total_co2 += _sum(chunk['CO2_g_s'])
+            if 'NOx_g_s' in chunk.columns:
+                total_nox += _sum(chunk['NOx_g_s'])
+            if 'fuel_l_s' in chunk.columns:
+                total_fuel += _sum(chunk['fuel_l_s'])
+            if 'speed' in chunk.columns:
+                speed_sum += _sum(chunk['speed'])
+            if 'step' in chunk.columns and len(chunk):
+                max_step = max(max_step, chunk['step'].max())
+
+            if 'veh_id' in chunk.columns and 'veh_type' in chunk.columns:
+                ids = chunk[['veh_id', 'veh_type']].dropna()
+                vehicles.update(ids['veh_id'], ids['veh_type'])
+
+            if bins is not None and 'step' in chunk.columns:
+                bins.update(chunk['step'].to_numpy(),
+                            chunk['CO2_g_s'].to_numpy() if 'CO2_g_s' in chunk.columns else None,
+                            chunk['speed'].to_numpy() if 'speed' in chunk.columns else None)
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+
+    missing = set(columns_for(aggregates)) - columns if aggregates is not None else set()
+    if missing:
+        raise ValueError(f"colonnes absentes de {os.path.basename(sim_file)}: {sorted(missing)}")
+
+    return {
+        'file': os.path.basename(sim_file),
+        'columns': sorted(columns),
+        'n_records': n_records,
+        'co2_kg': float(total_co2) / 1000.0,
+        'nox_kg': float(total_nox) / 1000.0,
+        'fuel_l': float(total_fuel),
+        'avg_speed_mps': float(speed_sum) / n_records if n_records > 0 else 0.0,
+        'max_step': max_step.item() if hasattr(max_step, 'item') else max_step,
+        'veh_per_type': vehicles.counts(),
+        'n_quarantined': quarantine.count if quarantine is not None else 0,
+        'series': bins.series() if bins is not None else None,
+    }
+
+
+def vehicle_counts(stats):
+    """Groups distinct vehicles per SUMO type into the training-table counts"""
+    per_type = stats['veh_per_type']
+    counts = {'nb_total_veh': sum(per_type.values())}
+    for col, types in VEHICLE_GROUPS.items():
+        counts[col] = sum(per_type.get(t, 0) for t in types)
+    return counts
+
+
+def convert_to_parquet(sim_file, chunksize=CHUNK_SIZE):
+    """Converts a simulation CSV once into a typed, compressed Parquet file.
+
+    Columns follow sim_csv.SCHEMA: integer `step` (float64 for sub-second steps),
+    float32 emissions/speed and dictionary-encoded `veh_type`.
+    """
+    if not PYARROW_OK:
+        raise ImportError("pyarrow is required to build the Parquet cache")
+    pq_file = parquet_path(sim_file)
+    os.makedirs(os.path.dirname(pq_file), exist_ok=True)
+    tmp_file = pq_file + ".tmp"
+    quarantine = sim_csv.Quarantine(sim_file) if reads_csv(sim_file) else None
+
+    writer = None
+    try:
+        for chunk in iter_chunks(sim_file, chunksize, quarantine=quarantine):
+            columns = {}
+            for col in chunk.columns:
+                if col == 'step':
+                    step = chunk[col].to_numpy()
+                    integral = step.dtype.kind in 'iu' or bool((step == step.round()).all())
+                    columns[col] = pa.array(step.astype('int32' if integral else 'float64'))
+                elif col in NUMERIC_COLUMNS:
+                    columns[col] = pa.array(chunk[col].to_numpy(dtype='float32'))
+                elif col == 'veh_type':
+                    columns[col] = pa.array(chunk[col].astype(str), type=pa.string()).dictionary_encode().cast(
+                        pa.dictionary(pa.int32(), pa.string()))
+                else:
+                    columns[col] = pa.array(chunk[col].astype(str), type=pa.string())
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+        if quarantine is not None:
+            quarantine.close()
+    if writer is None:
+        return None
+    os.replace(tmp_file, pq_file)
+    return pq_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertit les simulations SUMO (CSV) en Parquet typé")
+    parser.add_argument("--sim-dir", default=SIM_DIR)
+    parser.add_argument("--force", action="store_true", help="Reconvertir même si le Parquet est à jour")
+    args = parser.parse_args()
+
+    if not PYARROW_OK:
+        print("ERREUR: pyarrow est requis pour la conversion Parquet.")
+        sys.exit(1)
+
+    for sim_file in list_simulations(args.sim_dir):
+        if has_fresh_parquet(sim_file) and not args.force:
+            print(f"  [OK] {os.path.basename(sim_file)} déjà converti")
+            continue
+        start_t = time.time()
+        try:
+            out = convert_to_parquet(sim_file)
+            if out:
+                ratio = os.path.getsize(out) / max(os.path.getsize(sim_file), 1)
+                print(f"  [PARQUET] {os.path.basename(sim_file)} -> {os.path.basename(out)} "
+                      f"en {time.time()-start_t:.1f}s ({ratio:.0%} de la taille CSV)")
+                bad_file = sim_csv.quarantine_path(sim_file)
+                if os.path.exists(bad_file) and os.path.getmtime(bad_file) >= start_t:
+                    with open(bad_file, encoding='utf-8') as f:
+                        n_bad = sum(1 for _ in f)
+                    print(f"  [QUARANTAINE] {n_bad} lignes rejetées -> {bad_file}")
+        except Exception as e:
+            print(f"  [ERR] Conversion impossible pour {os.path.basename(sim_file)}: {e}")
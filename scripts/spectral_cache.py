@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+
+import file_lock
+
+# Content-addressed cache of analyze_topology() results.
+# Key = hash of the .net.xml content + analysis parameters, so a renamed or copied
+# network is a hit and an edited one a miss. One compressed .npz per entry: spectra
+# and singular vectors as binary arrays, everything else (scalars, critical streets,
+# Kreiss scan) as one JSON string. A small stat index (path, size, mtime) avoids
+# re-hashing unchanged networks, so a repeated analysis costs a few milliseconds.
+# The cache directory is bounded (least recently used entries evicted first).
+# Several processes share it (batch workers, pipeline, apps): the index is updated
+# under a file lock, and a failed index write only costs a re-hash next time.
+#
+#   python scripts/spectral_cache.py                       # contenu du cache
+#   python scripts/spectral_cache.py --invalidate data/networks/paris.net.xml
+#   python scripts/spectral_cache.py --clear
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "data", "spectral_cache")
+INDEX_FILE = "index.json"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_BLOCK_SIZE = 1 << 20
+
+ARRAY_FIELDS = ('singular_values', 'u1', 'v1')
+
+
+def _load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir, index):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, INDEX_FILE)
+    tmp = file_lock.tmp_name(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+def _update_index(cache_dir, path, record):
+    """Adds one record to the index under its lock (not fatal on failure)"""
+    try:
+        with file_lock.locked(os.path.join(cache_dir, INDEX_FILE)):
+            index = _load_index(cache_dir)
+            index[path] = record
+            _save_index(cache_dir, index)
+    except OSError as e:
+        print(f"  [CACHE] index non mis à jour ({e})")
+
+
+def file_digest(net_file, cache_dir=CACHE_DIR):
+    """Content hash of a network file (re-hashed only when its size or mtime changed)"""
+    path = os.path.abspath(net_file)
+    st = os.stat(path)
+    known = _load_index(cache_dir).get(path)
+    if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+        return known[2]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    _update_index(cache_dir, path, [st.st_size, st.st_mtime_ns, h.hexdigest()])
+    return h.hexdigest()
+
+
+def cache_key(net_file, params, cache_dir=CACHE_DIR):
+    """<network digest>_<parameters digest>: entries of one network share a prefix"""
+    params_digest = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=8)
+    return f"{file_digest(net_file, cache_dir)}_{params_digest.hexdigest()}"
+
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, key + ".npz")
+
+
+def load(key, cache_dir=CACHE_DIR):
+    """Cached metrics dict, or None"""
+    path = _entry_path(key, cache_dir)
+    try:
+        with np.load(path) as data:
+            metrics = json.loads(str(data['meta']))
+            evals = data['eigenvalues']
+            metrics['eigenvalues'] = [{"real": float(e.real), "imag": float(e.imag)} for e in evals]
+            for field in ARRAY_FIELDS:
+                metrics[field] = data[field].tolist()
+    except (OSError, KeyError, ValueError):
+        return None
+    try:
+        os.utime(path)   # date d'accès pour l'éviction LRU
+    except OSError:
+        pass             # évincée entre-temps par un autre processus
+    return metrics
+
+
+def store(key, metrics, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Writes one entry atomically, then evicts down to `max_bytes`"""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {k: v for k, v in metrics.items() if k != 'eigenvalues' and k not in ARRAY_FIELDS}
+    evals = np.array([complex(e['real'], e['imag']) for e in metrics['eigenvalues']], dtype=np.complex128)
+    arrays = {field: np.asarray(metrics[field], dtype=np.float64) for field in ARRAY_FIELDS}
+    tmp = file_lock.tmp_name(_entry_path(key, cache_dir))
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta)), eigenvalues=evals, **arrays)
+    os.replace(tmp, _entry_path(key, cache_dir))
+    evict(cache_dir, max_bytes)
+
+
+def entries(cache_dir=CACHE_DIR):
+    """(path, size, last use) of the cache entries, most recently used first"""
+    if not os.path.isdir(cache_dir):
+        return []
+    out = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            try:
+                st = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            out.append((os.path.join(cache_dir, name), st.st_size, st.st_mtime))
+    return sorted(out, key=lambda e: e[2], reverse=True)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Removes least recently used entries until the cache fits in `max_bytes`"""
+    total, removed = 0, 0
+    for path, size, _ in entries(cache_dir):
+        total += size
+        if total > max_bytes:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def invalidate(net_file=None, cache_dir=CACHE_DIR):
+    """Drops the entries of one network file (all parameters), or the whole cache"""
+    prefixes = ("",)
+    if net_file:
+        # Contenu actuel et contenu indexé précédemment (fichier modifié depuis)
+        known = _load_index(cache_dir).get(os.path.abspath(net_file))
+        prefixes = {known[2] + "_"} if known else set()
+        if os.path.exists(net_file):
+            prefixes.add(file_digest(net_file, cache_dir) + "_")
+        prefixes = tuple(prefixes)
+    removed = 0
+    for path, _, _ in entries(cache_dir):
+        if prefixes and os.path.basename(path).startswith(prefixes):
+            os.remove(path)
+            removed += 1
+    if net_file is None and os.path.isdir(cache_dir):
+        with file_lock.locked(os.path.join(cache_dir, INDEX_FILE)):
+            if os.path.exists(os.path.join(cache_dir, INDEX_FILE)):
+                os.remove(os.path.join(cache_dir, INDEX_FILE))
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache des analyses spectrales")
+    parser.add_argument("--invalidate", metavar="NET_FILE", help="Supprime les entrées d'un réseau")
+    parser.add_argument("--clear", action="store_true", help="Vide tout le cache")
+    args = parser.parse_args()
+
+    if args.clear or args.invalidate:
+        n = invalidate(args.invalidate)
+        print(f"{n} entrée(s) supprimée(s)")
+    else:
+        cached = entries()
+        for path, size, _ in cached:
+            print(f"  {os.path.basename(path):<55} {size / 1024:>8.1f} Ko")
+        print(f"{len(cached)} entrée(s), {sum(e[1] for e in cached) / 1024**2:.1f} Mo "
+              f"(limite {MAX_CACHE_BYTES / 1024**2:.0f} Mo)")
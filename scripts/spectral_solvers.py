@@ -0,0 +1,143 @@
+import os
+import time
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigs, svds, ArpackNoConvergence
+from concurrent.futures import ProcessPoolExecutor
+
+# Eigen / singular solvers of analyze_topology(), with tolerance control and an
+# optional wall-clock budget.
+# ARPACK (implicitly restarted Arnoldi / Lanczos) is called with a small restart
+# count first, which also measures the cost of one restart; after an
+# ArpackNoConvergence it is called again with as many restarts as the remaining
+# budget pays for, so no call is left without a limit. When even that does not
+# converge, the leading quantities fall back to a power iteration, flagged as not
+# converged. The budget is a soft limit: it can be exceeded by the probe (one restart,
+# initial Arnoldi factorisation included) and the power-iteration fallback.
+
+ARPACK_PROBE_ITERS = 1   # premier essai (redémarrages ARPACK) : mesure du coût d'un redémarrage
+POWER_ITERS = 200        # itérations de la puissance en dernier recours
+SCC_DENSE_MAX = 300      # composantes fortement connexes résolues en dense
+WORKERS = None           # processus pour les grandes composantes (None : un par cœur)
+
+
+def _arpack(solve, budget_s):
+    """Result of solve(maxiter), or None when the budget ran out first"""
+    if budget_s is None:
+        return solve(None)   # réglages ARPACK par défaut, sans limite de temps
+    start = time.time()
+    maxiter = ARPACK_PROBE_ITERS
+    while True:
+        attempt = time.time()
+        try:
+            return solve(maxiter)
+        except ArpackNoConvergence:
+            # Coût d'un redémarrage (surestimé au premier essai, factorisation initiale
+            # comprise) et redémarrages que le reste du budget permet de payer
+            per_iter = (time.time() - attempt) / maxiter
+            affordable = int((budget_s - (time.time() - start)) / per_iter) if per_iter > 0 else maxiter * 2
+            if affordable <= maxiter:
+                return None
+            maxiter = affordable
+
+
+def eigenvalues(A, k, tol=0.0, budget_s=None):
+    """k eigenvalues of largest modulus; returns (values, converged)"""
+    values = _arpack(lambda it: eigs(A, k=k, which='LM', tol=tol, maxiter=it,
+                                     return_eigenvectors=False), budget_s)
+    if values is not None:
+        return values, True
+    # Rayon spectral par itération de la puissance : croissance moyenne de ||A^j x||
+    x = np.ones(A.shape[0]) / np.sqrt(A.shape[0])
+    growth = []
+    for _ in range(POWER_ITERS):
+        x = A @ x
+        norm = np.linalg.norm(x)
+        if norm == 0:
+            return np.zeros(1, dtype=np.complex128), False
+        growth.append(np.log(norm))
+        x /= norm
+    return np.array([np.exp(np.mean(growth[len(growth) // 2:]))], dtype=np.complex128), False
+
+
+def singular_triplets(A, k, tol=0.0, budget_s=None):
+    """k largest singular triplets in decreasing order; returns (u, s, vt, converged)"""
+    result = _arpack(lambda it: svds(A, k=k, tol=tol, maxiter=it), budget_s)
+    if result is not None:
+        u, s, vt = result
+        # svds renvoie les valeurs singulières dans l'ordre croissant
+        idx = s.argsort()[::-1]
+        return u[:, idx], s[idx], vt[idx, :], True
+    v = np.ones(A.shape[1]) / np.sqrt(A.shape[1])
+    for _ in range(POWER_ITERS):
+        v = A.T @ (A @ v)
+        norm = np.linalg.norm(v)
+        if norm == 0:
+            break
+        v /= norm
+    u = A @ v
+    sigma = np.linalg.norm(u)
+    u = u / sigma if sigma > 0 else u
+    return u[:, None], np.array([sigma]), v[None, :], False
+
+
+# SCC mode: after a permutation a directed graph's adjacency matrix is block triangular
+# with one diagonal block per strongly connected component, so its eigenvalues are the
+# union of the blocks' eigenvalues and rho(A) = max over components. Dead-end stubs and
+# one-way fragments are single-node components with eigenvalue 0 and are skipped;
+# ARPACK only sees the non-trivial blocks (no large nullspace / Jordan blocks at 0).
+# Singular values do not decompose this way: the SVD stays on the whole matrix.
+
+def strong_components(A):
+    """Index arrays of the non-trivial strongly connected components (largest first)"""
+    n_comp, labels = connected_components(A, directed=True, connection='strong')
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels, minlength=n_comp)
+    groups = np.split(order, np.cumsum(sizes)[:-1])
+    diag = A.diagonal()
+    # Un nœud isolé ne compte que s'il porte une boucle
+    comps = [g for g in groups if len(g) > 1 or diag[g[0]] != 0]
+    return sorted(comps, key=len, reverse=True)
+
+
+def _component_eigenvalues(B, k, tol, budget_s):
+    n = B.shape[0]
+    if n <= SCC_DENSE_MAX:
+        values = np.linalg.eigvals(B.toarray())
+        return values[np.argsort(-np.abs(values), kind='stable')][:k], True
+    return eigenvalues(B, min(k, n - 2), tol, budget_s)
+
+
+def scc_eigenvalues(A, k, tol=0.0, budget_s=None, workers=None):
+    """k eigenvalues of largest modulus from the strongly connected components.
+
+    Large components are solved in parallel worker processes. Returns
+    (values, converged, info) with info = number and size of the components.
+    """
+    A = A.tocsr()
+    comps = strong_components(A)
+    blocks = [A[idx][:, idx] for idx in comps]
+    large = [i for i, b in enumerate(blocks) if b.shape[0] > SCC_DENSE_MAX]
+    workers = min(workers or WORKERS or os.cpu_count() or 1, len(large))
+
+    results = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(_component_eigenvalues, blocks[i], k, tol, budget_s) for i in large}
+            for i, b in enumerate(blocks):
+                if i not in futures:
+                    results[i] = _component_eigenvalues(b, k, tol, budget_s)
+            for i, fut in futures.items():
+                results[i] = fut.result()
+    else:
+        for i, b in enumerate(blocks):
+            results[i] = _component_eigenvalues(b, k, tol, budget_s)
+
+    info = {'scc_count': len(comps), 'scc_largest': len(comps[0]) if comps else 0,
+            'scc_nodes': int(sum(len(c) for c in comps))}
+    if not results:
+        # Graphe sans cycle : A est nilpotente
+        return np.zeros(1, dtype=np.complex128), True, info
+    values = np.concatenate([v for v, _ in results.values()])
+    values = values[np.argsort(-np.abs(values), kind='stable')][:k]
+    return values, all(c for _, c in results.values()), info
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Streaming windowed aggregation of a SUMO emission file: per-time-bin sums updated
+# chunk by chunk with np.bincount, so memory grows with the number of bins only
+# (60 s bins: 1440 bins for a full simulated day), never with the number of records.
+
+BIN_SECONDS = 60
+SATURATION_LEVEL = 0.9   # fraction du maximum de véhicules actifs
+
+
+class TimeBins:
+    """Per-bin CO2, record count, speed sum and number of distinct steps.
+
+    SUMO writes the records step by step: a step split across two chunks is
+    counted once. Active vehicles per step = records / distinct steps of the bin.
+    """
+
+    def __init__(self, bin_seconds=BIN_SECONDS):
+        self.bin_seconds = float(bin_seconds)
+        self.co2_g = np.zeros(0, dtype=np.float64)
+        self.speed_sum = np.zeros(0, dtype=np.float64)
+        self.records = np.zeros(0, dtype=np.int64)
+        self.steps = np.zeros(0, dtype=np.int64)
+        self._last_step = None
+
+    def _bins(self, step):
+        return np.maximum(np.floor(step / self.bin_seconds), 0).astype(np.int64)
+
+    def _grow(self, n_bins):
+        if n_bins > len(self.records):
+            extra = n_bins - len(self.records)
+            self.co2_g = np.concatenate([self.co2_g, np.zeros(extra)])
+            self.speed_sum = np.concatenate([self.speed_sum, np.zeros(extra)])
+            self.records = np.concatenate([self.records, np.zeros(extra, dtype=np.int64)])
+            self.steps = np.concatenate([self.steps, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, step, co2_g_s=None, speed=None):
+        """Adds one chunk: `step` in seconds, emissions in g/s, speed in m/s"""
+        step = np.asarray(step, dtype=np.float64)
+        if len(step) == 0:
+            return
+        bins = self._bins(step)
+        n_bins = int(bins.max()) + 1
+        self._grow(n_bins)
+        n = len(self.records)
+        self.records += np.bincount(bins, minlength=n)
+        if co2_g_s is not None:
+            self.co2_g += np.bincount(bins, weights=np.asarray(co2_g_s, dtype=np.float64), minlength=n)
+        if speed is not None:
+            self.speed_sum += np.bincount(bins, weights=np.asarray(speed, dtype=np.float64), minlength=n)
+
+        distinct = np.unique(step)
+        if self._last_step is not None:
+            distinct = distinct[distinct != self._last_step]
+        self.steps += np.bincount(self._bins(distinct), minlength=n)
+        self._last_step = step[-1]
+
+    def series(self):
+        """Per-bin series as plain lists (JSON-friendly)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            active = np.where(self.steps > 0, self.records / np.maximum(self.steps, 1), 0.0)
+            speed = np.where(self.records > 0, self.speed_sum / np.maximum(self.records, 1), 0.0)
+        return {
+            'bin_seconds': self.bin_seconds,
+            't_debut_s': (np.arange(len(self.records)) * self.bin_seconds).tolist(),
+            'co2_kg': (self.co2_g / 1000.0).tolist(),
+            'veh_actifs_moy': active.tolist(),
+            'vitesse_moy_mps': speed.tolist(),
+        }
+
+
+def series_features(series, saturation_level=SATURATION_LEVEL):
+    """Scalar features derived from the per-bin series.
+
+    - co2_pic_kg / t_pic_co2_s: CO2 of the worst bin and its start time;
+    - veh_actifs_max: highest mean number of vehicles on the network per step;
+    - t_saturation_s: first time the network reaches `saturation_level` of that maximum;
+    - vitesse_min_mps: lowest mean speed over the bins that carry traffic.
+    """
+    co2 = np.asarray(series['co2_kg'], dtype=np.float64)
+    active = np.asarray(series['veh_actifs_moy'], dtype=np.float64)
+    speed = np.asarray(series['vitesse_moy_mps'], dtype=np.float64)
+    t = np.asarray(series['t_debut_s'], dtype=np.float64)
+    if len(co2) == 0:
+        return {'co2_pic_kg': 0.0, 't_pic_co2_s': 0.0, 'veh_actifs_max': 0.0,
+                't_saturation_s': 0.0, 'vitesse_min_mps': 0.0}
+    peak = int(np.argmax(co2))
+    active_max = float(active.max())
+    saturated = np.flatnonzero(active >= saturation_level * active_max) if active_max > 0 else [0]
+    moving = speed[active > 0]
+    return {
+        'co2_pic_kg': float(co2[peak]),
+        't_pic_co2_s': float(t[peak]),
+        'veh_actifs_max': active_max,
+        't_saturation_s': float(t[saturated[0]]),
+        'vitesse_min_mps': float(moving.min()) if len(moving) else 0.0,
+    }
@@ -212,7 +212,7 @@ if run_btn and final_city_query:
     st.session_state.current_city = final_city_query
     with st.status("Calculs spectraux en cours...") as status:
         net_file, safe_name = analyzer.download_city_map(final_city_query)
-        metrics = analyzer.analyze_topology(net_file)
+        metrics = analyzer.analyze_topology(net_file, profile="interactive")
         if metrics:
             report_path = analyzer.generate_report(city_input, safe_name, metrics)
             with open(report_path, "r", encoding="utf-8") as f: report_content = f.read()
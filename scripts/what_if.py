@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import eigs, svds
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import net_loader
+
+# What-if spectral updates: estimated rho, sigma_max and critical street after removing
+# and/or adding edges, without re-running the whole analysis.
+#
+#   first order  d(rho)   ~ y^T dA x / y^T x   (x, y: right / left Perron vectors)
+#                d(sigma) ~ u1^T dA v1         (u1, v1: leading singular vectors)
+#   refinement   ARPACK (k=1) on the modified matrix, warm-started from the baseline
+#                vectors: a few restarts instead of a cold solve.
+#
+# The baseline vectors are computed once per session (u1/v1 are taken from the
+# analyze_topology() metrics when given, e.g. out of the spectral cache).
+#
+#   python scripts/what_if.py data/networks/paris.net.xml                # retire la rue critique
+#   python scripts/what_if.py data/networks/paris.net.xml --remove 1234#0 --add J1:J2
+
+REFINE_TOL = 1e-6
+
+
+def _perron(M, v0=None):
+    """Perron eigenpair of a non-negative matrix, vector normalised and made non-negative.
+
+    rho is the eigenvalue of largest real part ('LM' may return -rho on periodic graphs).
+    """
+    val, vec = eigs(M, k=1, which='LR', v0=v0, tol=REFINE_TOL)
+    vec = np.real(vec[:, 0])
+    vec = vec if vec.sum() >= 0 else -vec
+    return float(np.real(val[0])), vec / np.linalg.norm(vec)
+
+
+def _leading_singular(M, v0=None):
+    u, s, vt = svds(M, k=1, v0=v0, tol=REFINE_TOL)
+    u, v = u[:, 0], vt[0]
+    if v.sum() < 0:
+        u, v = -u, -v
+    return float(s[0]), u, v
+
+
+class WhatIf:
+    """What-if session on one network.
+
+    `metrics` (analyze_topology() result) provides sigma_max, u1 and v1; the Perron
+    vectors are computed once here.
+    """
+
+    def __init__(self, net_file, metrics=None):
+        start = time.time()
+        self.net = net_loader.load_net(net_file)
+        self.A = self.net['adjacency'].tocsr()
+        self.node_index = {nid: i for i, nid in enumerate(self.net['node_ids'])}
+        n = self.A.shape[0]
+
+        if metrics is not None and len(metrics.get('u1', ())) == n:
+            self.sigma = float(metrics['h_inf_norm'])
+            self.u = np.asarray(metrics['u1'], dtype=np.float64)
+            self.v = np.asarray(metrics['v1'], dtype=np.float64)
+        else:
+            self.sigma, self.u, self.v = _leading_singular(self.A)
+        self.rho, self.x = _perron(self.A)
+        _, self.y = _perron(self.A.T.tocsr())
+        self.yx = float(self.y @ self.x)
+        self.critical = self._critical(self.u, self.v, np.ones(len(self.net['edge_ids']), dtype=bool), [])
+        self.setup_s = time.time() - start
+
+    def _delta(self, remove, add):
+        """Sparse dA, mask of the kept edges and added (from, to) node indices"""
+        n = self.A.shape[0]
+        keep = np.ones(len(self.net['edge_ids']), dtype=bool)
+        rows, cols, vals = [], [], []
+        for edge_id in remove:
+            i = net_loader.edge_index(self.net, edge_id)
+            keep[i] = False
+            rows.append(self.net['edge_from'][i])
+            cols.append(self.net['edge_to'][i])
+            vals.append(-1.0)
+        added = []
+        for from_id, to_id in add:
+            f, t = self.node_index[from_id], self.node_index[to_id]
+            added.append((f, t))
+            rows.append(f)
+            cols.append(t)
+            vals.append(1.0)
+        dA = sp.csr_matrix((vals, (rows, cols)), shape=(n, n))
+        return dA, keep, added
+
+    def _critical(self, u, v, keep, added):
+        """Edge of highest |u[from] * v[to]| (existing edges first in file order, then additions)"""
+        importance = np.abs(u[self.net['edge_from']] * v[self.net['edge_to']])
+        importance[~keep] = -1.0
+        best = int(np.argmax(importance)) if len(importance) else -1
+        best_value = importance[best] if best >= 0 else -1.0
+        for f, t in added:
+            value = abs(u[f] * v[t])
+            if value > best_value:
+                return {"id": None, "name": f"ajout {self.net['node_ids'][f]} -> {self.net['node_ids'][t]}",
+                        "importance": float(value)}
+        if best < 0:
+            return None
+        return {"id": self.net['edge_ids'][best],
+                "name": self.net['edge_names'][best] or self.net['edge_ids'][best],
+                "importance": float(best_value)}
+
+    def evaluate(self, remove=(), add=(), refine=True):
+        """Estimated effect of removing edges (IDs) and adding (from node, to node) links.
+
+        Without `refine` only the first-order estimates are returned (microseconds);
+        with it, rho / sigma_max / critical street come from warm-started ARPACK.
+        """
+        start = time.time()
+        dA, keep, added = self._delta(remove, add)
+        d_rho = float(self.y @ (dA @ self.x)) / self.yx if abs(self.yx) > 1e-12 else float('nan')
+        d_sigma = float(self.u @ (dA @ self.v))
+        result = {
+            "removed": list(remove),
+            "added": [list(a) for a in add],
+            "rho_first_order": self.rho + d_rho,
+            "sigma_first_order": self.sigma + d_sigma,
+            "refined": bool(refine),
+        }
+        if refine:
+            M = (self.A + dA).tocsr()
+            M.eliminate_zeros()
+            rho, _ = _perron(M, v0=self.x)
+            sigma, u, v = _leading_singular(M, v0=self.v)
+            critical = self._critical(u, v, keep, added)
+        else:
+            rho, sigma = result["rho_first_order"], result["sigma_first_order"]
+            critical = self._critical(self.u, self.v, keep, added)
+        result.update({
+            "rho": rho,
+            "sigma_max": sigma,
+            "delta_rho": rho - self.rho,
+            "delta_sigma": sigma - self.sigma,
+            "critical_street": critical,
+            "elapsed_s": time.time() - start,
+        })
+        return result
+
+    def score(self, interventions, refine=False):
+        """Evaluates many interventions [(remove, add), ...], best rho reduction first"""
+        results = [self.evaluate(remove, add, refine=refine) for remove, add in interventions]
+        return sorted(results, key=lambda r: r["delta_rho"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scénarios de suppression / ajout de rues")
+    parser.add_argument("net_file")
+    parser.add_argument("--remove", nargs="*", default=None, help="IDs des arcs à supprimer (défaut : rue critique)")
+    parser.add_argument("--add", nargs="*", default=[], help="Liaisons à ajouter, format NOEUD_DEPART:NOEUD_ARRIVEE")
+    parser.add_argument("--first-order", action="store_true", help="Estimation au premier ordre seulement")
+    args = parser.parse_args()
+
+    session = WhatIf(args.net_file)
+    print(f"Référence : rho={session.rho:.6f}  sigma_max={session.sigma:.6f}  "
+          f"rue critique={session.critical['id']} ({session.setup_s:.1f}s)")
+    remove = args.remove if args.remove is not None else [session.critical['id']]
+    add = [tuple(a.split(":", 1)) for a in args.add]
+    r = session.evaluate(remove, add, refine=not args.first_order)
+    print(f"Scénario  : rho={r['rho']:.6f} ({r['delta_rho']:+.6f})  "
+          f"sigma_max={r['sigma_max']:.6f} ({r['delta_sigma']:+.6f})  "
+          f"rue critique={r['critical_street']['name'] if r['critical_street'] else 'N/A'}")
+    print(f"  premier ordre : rho={r['rho_first_order']:.6f}  sigma_max={r['sigma_first_order']:.6f}  "
+          f"({r['elapsed_s'] * 1000:.1f} ms)")